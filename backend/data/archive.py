@@ -0,0 +1,301 @@
+"""
+Versioned layer archive: every build is kept, so past layers can be served
+(?version= / ?asof=), compared (/api/diff) or restored.
+
+The layer store keeps only the last few published versions. The archive keeps
+all of them, but a keyed layer (the grid, by h3_cell) is stored only as its
+delta against the previous build: changed properties with their old and new
+values, added features (geometry included) and removed keys. Geometry is fixed
+per H3 cell, so a rebuild where a few columns moved costs a few columns.
+Layers without a per-feature key are stored content-addressed, once per
+distinct payload. Storage therefore grows with what changes, not with the
+number of builds.
+
+Layout:
+  data/layer_archive/index.json                      - versions, build time, per-layer stats
+  data/layer_archive/.lock                           - flock held while a version is appended
+  data/layer_archive/<layer>/v<version>.delta.json.gz - keyed layers: delta vs the previous build
+  data/layer_archive/<layer>/<sha256>.json.gz        - other layers
+  data/layer_archive/<layer>/latest.json.gz          - working copy of the newest keyed state (diff base)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import CACHE_LAYER_ARCHIVE, ARCHIVE_CACHE_VERSIONS
+
+from backend.data.deltas import _same, diff_properties, features_by_key
+from backend.data.layer_store import encode_layer, exclusive_lock
+
+ARCHIVE_DIR = PROJECT_ROOT / CACHE_LAYER_ARCHIVE
+
+
+def _write_gz(path, obj):
+    raw = gzip.compress(encode_layer(obj), compresslevel=6)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(raw)
+    os.replace(tmp, path)
+    return len(raw)
+
+
+def _read_gz(path):
+    with gzip.open(path, "rb") as f:
+        return json.loads(f.read())
+
+
+def read_index(archive_dir=None):
+    p = Path(archive_dir or ARCHIVE_DIR) / "index.json"
+    try:
+        with open(p) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"versions": []}
+
+
+def archive_delta(old, new, key):
+    """
+    Per-feature delta (as in deltas.py) plus `before`: old values of the
+    changed properties, and all properties of removed features; and `dropped`:
+    properties a feature no longer has (the push delta reports those as None).
+    """
+    old_props = {k: f.get("properties") or {} for k, f in features_by_key(old, key).items()}
+    new_by = features_by_key(new, key)
+    new_props = {k: f.get("properties") or {} for k, f in new_by.items()}
+    d = diff_properties(old_props, new_props)
+    # diff_properties treats a missing property and None alike; replay must not
+    for k, props in new_props.items():
+        if k in old_props:
+            for p, v in props.items():
+                if v is None and p not in old_props[k]:
+                    d["changed"].setdefault(k, {})[p] = None
+    d["dropped"] = {}
+    for k in d["changed"]:
+        gone = [p for p in old_props[k] if p not in new_props[k]]
+        if gone:
+            d["dropped"][k] = gone
+    d["added"] = [new_by[k] for k in d["added"]]
+    d["before"] = {k: {p: old_props[k].get(p) for p in props} for k, props in d["changed"].items()}
+    d["before"].update({k: old_props[k] for k in d["removed"]})
+    return d
+
+
+def _dropped(delta, k):
+    # Deltas archived before `dropped` was recorded: a None value meant the property went away
+    if "dropped" not in delta:
+        return [p for p, v in delta["changed"][k].items() if v is None]
+    return delta["dropped"].get(k, ())
+
+
+def _with_changes(feature, props, dropped):
+    merged = {**(feature.get("properties") or {}), **props}
+    for p in dropped:
+        merged.pop(p, None)
+    return {**feature, "properties": merged}
+
+
+def apply_delta(state, delta, key):
+    """New {key: feature} state with the delta applied (features of `state` are not modified)."""
+    out = dict(state)
+    for k in delta["removed"]:
+        out.pop(k, None)
+    for k, props in delta["changed"].items():
+        f = out.get(k)
+        if f is not None:
+            out[k] = _with_changes(f, props, _dropped(delta, k))
+    for f in delta["added"]:
+        out[f["properties"][key]] = f
+    return out
+
+
+def archive_layers(layers, keys=None, version=None, archive_dir=None):
+    """
+    Append {layer_name: geojson_dict} to the archive. keys: {layer_name: property}
+    for layers stored as per-feature deltas. version: id to record (the layer
+    store version, so ids match X-Layer-Version); the next free id is used if
+    it is missing or not newer than the last archived one. Returns the version id.
+    """
+    root = Path(archive_dir or ARCHIVE_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+    # Concurrent builds would append over each other's index.json and latest state
+    with exclusive_lock(root / ".lock"):
+        return _append_version(root, layers, keys or {}, version)
+
+
+def _append_version(root, layers, keys, version):
+    index = read_index(root)
+    last = index["versions"][-1]["version"] if index["versions"] else 0
+    version = version if version and version > last else last + 1
+    entry = {"version": version, "created": datetime.now(timezone.utc).isoformat(timespec="seconds"), "layers": {}}
+
+    for name, geojson in layers.items():
+        ldir = root / name
+        ldir.mkdir(exist_ok=True)
+        key = keys.get(name)
+        stats = {"features": len(geojson.get("features", []))}
+        if key:
+            latest = ldir / "latest.json.gz"
+            prev = _read_gz(latest) if latest.exists() else {"type": "FeatureCollection", "features": []}
+            delta = archive_delta(prev, geojson, key)
+            stats.update({
+                "key": key,
+                "delta": f"v{version}.delta.json.gz",
+                "changed": len(delta["changed"]),
+                "added": len(delta["added"]),
+                "removed": len(delta["removed"]),
+                "bytes": _write_gz(ldir / f"v{version}.delta.json.gz", delta),
+            })
+            _write_gz(latest, geojson)
+        else:
+            raw = encode_layer(geojson)
+            sha = hashlib.sha256(raw).hexdigest()
+            blob = ldir / f"{sha}.json.gz"
+            stats.update({"blob": sha, "bytes": 0 if blob.exists() else _write_gz(blob, geojson)})
+        entry["layers"][name] = stats
+
+    index["versions"].append(entry)
+    tmp = root / "index.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, root / "index.json")
+    return version
+
+
+def parse_asof(asof):
+    """ISO date or datetime (UTC when no offset). A bare date means the end of that day."""
+    try:
+        t = datetime.fromisoformat(asof)
+    except (TypeError, ValueError):
+        raise ValueError("asof must be an ISO date or datetime") from None
+    if len(asof) == 10:
+        t += timedelta(days=1) - timedelta(microseconds=1)
+    return t if t.tzinfo else t.replace(tzinfo=timezone.utc)
+
+
+class LayerArchive:
+    """
+    Read side of the archive. Past states are rebuilt by replaying deltas
+    forward from the nearest cached one; the last ARCHIVE_CACHE_VERSIONS
+    states are kept per worker.
+    """
+
+    def __init__(self, archive_dir=None, cache_size=None):
+        self.root = Path(archive_dir or ARCHIVE_DIR)
+        self.cache_size = ARCHIVE_CACHE_VERSIONS if cache_size is None else cache_size
+        self._index = {"versions": []}
+        self._mtime = None
+        self._states = OrderedDict()  # (layer, version) -> {key: feature}
+        self._lock = threading.Lock()
+
+    def versions(self):
+        """Archived versions, oldest first (re-read when index.json changes)."""
+        try:
+            mtime = (self.root / "index.json").stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if mtime != self._mtime:
+            self._index = read_index(self.root)
+            self._mtime = mtime
+        return self._index["versions"]
+
+    def resolve(self, version=None, asof=None):
+        """Archived version id for ?version= or ?asof= (latest build at or before it). KeyError if none."""
+        versions = self.versions()
+        if version is not None:
+            if any(v["version"] == version for v in versions):
+                return version
+            raise KeyError(f"version {version} is not archived")
+        t = parse_asof(asof)
+        found = [v["version"] for v in versions if datetime.fromisoformat(v["created"]) <= t]
+        if not found:
+            raise KeyError(f"no archived version as of {asof}")
+        return found[-1]
+
+    def _entries(self, layer, after, upto):
+        return [v for v in self.versions() if after < v["version"] <= upto and layer in v["layers"]]
+
+    def _state(self, layer, version):
+        with self._lock:
+            start = max((v for (l, v) in self._states if l == layer and v <= version), default=None)
+            state = self._states[(layer, start)] if start is not None else {}
+        for entry in self._entries(layer, start or 0, version):
+            stats = entry["layers"][layer]
+            state = apply_delta(state, _read_gz(self.root / layer / stats["delta"]), stats["key"])
+        with self._lock:
+            self._states[(layer, version)] = state
+            self._states.move_to_end((layer, version))
+            while len(self._states) > self.cache_size:
+                self._states.popitem(last=False)
+        return state
+
+    def materialize(self, layer, version):
+        """The layer's FeatureCollection as built in `version` (its latest state at or before it)."""
+        entries = self._entries(layer, 0, version)
+        if not entries:
+            raise KeyError(f"layer {layer} has no archived version <= {version}")
+        stats = entries[-1]["layers"][layer]
+        if "blob" in stats:
+            return _read_gz(self.root / layer / f"{stats['blob']}.json.gz")
+        return {"type": "FeatureCollection", "features": list(self._state(layer, version).values())}
+
+    def diff(self, layer, from_version, to_version):
+        """
+        Net per-feature delta from one version to a later one, composed from the
+        stored deltas without rebuilding either state. Same shape as the push
+        delta ({"changed", "added", "removed"}) plus `before` (old values);
+        properties that changed and changed back are left out.
+        """
+        if from_version > to_version:
+            raise ValueError("from must not be later than to")
+        entries = self._entries(layer, from_version, to_version)
+        if any("key" not in e["layers"][layer] for e in entries):
+            raise ValueError(f"layer {layer} has no per-feature key; fetch both versions instead")
+        changed, before, added, gone = {}, {}, {}, {}
+        for entry in entries:
+            stats = entry["layers"][layer]
+            d = _read_gz(self.root / layer / stats["delta"])
+            for k in d["removed"]:
+                if added.pop(k, None) is None:
+                    changed.pop(k, None)
+                    # Values at from_version: the earliest seen win
+                    gone[k] = {**d["before"].get(k, {}), **before.pop(k, {})}
+            for k, props in d["changed"].items():
+                if k in added:
+                    added[k] = _with_changes(added[k], props, _dropped(d, k))
+                    continue
+                old = before.setdefault(k, {})
+                for p in props:
+                    old.setdefault(p, d["before"][k].get(p))
+                changed.setdefault(k, {}).update(props)
+            for f in d["added"]:
+                k = f["properties"][stats["key"]]
+                if k in gone:
+                    # Removed and re-added within the range: a change against its old values
+                    # (properties it did not have then count as None)
+                    before[k] = {**{p: None for p in f["properties"]}, **gone.pop(k)}
+                    changed[k] = {**{p: None for p in before[k]}, **f["properties"]}
+                else:
+                    added[k] = f
+        for k in list(changed):
+            props = {p: v for p, v in changed[k].items() if not _same(before[k].get(p), v)}
+            if props:
+                changed[k] = props
+                before[k] = {p: before[k].get(p) for p in props}
+            else:
+                del changed[k], before[k]
+        return {
+            "changed": changed,
+            "before": before,
+            "added": list(added.values()),
+            "removed": sorted(gone),
+            "from": from_version,
+            "to": to_version,
+        }
@@ -0,0 +1,106 @@
+"""
+Compact wire format for H3 grid layers. A hexagon's geometry is fully
+determined by its cell id, so only the ids and the properties are sent:
+  cells    list of H3 ids (the client rebuilds polygons with h3-js)
+  columns  numeric properties as base64 little-endian float32 (NaN = missing),
+           0..1 indices (COMPACT_QUANTIZED_COLUMNS) as uint8 codes over [min, max]
+           with 255 = missing, text properties dictionary-coded (values + uint8,
+           uint16 or uint32 codes)
+  aliases  properties that repeat the cell id (cell_id), restored client-side
+"""
+
+import base64
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import COMPACT_QUANTIZED_COLUMNS
+from backend.data.hex_index import HexIndex
+
+FORMAT = "h3-columns"
+FORMAT_VERSION = 1
+QUANT_MISSING = 255
+QUANT_STEPS = 254
+
+
+def _b64(arr):
+    return base64.b64encode(np.ascontiguousarray(arr).tobytes()).decode("ascii")
+
+
+def _unb64(data, dtype):
+    return np.frombuffer(base64.b64decode(data), dtype=dtype)
+
+
+def _quantize(x):
+    ok = ~np.isnan(x)
+    lo = float(x[ok].min()) if ok.any() else 0.0
+    hi = float(x[ok].max()) if ok.any() else 0.0
+    codes = np.full(len(x), QUANT_MISSING, dtype=np.uint8)
+    if hi > lo:
+        codes[ok] = np.rint((x[ok] - lo) / (hi - lo) * QUANT_STEPS).astype(np.uint8)
+    else:
+        codes[ok] = 0
+    return {"type": "uint8", "min": lo, "max": hi, "data": _b64(codes)}
+
+
+def _dictionary(values):
+    uniques = list(dict.fromkeys(values))
+    lookup = {v: i for i, v in enumerate(uniques)}
+    # Smallest code width that holds every index (a per-cell text column can exceed 65,535 values)
+    n = len(uniques)
+    dtype = np.dtype("u1" if n <= 1 << 8 else "<u2" if n <= 1 << 16 else "<u4")
+    codes = np.fromiter((lookup[v] for v in values), dtype=dtype, count=len(values))
+    return {"type": "dict", "values": uniques, "code_type": dtype.name, "codes": _b64(codes)}
+
+
+def encode_compact(geojson, key="h3_cell", quantized=None):
+    """Compact dict for a grid FeatureCollection keyed by H3 cell id (JSON-serializable)."""
+    quantized = COMPACT_QUANTIZED_COLUMNS if quantized is None else quantized
+    index = HexIndex.from_geojson(geojson, key=key)
+    columns, aliases = {}, []
+    for name, col in index.columns.items():
+        if isinstance(col, np.ndarray):
+            if name in quantized:
+                columns[name] = _quantize(col)
+            else:
+                columns[name] = {"type": "float32", "data": _b64(col.astype("<f4"))}
+        elif col == index.cells:
+            aliases.append(name)
+        else:
+            columns[name] = _dictionary(col)
+    return {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "key": key,
+        "resolution": index.resolution,
+        "count": len(index),
+        "cells": index.cells,
+        "aliases": aliases,
+        "columns": columns,
+    }
+
+
+def decode_compact(obj):
+    """Property dicts (one per cell, missing values dropped) from a compact layer."""
+    decoded = {}
+    for name, spec in obj["columns"].items():
+        if spec["type"] == "float32":
+            decoded[name] = [None if np.isnan(v) else float(v) for v in _unb64(spec["data"], "<f4")]
+        elif spec["type"] == "uint8":
+            codes = _unb64(spec["data"], np.uint8)
+            scale = (spec["max"] - spec["min"]) / QUANT_STEPS
+            decoded[name] = [None if c == QUANT_MISSING else spec["min"] + int(c) * scale for c in codes]
+        else:
+            codes = _unb64(spec["codes"], np.dtype(spec["code_type"]).newbyteorder("<"))
+            decoded[name] = [spec["values"][c] for c in codes.tolist()]
+    rows = []
+    for i, cell in enumerate(obj["cells"]):
+        props = {obj["key"]: cell, **{a: cell for a in obj["aliases"]}}
+        for name, values in decoded.items():
+            if values[i] is not None:
+                props[name] = values[i]
+        rows.append(props)
+    return rows
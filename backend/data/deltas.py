@@ -0,0 +1,64 @@
+"""
+Property deltas between two versions of a layer (per-hex diff keyed by h3_cell).
+Used to push only what changed to connected map clients.
+"""
+
+import math
+
+
+def _same(a, b, rel_tol=1e-9):
+    if isinstance(a, float) and isinstance(b, float):
+        return math.isclose(a, b, rel_tol=rel_tol) or (math.isnan(a) and math.isnan(b))
+    return a == b
+
+
+def diff_properties(old, new):
+    """
+    Diff two {key: {prop: value}} mappings.
+    Returns {"changed": {key: {prop: new_value}}, "added": [keys], "removed": [keys]};
+    a property that disappears is reported as None.
+    """
+    changed = {}
+    for k, props in new.items():
+        before = old.get(k)
+        if before is None:
+            continue
+        d = {p: v for p, v in props.items() if not _same(before.get(p), v)}
+        for p in before:
+            if p not in props:
+                d[p] = None
+        if d:
+            changed[k] = d
+    added = [k for k in new if k not in old]
+    removed = [k for k in old if k not in new]
+    return {"changed": changed, "added": added, "removed": removed}
+
+
+def features_by_key(geojson, key):
+    """Index a FeatureCollection's features by a property (e.g. h3_cell)."""
+    out = {}
+    for f in geojson.get("features", []):
+        k = (f.get("properties") or {}).get(key)
+        if k is not None:
+            out[k] = f
+    return out
+
+
+def diff_feature_collections(old, new, key="h3_cell"):
+    """
+    Per-feature property delta between two FeatureCollections.
+    Added features are returned whole (geometry included); changed and removed
+    ones by key only. Geometry is assumed fixed per key (true for H3 cells).
+    """
+    old_by = features_by_key(old, key)
+    new_by = features_by_key(new, key)
+    d = diff_properties(
+        {k: f.get("properties") or {} for k, f in old_by.items()},
+        {k: f.get("properties") or {} for k, f in new_by.items()},
+    )
+    d["added"] = [new_by[k] for k in d["added"]]
+    return d
+
+
+def is_empty_delta(delta):
+    return not (delta.get("changed") or delta.get("added") or delta.get("removed"))
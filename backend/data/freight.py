@@ -0,0 +1,114 @@
+"""
+Freight network: which street edges are truck routes, and a merged,
+simplified truck layer for the map.
+
+Designation comes from the NYC DOT truck route file when one is present
+(matched to OSM edges by nearest route within TRUCK_MATCH_M). Otherwise it
+comes from OSM tags: hgv=designated, hgv=destination/delivery, or the highway
+class. The map layer merges contiguous edges of one class into long
+linestrings. It also simplifies them and keeps only the class and length,
+instead of shipping every OSM segment with all its tags.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import geopandas as gpd
+    import shapely
+except ImportError:
+    gpd = shapely = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import (
+    TRUCK_ROUTES_FILE,
+    TRUCK_ROUTE_TYPE_COLUMN,
+    TRUCK_MATCH_M,
+    TRUCK_HIGHWAY_CLASSES,
+    TRUCK_SIMPLIFY_M,
+)
+
+PROJECTED_CRS = "EPSG:32618"  # UTM 18N: tolerances in m
+CLASS_ORDER = ("through", "local")
+
+
+def load_truck_routes(path=None):
+    """Designated truck routes with a truck_class column (EPSG:4326), or None if the file is missing."""
+    p = Path(path or PROJECT_ROOT / TRUCK_ROUTES_FILE)
+    if gpd is None or not p.exists():
+        return None
+    routes = gpd.read_file(p)
+    routes = routes[routes.geometry.notna() & ~routes.geometry.is_empty].to_crs("EPSG:4326")
+    kind = routes.get(TRUCK_ROUTE_TYPE_COLUMN, pd.Series("", index=routes.index)).astype(str).str.lower()
+    # NYC DOT route types: Through, Local, Limited Local
+    routes["truck_class"] = np.where(kind.str.contains("through"), "through", "local")
+    return routes[["truck_class", "geometry"]].reset_index(drop=True)
+
+
+def _first_tag(value):
+    """OSMnx keeps a list when merged ways disagree on a tag; use the first."""
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+
+def _class_from_tags(edges):
+    highway = edges["highway"].map(_first_tag) if "highway" in edges.columns else pd.Series(None, index=edges.index)
+    cls = highway.map(TRUCK_HIGHWAY_CLASSES)
+    if "hgv" in edges.columns:
+        hgv = edges["hgv"].map(_first_tag)
+        cls = cls.mask(hgv.isin(["destination", "delivery", "local"]), "local")
+        cls = cls.mask(hgv == "designated", "through")
+        cls = cls.mask(hgv == "no", None)
+    return cls
+
+
+def _class_from_routes(edges, routes):
+    """Class of the nearest designated route within TRUCK_MATCH_M of each edge's midpoint."""
+    proj = edges.geometry.to_crs(PROJECTED_CRS)
+    mid = gpd.GeoDataFrame(geometry=shapely.line_interpolate_point(proj.values, 0.5, normalized=True), index=edges.index, crs=PROJECTED_CRS)
+    joined = gpd.sjoin_nearest(mid, routes.to_crs(PROJECTED_CRS), how="left", max_distance=TRUCK_MATCH_M)
+    joined = joined[~joined.index.duplicated()]
+    return joined["truck_class"].reindex(edges.index)
+
+
+def classify_truck_edges(edges_gdf, routes_path=None):
+    """Edges that are truck routes, with a truck_class column ('through' or 'local')."""
+    if edges_gdf is None or edges_gdf.empty:
+        return None
+    edges = edges_gdf[edges_gdf.geometry.notna()].set_crs("EPSG:4326", allow_override=True)
+    routes = load_truck_routes(routes_path)
+    cls = _class_from_routes(edges, routes) if routes is not None else _class_from_tags(edges)
+    edges = edges.assign(truck_class=cls)
+    return edges[edges["truck_class"].notna()]
+
+
+def merge_truck_network(truck_edges, simplify_m=None):
+    """
+    One feature per contiguous run of a truck class: edges are unioned (so
+    two-way streets collapse to one line), merged through degree-2 nodes,
+    simplified and reduced to truck_class + length_m.
+    """
+    if truck_edges is None or truck_edges.empty:
+        return None
+    simplify_m = TRUCK_SIMPLIFY_M if simplify_m is None else simplify_m
+    proj = truck_edges.to_crs(PROJECTED_CRS)
+    parts = []
+    for cls in CLASS_ORDER:
+        geoms = proj.geometry.values[(proj["truck_class"] == cls).to_numpy()]
+        if len(geoms) == 0:
+            continue
+        merged = shapely.line_merge(shapely.union_all(geoms))
+        lines = shapely.get_parts(merged)
+        lines = shapely.simplify(lines, simplify_m, preserve_topology=True)
+        parts.append(gpd.GeoDataFrame({"truck_class": cls, "length_m": np.round(shapely.length(lines)).astype(int)}, geometry=lines, crs=PROJECTED_CRS))
+    if not parts:
+        return None
+    out = pd.concat(parts, ignore_index=True).to_crs("EPSG:4326")
+    # ~0.1 m in degrees: drops float noise from the reprojection
+    out.geometry = shapely.set_precision(out.geometry.values, 1e-6)
+    return out[~out.geometry.is_empty].reset_index(drop=True)
@@ -23,9 +23,9 @@ sys.path.insert(0, str(PROJECT_ROOT))
 from config import HUNTS_POINT_BOUNDS, H3_RESOLUTION
 
 
-def bbox_to_h3_polygon():
+def bbox_to_h3_polygon(bounds=None):
     """Return GeoJSON-style polygon for Hunts Point bbox (for h3.polygon_to_cells)."""
-    b = HUNTS_POINT_BOUNDS
+    b = bounds or HUNTS_POINT_BOUNDS
     # GeoJSON: first and last point same (closed ring); [lng, lat]
     return [[
         [b["min_lon"], b["min_lat"]],
@@ -36,19 +36,19 @@ def bbox_to_h3_polygon():
     ]]
 
 
-def get_h3_cells_in_bounds(resolution=None):
-    """Return set of H3 cell IDs covering Hunts Point bounds."""
+def get_h3_cells_in_bounds(resolution=None, bounds=None):
+    """Return set of H3 cell IDs covering Hunts Point bounds (or another min/max lat/lon dict)."""
     if h3 is None:
         return set()
     res = resolution if resolution is not None else H3_RESOLUTION
-    b = HUNTS_POINT_BOUNDS
+    b = bounds or HUNTS_POINT_BOUNDS
     outer = [(b["min_lat"], b["min_lon"]), (b["min_lat"], b["max_lon"]), (b["max_lat"], b["max_lon"]), (b["max_lat"], b["min_lon"]), (b["min_lat"], b["min_lon"])]
     try:
         poly = h3.LatLngPoly(outer)
         cells = h3.h3shape_to_cells(poly, res)
     except Exception:
         try:
-            poly = bbox_to_h3_polygon()
+            poly = bbox_to_h3_polygon(bounds)
             cells = h3.polygon_to_cells({"type": "Polygon", "coordinates": [poly]}, res)
         except Exception:
             cells = set()
@@ -78,15 +78,23 @@ def h3_cell_to_polygon(cell_id):
     return None
 
 
-def build_h3_gdf(resolution=None):
-    """Build GeoDataFrame of H3 hexagons covering Hunts Point."""
+def build_h3_gdf(resolution=None, bounds=None, area=None):
+    """
+    Build GeoDataFrame of H3 hexagons covering Hunts Point (or `bounds`), or
+    only the cells of a study-area polygon when `area` is given.
+    """
     if gpd is None or h3 is None:
         return None
-    cells = get_h3_cells_in_bounds(resolution)
+    if area is not None:
+        from backend.data.study_area import study_area_cells
+        cells = study_area_cells(area, resolution)
+    else:
+        cells = get_h3_cells_in_bounds(resolution, bounds)
     if not cells:
         return None
     rows = []
-    for c in cells:
+    # Sorted: a set's order changes between runs, and row order feeds the hotspot permutations
+    for c in sorted(cells):
         geom = h3_cell_to_polygon(c)
         if geom is not None:
             rows.append({"h3_cell": c, "geometry": geom})
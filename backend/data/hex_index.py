@@ -0,0 +1,111 @@
+"""
+In-memory H3 index over the grid layer's per-hex properties.
+Answers "what is the exposure here" by latlng_to_cell + one dict lookup,
+for single points or batches of thousands (columnar in, columnar out).
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import h3
+except ImportError:
+    h3 = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import H3_RESOLUTION
+
+
+class HexIndex:
+    """
+    Columnar copy of grid properties without geometry: cell id -> row, numeric
+    properties as float64 arrays (NaN = missing), other properties as lists.
+    """
+
+    def __init__(self, cells, columns, version=None):
+        self.cells = list(cells)
+        self.row = {c: i for i, c in enumerate(self.cells)}
+        self.columns = columns
+        self.version = version
+        self.resolution = h3.get_resolution(self.cells[0]) if (h3 is not None and self.cells) else H3_RESOLUTION
+
+    @classmethod
+    def from_geojson(cls, geojson, key="h3_cell", version=None):
+        props = [f.get("properties") or {} for f in geojson.get("features", [])]
+        props = [p for p in props if p.get(key) is not None]
+        cells = [p[key] for p in props]
+        names = []
+        for p in props:
+            for k in p:
+                if k != key and k not in names:
+                    names.append(k)
+        columns = {}
+        for name in names:
+            values = [p.get(name) for p in props]
+            if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+                columns[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                columns[name] = values
+        return cls(cells, columns, version=version)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def rows_for_cells(self, cells):
+        """Row per cell id (-1 when the cell is not in the grid)."""
+        get = self.row.get
+        return np.fromiter((get(c, -1) for c in cells), dtype=np.int64, count=len(cells))
+
+    def cells_for_points(self, lat, lon):
+        """H3 cell id at the index resolution for each (lat, lon)."""
+        if h3 is None:
+            raise RuntimeError("h3 is required for point lookups (pip install h3)")
+        res = self.resolution
+        to_cell = h3.latlng_to_cell
+        return [to_cell(a, b, res) for a, b in zip(lat, lon)]
+
+    def record(self, row):
+        """Properties of one row as a dict (None for missing)."""
+        if row < 0:
+            return None
+        out = {}
+        for name, col in self.columns.items():
+            v = col[row]
+            if isinstance(col, np.ndarray):
+                v = None if np.isnan(v) else float(v)
+            out[name] = v
+        return out
+
+    def take(self, rows, fields=None):
+        """Columnar properties for rows; missing rows give None in every column."""
+        rows = np.asarray(rows, dtype=np.int64)
+        found = rows >= 0
+        safe = np.where(found, rows, 0)
+        out = {}
+        for name in fields or self.columns:
+            col = self.columns.get(name)
+            if col is None:
+                continue
+            if isinstance(col, np.ndarray):
+                vals = col[safe]
+                mask = ~found | np.isnan(vals)
+                lst = vals.tolist()
+                if mask.any():
+                    for i in np.flatnonzero(mask).tolist():
+                        lst[i] = None
+                out[name] = lst
+            else:
+                out[name] = [col[r] if ok else None for r, ok in zip(safe.tolist(), found.tolist())]
+        return out
+
+    def lookup_points(self, lat, lon, fields=None):
+        cells = self.cells_for_points(lat, lon)
+        rows = self.rows_for_cells(cells)
+        return {"h3_cell": cells, "found": (rows >= 0).tolist(), "properties": self.take(rows, fields)}
+
+    def lookup_cells(self, cells, fields=None):
+        rows = self.rows_for_cells(cells)
+        return {"h3_cell": list(cells), "found": (rows >= 0).tolist(), "properties": self.take(rows, fields)}
@@ -0,0 +1,196 @@
+"""
+Spatial hotspot statistics on the H3 grid: Getis-Ord Gi* and local Moran's I
+(LISA) with conditional permutation inference.
+
+The neighbour structure is built once as a CSR adjacency from grid_disk
+k-rings (cells missing from the grid are not neighbours). Permutations follow
+the usual conditional-randomization shortcut of sharing one table of random
+draws across cells. Each permutation draws degree+1 distinct cells; a cell
+uses the first `degree` of them that are not itself, which is an exact
+uniform draw from the other n-1 cells. So every cell of a given degree sees
+the same permuted neighbour sums, except the few (cell, permutation) pairs
+where it drew itself. Testing all cells against all permutations is then one
+sort plus a searchsorted per field, with a small correction for those pairs.
+That is O(n log P) rather than n x P x degree gathers, so 999 permutations
+at city scale take seconds on one core.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import h3
+except ImportError:
+    h3 = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import HOTSPOT_FIELDS, HOTSPOT_K, HOTSPOT_PERMUTATIONS, HOTSPOT_ALPHA
+
+LISA_LABELS = np.array(["ns", "HH", "LH", "LL", "HL"], dtype=object)
+
+
+def build_adjacency(cells, k=None):
+    """CSR (indptr, indices) of each cell's k-ring neighbours present in `cells` (self excluded)."""
+    if h3 is None:
+        raise RuntimeError("h3 is required for hotspot analysis (pip install h3)")
+    k = HOTSPOT_K if k is None else k
+    row = {c: i for i, c in enumerate(cells)}
+    indptr = np.zeros(len(cells) + 1, dtype=np.int64)
+    indices = []
+    for i, c in enumerate(cells):
+        nbrs = [row[n] for n in h3.grid_disk(c, k) if n != c and n in row]
+        indices.extend(nbrs)
+        indptr[i + 1] = len(indices)
+    return indptr, np.asarray(indices, dtype=np.int64)
+
+
+def subgraph(indptr, indices, keep):
+    """Adjacency restricted to rows where `keep` is True, renumbered."""
+    new_id = np.full(len(keep), -1, dtype=np.int64)
+    new_id[keep] = np.arange(int(keep.sum()))
+    rows = np.repeat(np.arange(len(keep)), np.diff(indptr))
+    ok = keep[rows] & keep[indices]
+    counts = np.bincount(new_id[rows[ok]], minlength=int(keep.sum()))
+    return np.concatenate([[0], np.cumsum(counts)]), new_id[indices[ok]]
+
+
+def _lag_sums(indptr, indices, X):
+    """Sum of neighbour values per cell for each column of X (n, f)."""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    out = np.zeros((len(indptr) - 1, X.shape[1]))
+    np.add.at(out, rows, X[indices])
+    return out
+
+
+def _fold(larger, permutations):
+    """Folded pseudo p-value from the count of permuted stats >= observed."""
+    larger = np.where(larger > permutations / 2, permutations - larger, larger)
+    return (larger + 1.0) / (permutations + 1.0)
+
+
+def _count_larger(X, lag, degree, draws):
+    """
+    Per cell and column, the number of permutations whose neighbour sum is
+    >= the observed one. draws: (P, max_degree + 1) distinct cell ids per row.
+    """
+    n, f = X.shape
+    permutations = len(draws)
+    larger = np.zeros((n, f), dtype=np.int64)
+    for d in np.unique(degree):
+        if d == 0:
+            continue
+        rows = np.flatnonzero(degree == d)
+        ids, spare = draws[:, :d], draws[:, d]
+        base = X[ids].sum(axis=1)                                   # (P, f)
+        for c in range(f):
+            ranked = np.sort(base[:, c])
+            larger[rows, c] = permutations - np.searchsorted(ranked, lag[rows, c], side="left")
+        # Cells of this degree that drew themselves: swap in the spare draw
+        p, j = np.nonzero(degree[ids] == d)
+        cell = ids[p, j]
+        replaced = base[p] - X[cell] + X[spare[p]]
+        obs = lag[cell]
+        np.add.at(larger, cell, (replaced >= obs).astype(np.int64) - (base[p] >= obs).astype(np.int64))
+    return larger
+
+
+def hotspot_stats(X, indptr, indices, permutations=None, seed=0):
+    """
+    Gi* z-scores, local Moran's I and folded permutation p-values for each
+    column of X (n, f); rows must be finite. Returns dict of (n, f) arrays.
+    Both p-values come from the same permuted neighbour sums: Gi* and the
+    LISA lag are monotone in the neighbour sum for a fixed cell.
+    """
+    permutations = HOTSPOT_PERMUTATIONS if permutations is None else permutations
+    n, f = X.shape
+    degree = np.diff(indptr)
+    mean = X.mean(axis=0)
+    std = X.std(axis=0)
+    std[std == 0] = 1.0
+    lag = _lag_sums(indptr, indices, X)
+
+    # Gi*: binary weights including the cell itself
+    w = degree + 1.0
+    s = np.sqrt((X ** 2).mean(axis=0) - mean ** 2)
+    s[s == 0] = 1.0
+    denom = s[None, :] * np.sqrt((n * w - w ** 2) / (n - 1))[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gi_z = (X + lag - mean[None, :] * w[:, None]) / denom
+        # LISA: row-standardized weights on z-scores
+        z = (X - mean) / std
+        lisa_lag = (lag / degree[:, None] - mean) / std
+    lisa_i = z * lisa_lag
+
+    max_deg = int(degree.max()) if n else 0
+    if permutations and max_deg and n > max_deg + 1:
+        rng = np.random.default_rng(seed)
+        draws = np.stack([rng.choice(n, size=max_deg + 1, replace=False) for _ in range(permutations)])
+        p = _fold(_count_larger(X, lag, degree, draws), permutations)
+    else:
+        p = np.full((n, f), np.nan)
+
+    isolated = degree == 0
+    gi_z[isolated] = np.nan
+    lisa_i[isolated] = np.nan
+    p[isolated] = np.nan
+    return {"gi_z": gi_z, "lisa_i": lisa_i, "lisa_lag": lisa_lag, "z": z, "p": p}
+
+
+def gi_bins(gi_z, p):
+    """-3..3 like ArcGIS Gi_Bin: sign of z, confidence 90/95/99% from the permutation p-value."""
+    level = np.select([p <= 0.01, p <= 0.05, p <= 0.10], [3, 2, 1], 0)
+    return (np.sign(np.nan_to_num(gi_z)) * level).astype(np.int8)
+
+
+def lisa_classes(z, lisa_lag, p, alpha=None):
+    """HH / LH / LL / HL quadrant where significant at alpha, else ns."""
+    alpha = HOTSPOT_ALPHA if alpha is None else alpha
+    quad = np.select(
+        [(z > 0) & (lisa_lag > 0), (z <= 0) & (lisa_lag > 0), (z <= 0) & (lisa_lag <= 0), (z > 0) & (lisa_lag <= 0)],
+        [1, 2, 3, 4], 0,
+    )
+    quad[~(p <= alpha)] = 0
+    return LISA_LABELS[quad]
+
+
+def add_hotspot_columns(grid_gdf, fields=None, k=None, permutations=None, seed=0):
+    """
+    Add <field>_gi_z, <field>_gi_bin, <field>_lisa (class) and <field>_lisa_p
+    for each field present in the grid. Cells with a missing value are left out
+    of that field's analysis (and its neighbours' neighbour sets).
+    """
+    if grid_gdf is None or "h3_cell" not in grid_gdf.columns:
+        return grid_gdf
+    fields = [c for c in (fields or HOTSPOT_FIELDS) if c in grid_gdf.columns]
+    if not fields:
+        return grid_gdf
+    indptr, indices = build_adjacency(grid_gdf["h3_cell"].tolist(), k)
+    X = grid_gdf[fields].to_numpy(dtype=np.float64)
+
+    # Fields sharing the same missing-value pattern are tested together
+    valid = ~np.isnan(X)
+    groups = {}
+    for j, field in enumerate(fields):
+        groups.setdefault(valid[:, j].tobytes(), []).append(j)
+    for cols in groups.values():
+        keep = valid[:, cols[0]]
+        sub_ptr, sub_idx = (indptr, indices) if keep.all() else subgraph(indptr, indices, keep)
+        stats = hotspot_stats(X[keep][:, cols], sub_ptr, sub_idx, permutations, seed)
+        bins = gi_bins(stats["gi_z"], stats["p"])
+        classes = lisa_classes(stats["z"], stats["lisa_lag"], stats["p"])
+        for c, j in enumerate(cols):
+            field = fields[j]
+            for name, values, fill in (
+                ("gi_z", stats["gi_z"][:, c], np.nan),
+                ("gi_bin", bins[:, c], 0),
+                ("lisa", classes[:, c], "ns"),
+                ("lisa_p", stats["p"][:, c], np.nan),
+            ):
+                col = np.full(len(keep), fill, dtype=object if name == "lisa" else float)
+                col[keep] = values
+                grid_gdf[f"{field}_{name}"] = col
+            grid_gdf[f"{field}_gi_bin"] = grid_gdf[f"{field}_gi_bin"].astype(int)
+    return grid_gdf
@@ -27,6 +27,7 @@ from config import (
     CACHE_AIR,
     CACHE_GRAPH,
 )
+from backend.data.freight import classify_truck_edges
 
 
 def ensure_data_dir():
@@ -118,20 +119,22 @@ def _proxy_air_quality():
     return rows
 
 
-def fetch_osmnx_network(use_cache=True):
+def fetch_osmnx_network(use_cache=True, bounds=None):
     """
-    Extract road network for Hunts Point via OSMnx.
+    Extract road network for Hunts Point (or `bounds`, e.g. study_area.area_bounds) via OSMnx.
     Returns (G, nodes_gdf, edges_gdf) or (None, None, None) if OSMnx missing.
+    The cached graph is reused only if it was fetched for a box covering `bounds`.
     """
     if ox is None:
         return None, None, None
 
-    bbox = HUNTS_POINT_BOUNDS
+    bbox = bounds or HUNTS_POINT_BOUNDS
     # OSMnx 2.x bbox = (left, bottom, right, top) = (min_lon, min_lat, max_lon, max_lat)
     bbox_tuple = (bbox["min_lon"], bbox["min_lat"], bbox["max_lon"], bbox["max_lat"])
 
     cache_path = PROJECT_ROOT / CACHE_GRAPH
-    if use_cache and cache_path.exists():
+    bbox_path = cache_path.with_suffix(".bbox.json")
+    if use_cache and cache_path.exists() and _covers(_cached_bbox(bbox_path), bbox):
         try:
             G = ox.load_graphml(str(cache_path.with_suffix(".graphml")))
             nodes_gdf, edges_gdf = ox.graph_to_gdfs(G)
@@ -139,10 +142,15 @@ def fetch_osmnx_network(use_cache=True):
         except Exception:
             pass
 
+    # hgv=designated/destination/no feeds truck-route classification
+    if "hgv" not in ox.settings.useful_tags_way:
+        ox.settings.useful_tags_way = list(ox.settings.useful_tags_way) + ["hgv"]
     try:
         G = ox.graph_from_bbox(bbox_tuple, network_type="drive", simplify=True)
         ensure_data_dir()
         ox.save_graphml(G, str(cache_path.with_suffix(".graphml")))
+        with open(bbox_path, "w") as f:
+            json.dump(bbox, f)
         nodes_gdf, edges_gdf = ox.graph_to_gdfs(G)
         return G, nodes_gdf, edges_gdf
     except Exception as e:
@@ -150,16 +158,26 @@ def fetch_osmnx_network(use_cache=True):
         return None, None, None
 
 
-def get_truck_edges(edges_gdf):
+def _cached_bbox(path):
+    # Graphs cached before the box was recorded were fetched for HUNTS_POINT_BOUNDS
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return HUNTS_POINT_BOUNDS
+
+
+def _covers(outer, inner):
+    return (outer["min_lat"] <= inner["min_lat"] and outer["max_lat"] >= inner["max_lat"]
+            and outer["min_lon"] <= inner["min_lon"] and outer["max_lon"] >= inner["max_lon"])
+
+
+def get_truck_edges(edges_gdf, routes_path=None):
     """
-    Filter edges to freight-relevant (truck) routes from OSM tags.
-    highway in (primary, secondary, trunk, motorway, motorway_link, etc.) or
-    surface/access tags that allow trucks.
+    Filter edges to freight-relevant (truck) routes, with a truck_class column.
+    NYC DOT designated truck routes when the local file exists, else OSM
+    hgv/highway tags (see backend/data/freight.py).
     """
     if edges_gdf is None or edges_gdf.empty:
         return None
-    highway = edges_gdf.get("highway")
-    if highway is None:
-        return edges_gdf
-    # Include all driveable; in production could filter by truck=yes or similar
-    return edges_gdf
+    return classify_truck_edges(edges_gdf, routes_path)
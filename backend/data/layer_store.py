@@ -0,0 +1,229 @@
+"""
+Shared layer store for multi-worker serving.
+
+The build publishes each layer once as pre-encoded bytes (compact JSON plus a
+gzip copy) into an immutable version directory, then flips a CURRENT pointer.
+API workers memory-map the current version read-only: the pages live once in
+the OS page cache no matter how many workers attach, and a new build is picked
+up by re-mapping files instead of re-parsing GeoJSON in every worker.
+
+Layout:
+  data/layer_store/CURRENT                      - version id of the live build
+  data/layer_store/.lock                        - flock held by a publishing process
+  data/layer_store/v<version>/manifest.json     - sizes, hashes, feature counts
+  data/layer_store/v<version>/<layer>.json(.gz) - pre-encoded payloads
+  data/layer_store/v<version>/<layer>.compact.json(.gz) - H3-id format (grid only)
+  data/layer_store/v<version>/<layer>.delta.json - per-feature delta vs previous version
+"""
+
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single publisher assumed
+    fcntl = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import CACHE_LAYER_STORE, LAYER_STORE_KEEP
+
+from backend.data.compact import encode_compact
+from backend.data.deltas import diff_feature_collections
+
+STORE_DIR = PROJECT_ROOT / CACHE_LAYER_STORE
+
+
+def encode_layer(geojson):
+    """Compact JSON bytes for a layer (no whitespace)."""
+    return json.dumps(geojson, separators=(",", ":")).encode("utf-8")
+
+
+@contextmanager
+def exclusive_lock(path):
+    """Hold an exclusive flock on `path` (created if missing) across processes."""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and rename: a server in file mode never reads a half-written layer."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def read_current_version(store_dir=None):
+    """Version id the CURRENT pointer names, or None if nothing is published."""
+    p = Path(store_dir or STORE_DIR) / "CURRENT"
+    try:
+        return int(p.read_text().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def publish_layers(layers, keys=None, store_dir=None, keep=None):
+    """
+    Publish {layer_name: geojson_dict} as a new immutable version and point
+    CURRENT at it. keys: {layer_name: property} for layers that get a
+    per-feature delta against the previous version; layers keyed by h3_cell
+    are also written in the compact H3-id format. Returns the new version id.
+    """
+    store = Path(store_dir or STORE_DIR)
+    store.mkdir(parents=True, exist_ok=True)
+    keys = keys or {}
+    # Two concurrent publishers would both claim previous + 1 and the second rename would fail
+    with exclusive_lock(store / ".lock"):
+        previous = read_current_version(store)
+        version = (previous or 0) + 1
+        tmp = store / f".v{version}.tmp"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir()
+
+        manifest = {"version": version, "previous": previous, "layers": {}}
+        for name, geojson in layers.items():
+            raw = encode_layer(geojson)
+            (tmp / f"{name}.json").write_bytes(raw)
+            gz = gzip.compress(raw, compresslevel=6)
+            (tmp / f"{name}.json.gz").write_bytes(gz)
+            entry = {
+                "bytes": len(raw),
+                "gzip_bytes": len(gz),
+                "sha256": hashlib.sha256(raw).hexdigest(),
+                "features": len(geojson.get("features", [])),
+            }
+            key = keys.get(name)
+            prev_path = store / f"v{previous}" / f"{name}.json" if previous else None
+            if key and prev_path is not None and prev_path.exists():
+                with open(prev_path, "rb") as f:
+                    prev = json.loads(f.read())
+                delta = diff_feature_collections(prev, geojson, key)
+                delta.update({"key": key, "from": previous, "to": version})
+                (tmp / f"{name}.delta.json").write_bytes(encode_layer(delta))
+                entry["delta"] = True
+            if key == "h3_cell":
+                compact = encode_layer(encode_compact(geojson, key=key))
+                (tmp / f"{name}.compact.json").write_bytes(compact)
+                compact_gz = gzip.compress(compact, compresslevel=6)
+                (tmp / f"{name}.compact.json.gz").write_bytes(compact_gz)
+                entry["compact_bytes"] = len(compact)
+                entry["compact_gzip_bytes"] = len(compact_gz)
+            manifest["layers"][name] = entry
+        with open(tmp / "manifest.json", "w") as f:
+            json.dump(manifest, f, indent=1)
+
+        os.replace(tmp, store / f"v{version}")
+        # Atomic pointer flip: readers see either the old or the new version, never a partial one
+        pointer_tmp = store / "CURRENT.tmp"
+        pointer_tmp.write_text(str(version))
+        os.replace(pointer_tmp, store / "CURRENT")
+        _prune(store, version, keep if keep is not None else LAYER_STORE_KEEP)
+        return version
+
+
+def _prune(store, current, keep):
+    """Remove versions older than the last `keep` (mapped files stay valid until unmapped)."""
+    for p in store.glob("v*"):
+        try:
+            v = int(p.name[1:])
+        except ValueError:
+            continue
+        if v <= current - keep:
+            shutil.rmtree(p, ignore_errors=True)
+
+
+class SharedLayerStore:
+    """
+    Read-only, per-worker view of the published layers. refresh() is a single
+    stat of the CURRENT pointer; files are re-mapped only when it changes.
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = Path(store_dir or STORE_DIR)
+        self.version = None
+        self.manifest = {}
+        self._maps = {}
+        self._pointer_mtime = None
+
+    @property
+    def available(self):
+        return self.version is not None
+
+    def refresh(self):
+        """Attach to the current version if the pointer moved. Returns True if it changed."""
+        pointer = self.store_dir / "CURRENT"
+        try:
+            mtime = pointer.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._pointer_mtime:
+            return False
+        self._pointer_mtime = mtime
+        version = read_current_version(self.store_dir)
+        if version is None or version == self.version:
+            return False
+        vdir = self.store_dir / f"v{version}"
+        try:
+            with open(vdir / "manifest.json") as f:
+                manifest = json.load(f)
+            maps = {}
+            for name, entry in manifest["layers"].items():
+                suffixes = [".json", ".json.gz"]
+                if "compact_bytes" in entry:
+                    suffixes += [".compact.json", ".compact.json.gz"]
+                for suffix in suffixes:
+                    maps[name + suffix] = _map_readonly(vdir / (name + suffix))
+        except FileNotFoundError:
+            # Pruned between pointer read and open; try again on the next refresh
+            self._pointer_mtime = None
+            return False
+        # Old maps are released once in-flight responses drop their references
+        self._maps = maps
+        self.manifest = manifest
+        self.version = version
+        return True
+
+    def get(self, name, encoding=None, fmt="geojson"):
+        """
+        mmap of the pre-encoded layer (gzip variant if encoding == "gzip";
+        fmt="compact" for the H3-id format), or None.
+        """
+        suffix = ".compact.json" if fmt == "compact" else ".json"
+        return self._maps.get(name + suffix + (".gz" if encoding == "gzip" else ""))
+
+    def read_delta(self, name):
+        """Parsed per-feature delta of the current version vs the previous one, or None."""
+        if not self.available or not self.manifest["layers"].get(name, {}).get("delta"):
+            return None
+        with open(self.store_dir / f"v{self.version}" / f"{name}.delta.json", "rb") as f:
+            return json.loads(f.read())
+
+
+def _map_readonly(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_chunks(buf, chunk_size=256 * 1024):
+    """Yield a mapped buffer in bounded chunks so a response never copies the whole layer."""
+    view = memoryview(buf)
+    for i in range(0, len(view), chunk_size):
+        yield bytes(view[i : i + chunk_size])
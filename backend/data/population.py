@@ -0,0 +1,178 @@
+"""
+Population-weighted exposure. Census block (or tract) population from a local
+file is spread onto the hex grid with a sparse block -> hex areal-weight
+matrix, optionally dasymetric: only the residential part of a block (land-use
+mask) carries its people. The matrix depends only on the grid, the block file
+and the mask, so it is built once, cached as .npz, and applied as a bincount
+mat-vec: reruns and scenario tweaks (new population, new exposure) take
+milliseconds.
+"""
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import geopandas as gpd
+except ImportError:
+    gpd = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import (
+    POPULATION_BLOCKS,
+    POPULATION_COLUMN,
+    POPULATION_LANDUSE,
+    LANDUSE_COLUMN,
+    RESIDENTIAL_LANDUSE,
+    CACHE_POP_WEIGHTS,
+    POPULATION_HIGH_EXPOSURE,
+)
+
+PROJECTED_CRS = "EPSG:32618"  # UTM 18N: areas in m²
+
+
+def _file_stamp(path):
+    try:
+        st = Path(path).stat()
+    except (FileNotFoundError, TypeError):
+        return "none"
+    return f"{Path(path).resolve()}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def weights_key(cells, blocks_path, landuse_path=None):
+    """Cache key for a weight matrix: grid cell ids plus the block and land-use files."""
+    h = hashlib.sha256()
+    h.update("\n".join(map(str, cells)).encode())
+    h.update(_file_stamp(blocks_path).encode())
+    h.update(_file_stamp(landuse_path).encode())
+    h.update(",".join(RESIDENTIAL_LANDUSE).encode())
+    return h.hexdigest()[:16]
+
+
+def load_blocks(path=None):
+    """Blocks with a numeric population column (EPSG:4326), or None if the file is missing."""
+    p = Path(path or PROJECT_ROOT / POPULATION_BLOCKS)
+    if gpd is None or not p.exists():
+        return None
+    blocks = gpd.read_file(p)
+    if POPULATION_COLUMN not in blocks.columns:
+        raise ValueError(f"{p} has no '{POPULATION_COLUMN}' column")
+    blocks = blocks[blocks.geometry.notna() & ~blocks.geometry.is_empty].to_crs("EPSG:4326")
+    blocks[POPULATION_COLUMN] = blocks[POPULATION_COLUMN].astype(float).fillna(0)
+    return blocks.reset_index(drop=True)
+
+
+def load_residential_landuse(path=None):
+    """Residential land-use polygons (EPSG:4326), or None when no land-use file exists."""
+    p = Path(path or PROJECT_ROOT / POPULATION_LANDUSE)
+    if gpd is None or not p.exists():
+        return None
+    lu = gpd.read_file(p)
+    codes = lu[LANDUSE_COLUMN].astype(str).str.zfill(2)
+    lu = lu[codes.isin(RESIDENTIAL_LANDUSE)]
+    if lu.empty:
+        return None
+    return lu[["geometry"]].to_crs("EPSG:4326").reset_index(drop=True)
+
+
+def build_block_hex_weights(blocks, grid, landuse=None):
+    """
+    COO triplets of the block -> hex matrix: the share of each block's
+    (residential) area falling in each hex. A block's weights sum to 1 when
+    it lies fully inside the grid; people outside the grid are not assigned.
+    Blocks with no residential land keep their whole area.
+    """
+    b = gpd.GeoDataFrame({"block_row": np.arange(len(blocks))}, geometry=blocks.geometry.values, crs=blocks.crs)
+    b = b.to_crs(PROJECTED_CRS)
+    if landuse is not None:
+        # Overlay with the lots (spatially indexed), not one intersection per block with their union
+        res = gpd.overlay(b, landuse.to_crs(PROJECTED_CRS), how="intersection", keep_geom_type=True)
+        res = res[res.geometry.area > 0]
+        b = gpd.GeoDataFrame(
+            pd.concat([res[["block_row", "geometry"]], b[~b["block_row"].isin(res["block_row"])]], ignore_index=True),
+            crs=PROJECTED_CRS,
+        )
+    g = gpd.GeoDataFrame({"hex_row": np.arange(len(grid))}, geometry=grid.geometry.values, crs=grid.crs)
+    g = g.to_crs(PROJECTED_CRS)
+
+    pieces = gpd.overlay(b, g, how="intersection", keep_geom_type=True)
+    block_row = pieces["block_row"].to_numpy(dtype=np.int32)
+    hex_row = pieces["hex_row"].to_numpy(dtype=np.int32)
+    block_area = np.bincount(b["block_row"].to_numpy(), weights=b.geometry.area.to_numpy(), minlength=len(blocks))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = pieces.geometry.area.to_numpy() / block_area[block_row]
+    keep = np.isfinite(weight) & (weight > 0)
+    return {
+        "block": block_row[keep],
+        "hex": hex_row[keep],
+        "weight": weight[keep],
+        "n_blocks": np.int64(len(blocks)),
+        "n_hex": np.int64(len(grid)),
+    }
+
+
+def load_or_build_weights(blocks, grid, cells, blocks_path=None, landuse_path=None, cache_dir=None):
+    """Cached weight matrix for this grid and these inputs; built (and saved) on a miss."""
+    blocks_path = blocks_path or PROJECT_ROOT / POPULATION_BLOCKS
+    landuse_path = landuse_path or PROJECT_ROOT / POPULATION_LANDUSE
+    cache = Path(cache_dir or PROJECT_ROOT / CACHE_POP_WEIGHTS)
+    path = cache / f"block_hex_{weights_key(cells, blocks_path, landuse_path)}.npz"
+    if path.exists():
+        with np.load(path) as z:
+            return {k: z[k] for k in z.files}, True
+    landuse = load_residential_landuse(landuse_path)
+    weights = build_block_hex_weights(blocks, grid, landuse)
+    cache.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, **weights)
+    tmp.replace(path)
+    return weights, False
+
+
+def population_per_hex(weights, population):
+    """People per hex: the sparse block -> hex mat-vec."""
+    population = np.asarray(population, dtype=np.float64)
+    return np.bincount(
+        weights["hex"], weights=weights["weight"] * population[weights["block"]], minlength=int(weights["n_hex"])
+    )
+
+
+def exposure_totals(pop_hex, grid, fields=("exposure_index", "pm25_mean"), high=None):
+    """Total population, people-weighted means of `fields`, and people in highly exposed hexes."""
+    high = POPULATION_HIGH_EXPOSURE if high is None else high
+    totals = {"population": round(float(pop_hex.sum()), 1)}
+    for field in fields:
+        if field not in grid.columns:
+            continue
+        x = grid[field].to_numpy(dtype=np.float64)
+        ok = ~np.isnan(x)
+        people = pop_hex[ok].sum()
+        totals[f"people_weighted_{field}"] = float(np.dot(pop_hex[ok], x[ok]) / people) if people > 0 else None
+    if "exposure_index" in grid.columns:
+        x = grid["exposure_index"].to_numpy(dtype=np.float64)
+        totals["people_high_exposure"] = round(float(pop_hex[x >= high].sum()), 1)
+        totals["high_exposure_threshold"] = high
+    return totals
+
+
+def add_population_exposure(grid_gdf, blocks_path=None, landuse_path=None, cache_dir=None):
+    """
+    Add a `population` column to the grid and return (grid, totals).
+    Returns (grid, None) unchanged when no block population file is present.
+    """
+    blocks = load_blocks(blocks_path)
+    if grid_gdf is None or blocks is None:
+        return grid_gdf, None
+    id_col = "h3_cell" if "h3_cell" in grid_gdf.columns else "cell_id"
+    weights, cached = load_or_build_weights(
+        blocks, grid_gdf, grid_gdf[id_col].tolist(), blocks_path, landuse_path, cache_dir
+    )
+    pop_hex = population_per_hex(weights, blocks[POPULATION_COLUMN].to_numpy())
+    grid_gdf["population"] = pop_hex
+    totals = exposure_totals(pop_hex, grid_gdf)
+    totals.update({"blocks": len(blocks), "weights_nonzero": int(len(weights["weight"])), "weights_cached": cached})
+    return grid_gdf, totals
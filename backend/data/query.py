@@ -0,0 +1,215 @@
+"""
+Read-only analytical SQL over the built per-hex and per-route tables
+(/api/query). DuckDB runs the queries vectorized in-process; tables are
+loaded once per layer version from the columns the server already holds:
+
+  hexes         one row per H3 cell: every grid property (exposure, road_km, hotspots, ...)
+  truck_routes  one row per truck corridor: truck_class, length_m
+  live          one row per (h3_cell, period, metric) of live sensor means; period is
+                1h, 24h or a TIME_BINS name
+
+Only a single SELECT (or WITH ... SELECT) is accepted, with $name parameters.
+File access and configuration changes are disabled, each query is
+interrupted after QUERY_TIMEOUT_SECONDS, and results are cached by (query,
+parameters, versions of the tables it reads).
+"""
+
+import json
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import (
+    QUERY_TIMEOUT_SECONDS,
+    QUERY_MAX_ROWS,
+    QUERY_CACHE_SIZE,
+    QUERY_MEMORY_LIMIT,
+    QUERY_THREADS,
+)
+
+LIVE_TABLE = "live"
+# Conservative: a column or string named live only costs a cache miss
+_LIVE_REF = re.compile(rf"\b{LIVE_TABLE}\b", re.IGNORECASE)
+
+
+class QueryError(ValueError):
+    """Rejected or failed query (bad SQL, not a SELECT, bad parameters)."""
+
+
+class QueryTimeout(QueryError):
+    """Query ran longer than the time limit."""
+
+
+def hex_table(index):
+    """HexIndex columns as a DataFrame (h3_cell first)."""
+    return pd.DataFrame({"h3_cell": index.cells, **index.columns})
+
+
+def feature_table(geojson, id_name="feature_id"):
+    """Feature properties of a FeatureCollection as a DataFrame (no geometry)."""
+    props = [f.get("properties") or {} for f in geojson.get("features", [])]
+    df = pd.DataFrame.from_records(props)
+    df.insert(0, id_name, np.arange(len(df)))
+    return df
+
+
+def live_table(aggregates):
+    """Long table (h3_cell, period, metric, mean) from RollingHexAggregator.aggregates()."""
+    rows = []
+    for cell, entry in aggregates.items():
+        periods = {k: v for k, v in entry.items() if k not in ("time_bins", "count")}
+        periods.update(entry.get("time_bins", {}))
+        for period, means in periods.items():
+            for metric, value in means.items():
+                rows.append((cell, period, metric, value))
+    return pd.DataFrame(rows, columns=["h3_cell", "period", "metric", "mean"])
+
+
+def _check_params(params):
+    if params is None:
+        return {}
+    if not isinstance(params, dict):
+        raise QueryError("params must be an object of name -> value")
+    for k, v in params.items():
+        if not isinstance(k, str) or not k.isidentifier():
+            raise QueryError(f"bad parameter name: {k!r}")
+        if not (v is None or isinstance(v, (bool, int, float, str))):
+            raise QueryError(f"parameter {k} must be a number, string, boolean or null")
+    return params
+
+
+def _json_value(v):
+    if v is None or isinstance(v, (bool, int, str)):
+        return v
+    if isinstance(v, float):
+        return v if math.isfinite(v) else None
+    return str(v)
+
+
+class QueryEngine:
+    """One DuckDB database per layer version; the live table is replaced when the stream changes."""
+
+    def __init__(self, timeout=None, max_rows=None, cache_size=None):
+        self.timeout = QUERY_TIMEOUT_SECONDS if timeout is None else timeout
+        self.max_rows = QUERY_MAX_ROWS if max_rows is None else max_rows
+        self.cache_size = QUERY_CACHE_SIZE if cache_size is None else cache_size
+        self._lock = threading.Lock()
+        self._con = None
+        self._layer_version = None
+        self._live_version = None
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def available(self):
+        return duckdb is not None
+
+    def _connect(self, tables):
+        con = duckdb.connect(":memory:")
+        con.execute(f"SET threads = {int(QUERY_THREADS)}")
+        con.execute(f"SET memory_limit = '{QUERY_MEMORY_LIMIT}'")
+        for name, df in tables.items():
+            con.register(f"{name}_df", df)
+            con.execute(f"CREATE TABLE {name} AS SELECT * FROM {name}_df")
+            con.unregister(f"{name}_df")
+        con.execute(f"CREATE TABLE {LIVE_TABLE} (h3_cell VARCHAR, period VARCHAR, metric VARCHAR, mean DOUBLE)")
+        # No files, no extensions, no Python-variable scans; settings cannot be changed back
+        con.execute("SET enable_external_access = false")
+        con.execute("SET python_enable_replacements = false")
+        con.execute("SET lock_configuration = true")
+        return con
+
+    def _sync(self, layer_version, layer_tables, live_version, live_rows):
+        """Reload tables whose source version moved; returns the connection to query."""
+        with self._lock:
+            if self._con is None or layer_version != self._layer_version:
+                self._con = self._connect(layer_tables())
+                self._layer_version = layer_version
+                self._live_version = None
+            if live_version != self._live_version:
+                df = live_rows()
+                cur = self._con.cursor()
+                cur.register("live_df", df)
+                cur.execute(f"DELETE FROM {LIVE_TABLE}")
+                cur.execute(f"INSERT INTO {LIVE_TABLE} SELECT * FROM live_df")
+                cur.unregister("live_df")
+                self._live_version = live_version
+            return self._con
+
+    @staticmethod
+    def _validate(sql):
+        if not isinstance(sql, str) or not sql.strip():
+            raise QueryError("sql is required")
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as e:
+            raise QueryError(str(e)) from None
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise QueryError("only a single SELECT statement is allowed")
+
+    def run(self, sql, params, layer_version, layer_tables, live_version, live_rows):
+        """
+        Execute a read-only query. layer_tables / live_rows are callables
+        returning the DataFrames, called only when their version is new.
+        Returns {"columns", "rows", "row_count", "truncated", "cached", "elapsed_ms"}.
+        """
+        if duckdb is None:
+            raise RuntimeError("duckdb is required for /api/query (pip install duckdb)")
+        self._validate(sql)
+        params = _check_params(params)
+        con = self._sync(layer_version, layer_tables, live_version, live_rows)
+
+        # Results that do not read the live table survive new readings
+        reads_live = _LIVE_REF.search(sql) is not None
+        key = (sql.strip(), json.dumps(params, sort_keys=True), layer_version, live_version if reads_live else None)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return {**cached, "cached": True}
+            self.misses += 1
+
+        t0 = time.perf_counter()
+        cur = con.cursor()
+        timer = threading.Timer(self.timeout, cur.interrupt)
+        timer.start()
+        try:
+            cur.execute(sql, params or None)
+            columns = [d[0] for d in cur.description]
+            rows = cur.fetchmany(self.max_rows + 1)
+        except duckdb.InterruptException:
+            raise QueryTimeout(f"query exceeded {self.timeout:g} s") from None
+        except duckdb.Error as e:
+            raise QueryError(str(e)) from None
+        finally:
+            timer.cancel()
+            cur.close()
+        truncated = len(rows) > self.max_rows
+        result = {
+            "columns": columns,
+            "rows": [[_json_value(v) for v in r] for r in rows[: self.max_rows]],
+            "row_count": min(len(rows), self.max_rows),
+            "truncated": truncated,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return {**result, "cached": False}
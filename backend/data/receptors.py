@@ -0,0 +1,158 @@
+"""
+Sensitive-receptor proximity: network distance from schools, daycares, clinics
+and NYCHA homes to the nearest truck route.
+
+The street graph is built from the edge geometries (endpoints are the nodes).
+One multi-source Dijkstra from every truck-route node gives the distance from
+each node to its nearest truck corridor. Receptors and hexagon centroids are
+then snapped to their nearest node with a KD-tree. The cost is one graph
+search plus n log n lookups, rather than one geometry test per receptor and
+edge.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import geopandas as gpd
+    import shapely
+except ImportError:
+    gpd = shapely = None
+
+try:
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import dijkstra
+    from scipy.spatial import cKDTree
+except ImportError:
+    coo_matrix = dijkstra = cKDTree = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import (
+    RECEPTORS_FILE,
+    RECEPTOR_KIND_COLUMN,
+    RECEPTOR_MAX_SNAP_M,
+    RECEPTOR_DECAY_M,
+    RECEPTOR_NEAR_M,
+)
+
+PROJECTED_CRS = "EPSG:32618"  # UTM 18N: distances in m
+_NODE_PRECISION = 1e7         # endpoint rounding (~1 cm) used to identify nodes
+
+
+def load_receptors(path=None):
+    """Receptor points (EPSG:4326) with a `kind` column, or None if the file is missing."""
+    p = Path(path or PROJECT_ROOT / RECEPTORS_FILE)
+    if gpd is None or not p.exists():
+        return None
+    rec = gpd.read_file(p)
+    rec = rec[rec.geometry.notna() & ~rec.geometry.is_empty].to_crs("EPSG:4326")
+    # NYCHA developments and campuses come as polygons
+    rec = rec.set_geometry(rec.geometry.representative_point())
+    if RECEPTOR_KIND_COLUMN not in rec.columns:
+        rec[RECEPTOR_KIND_COLUMN] = "receptor"
+    return rec.reset_index(drop=True)
+
+
+def _endpoint_keys(geoms):
+    """Rounded (lon, lat) of the first and last vertex of each line, as int64 pairs."""
+    starts = shapely.get_coordinates(shapely.get_point(geoms, 0))
+    ends = shapely.get_coordinates(shapely.get_point(geoms, -1))
+    return np.rint(starts * _NODE_PRECISION).astype(np.int64), np.rint(ends * _NODE_PRECISION).astype(np.int64)
+
+
+def street_graph(edges_gdf, truck_edges=None):
+    """
+    Undirected street graph from edge geometries. Returns a dict with the
+    sparse adjacency (lengths in m), projected node coordinates and the node
+    ids touched by truck_edges.
+    """
+    edges = edges_gdf[edges_gdf.geometry.notna()]
+    edges = edges.set_crs("EPSG:4326", allow_override=True)
+    geoms = edges.geometry.values
+    start, end = _endpoint_keys(geoms)
+    parts = [start, end]
+    if truck_edges is not None and not truck_edges.empty:
+        t_start, t_end = _endpoint_keys(truck_edges[truck_edges.geometry.notna()].geometry.values)
+        parts += [t_start, t_end]
+    keys, inverse = np.unique(np.concatenate(parts), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    m = len(edges)
+    u, v = inverse[:m], inverse[m:2 * m]
+    sources = np.unique(inverse[2 * m:])
+
+    if "length" in edges.columns:
+        length = edges["length"].to_numpy(dtype=np.float64)
+    else:
+        length = edges.to_crs(PROJECTED_CRS).geometry.length.to_numpy()
+    # Keep the shortest of parallel edges; drop self-loops (coo_matrix would sum duplicates)
+    ok = (u != v) & np.isfinite(length)
+    u, v, length = np.minimum(u[ok], v[ok]), np.maximum(u[ok], v[ok]), length[ok]
+    order = np.lexsort((length, v, u))
+    u, v, length = u[order], v[order], length[order]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    n = len(keys)
+    adjacency = coo_matrix((length[first], (u[first], v[first])), shape=(n, n)).tocsr()
+
+    xy = gpd.GeoSeries(gpd.points_from_xy(keys[:, 0] / _NODE_PRECISION, keys[:, 1] / _NODE_PRECISION), crs="EPSG:4326")
+    return {"adjacency": adjacency, "xy": shapely.get_coordinates(xy.to_crs(PROJECTED_CRS).values), "sources": sources}
+
+
+def distance_to_sources(graph):
+    """Network distance (m) from every node to the nearest source node (inf if unreachable)."""
+    n = graph["adjacency"].shape[0]
+    if len(graph["sources"]) == 0:
+        return np.full(n, np.inf)
+    return dijkstra(graph["adjacency"], directed=False, indices=graph["sources"], min_only=True)
+
+
+def snap_distance(points, graph, node_dist, max_snap=None):
+    """Distance to the nearest truck route for projected points: snap to the nearest node, then follow the network."""
+    max_snap = RECEPTOR_MAX_SNAP_M if max_snap is None else max_snap
+    snap, node = cKDTree(graph["xy"]).query(points, distance_upper_bound=max_snap)
+    dist = np.full(len(points), np.nan)
+    ok = np.isfinite(snap)
+    dist[ok] = snap[ok] + node_dist[node[ok]]
+    dist[~np.isfinite(dist)] = np.nan
+    return dist
+
+
+def add_receptor_proximity(grid_gdf, edges_gdf, truck_edges, receptors_path=None):
+    """
+    Add truck_dist_m, receptor_count, receptors_near_truck and
+    receptor_proximity (0..1) to the grid and return (grid, receptors).
+    receptor_proximity sums exp(-d / RECEPTOR_DECAY_M) over a hex's receptors,
+    scaled by the largest hex. Returns (grid, None) unchanged when there is no
+    receptor file, street network or scipy.
+    """
+    receptors = load_receptors(receptors_path)
+    if grid_gdf is None or receptors is None or edges_gdf is None or edges_gdf.empty or dijkstra is None:
+        return grid_gdf, None
+    graph = street_graph(edges_gdf, truck_edges)
+    node_dist = distance_to_sources(graph)
+
+    centroids = grid_gdf.geometry.to_crs(PROJECTED_CRS).centroid
+    grid_gdf["truck_dist_m"] = snap_distance(shapely.get_coordinates(centroids.values), graph, node_dist)
+
+    rec_xy = shapely.get_coordinates(receptors.geometry.to_crs(PROJECTED_CRS).values)
+    receptors["truck_dist_m"] = snap_distance(rec_xy, graph, node_dist)
+    id_col = "h3_cell" if "h3_cell" in grid_gdf.columns else "cell_id"
+    joined = gpd.sjoin(receptors, grid_gdf[[id_col, "geometry"]], how="left", predicate="within")
+    joined = joined[~joined.index.duplicated()]
+    receptors[id_col] = joined[id_col]
+
+    d = receptors["truck_dist_m"]
+    receptors["weight"] = np.exp(-d.fillna(np.inf) / RECEPTOR_DECAY_M)
+    receptors["near_truck"] = d <= RECEPTOR_NEAR_M
+    per_hex = receptors.dropna(subset=[id_col]).groupby(id_col).agg(
+        receptor_count=("weight", "size"), receptors_near_truck=("near_truck", "sum"), receptor_proximity=("weight", "sum")
+    )
+    grid_gdf = grid_gdf.drop(columns=[c for c in per_hex.columns if c in grid_gdf.columns])
+    grid_gdf = grid_gdf.merge(per_hex, left_on=id_col, right_index=True, how="left")
+    grid_gdf[["receptor_count", "receptors_near_truck"]] = grid_gdf[["receptor_count", "receptors_near_truck"]].fillna(0).astype(int)
+    top = grid_gdf["receptor_proximity"].max()
+    grid_gdf["receptor_proximity"] = (grid_gdf["receptor_proximity"].fillna(0) / (top if top and top > 0 else 1)).clip(0, 1)
+    return grid_gdf, receptors.drop(columns=["weight"])
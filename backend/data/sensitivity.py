@@ -0,0 +1,254 @@
+"""
+Monte Carlo sensitivity of the exposure index to its (illustrative) weights.
+
+Weight vectors are drawn from a Dirichlet centred on the defaults
+(EXPOSURE_WEIGHTS, plus EXPOSURE_RECEPTOR_WEIGHT when receptor proximity is
+present). When PM2.5 is the flat-data proxy, the PM25_PROXY_BLEND is drawn
+too. Every draw is scored at once as a (samples x components) @
+(components x cells) matrix product, in chunks that bound memory. Two passes
+are made: one over sample chunks for ranks and top-share membership, and one
+over cell chunks for percentile bands. Ranks come from per-draw histograms
+rather than sorts, so the cost is linear in samples x cells; only draws whose
+scores are too skewed for the histogram are sorted.
+"""
+
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import (
+    EXPOSURE_WEIGHTS,
+    EXPOSURE_RECEPTOR_WEIGHT,
+    PM25_PROXY_BLEND,
+    SENSITIVITY_SAMPLES,
+    SENSITIVITY_CONCENTRATION,
+    SENSITIVITY_BAND,
+    SENSITIVITY_TOP_SHARE,
+)
+from backend.data.spatial import PM25_PROXY_LABEL
+
+# float32 scores held per chunk (samples x cells)
+_CHUNK_VALUES = 1_000_000
+# Histogram bins per sample for ranks
+RANK_BINS = 4096
+# Largest gap allowed between default-weight scores and the published exposure_index
+DEFAULT_INDEX_TOLERANCE = 1e-6
+# Largest percentile-rank error a histogram mid-rank may have; draws whose
+# crowdest bin exceeds it (skewed scores) are ranked exactly by sorting
+RANK_MAX_ERROR = 0.001
+
+
+def _mid_ranks(s):
+    """Exact 0-based ranks per row, ties sharing their average rank."""
+    rows, n = s.shape
+    order = np.argsort(s, axis=1, kind="stable")
+    v = np.take_along_axis(s, order, axis=1)
+    idx = np.broadcast_to(np.arange(n), (rows, n))
+    first = np.ones((rows, n), dtype=bool)
+    first[:, 1:] = v[:, 1:] != v[:, :-1]
+    last = np.ones((rows, n), dtype=bool)
+    last[:, :-1] = first[:, 1:]
+    start = np.maximum.accumulate(np.where(first, idx, 0), axis=1)
+    end = np.minimum.accumulate(np.where(last, idx, n - 1)[:, ::-1], axis=1)[:, ::-1]
+    out = np.empty((rows, n))
+    np.put_along_axis(out, order, (start + end) / 2.0, axis=1)
+    return out
+
+
+def _minmax(x):
+    lo = x.min(axis=-1, keepdims=True)
+    span = x.max(axis=-1, keepdims=True) - lo
+    return (x - lo) / np.where(span > 0, span, 1)
+
+
+class _Model:
+    """
+    The exposure index as coefficients (samples x components) applied to
+    component rows (components x cells), plus a per-sample intercept, so that
+    scoring any block is one matmul. Scores are clipped to [0, 1] like
+    exposure_index.
+
+    Normalization (road_km, PM2.5) is over the whole grid, as in the exposure
+    stage; `keep` (boolean mask) then restricts scoring to the cells that are
+    published, so ranks are among those.
+    """
+
+    def __init__(self, grid, samples, concentration, seed, keep=None):
+        rng = np.random.default_rng(seed)
+        n = len(grid)
+        col = lambda name, fill: grid[name].fillna(fill).to_numpy(dtype=np.float64) if name in grid.columns else np.full(n, fill)
+        base = np.asarray(EXPOSURE_WEIGHTS, dtype=np.float64)
+        rest = [col("congestion", 0.5), col("noise_proxy", 0.5)]
+        if "receptor_proximity" in grid.columns:
+            rest.append(col("receptor_proximity", 0.0))
+            base = np.append((1 - EXPOSURE_RECEPTOR_WEIGHT) * base, EXPOSURE_RECEPTOR_WEIGHT)
+        self.base = base
+        w = rng.dirichlet(concentration * base, size=samples)                    # (S, k)
+
+        self.proxy = "data_type" in grid.columns and bool((grid["data_type"] == PM25_PROXY_LABEL).any())
+        if self.proxy:
+            # pm25 = const + 6 * (a * road_n + b * noise), so after min-max normalization
+            # w_pm * pm_n is linear in road_n and noise: fold it into their coefficients
+            blend = rng.dirichlet(concentration * np.asarray(PM25_PROXY_BLEND, dtype=np.float64), size=samples)
+            road = _minmax(col("road_km", 0.0))
+            pair = np.stack([road, rest[1]])
+            lo, span = self._row_range(blend, pair)
+            f = w[:, 0] / span
+            coef = np.column_stack([f * blend[:, 0], w[:, 1], w[:, 2] + f * blend[:, 1], w[:, 3:]])
+            self.intercept = -f * lo
+            self.components = np.stack([road] + rest)
+            self._default_pm = _minmax(np.asarray(PM25_PROXY_BLEND) @ pair)
+        else:
+            coef = w
+            self.intercept = np.zeros(samples)
+            self._default_pm = _minmax(col("pm25_mean", 12.0))
+            self.components = np.stack([self._default_pm] + rest)
+        self._rest = np.stack(rest)
+        if keep is not None:
+            keep = np.asarray(keep, dtype=bool)
+            self.components = self.components[:, keep]
+            self._rest = self._rest[:, keep]
+            self._default_pm = self._default_pm[keep]
+        self.coef = coef.astype(np.float32)
+        self.components = self.components.astype(np.float32)
+        self.intercept = self.intercept.astype(np.float32)
+
+    @staticmethod
+    def _row_range(blend, pair):
+        """Per-sample min and span over cells of blend @ pair, in chunks."""
+        lo = np.empty(len(blend))
+        hi = np.empty(len(blend))
+        step = max(1, _CHUNK_VALUES // max(pair.shape[1], 1))
+        for start in range(0, len(blend), step):
+            raw = blend[start:start + step] @ pair
+            lo[start:start + step] = raw.min(axis=1)
+            hi[start:start + step] = raw.max(axis=1)
+        span = hi - lo
+        return lo, np.where(span > 0, span, 1)
+
+    def scores(self, rows=slice(None), cells=slice(None)):
+        """(samples x cells) float32 exposure scores."""
+        s = self.coef[rows] @ self.components[:, cells] + self.intercept[rows, None]
+        return np.clip(s, 0, 1, out=s)
+
+    def cell_scores(self, cells):
+        """(cells x samples) float32: contiguous per cell, for per-cell percentiles."""
+        s = self.components[:, cells].T @ self.coef.T + self.intercept[None, :]
+        return np.clip(s, 0, 1, out=s)
+
+    def default_scores(self):
+        return np.clip(self.base[0] * self._default_pm + self.base[1:] @ self._rest, 0, 1)
+
+
+def weight_sensitivity(grid, samples=None, concentration=None, seed=0, band=None, top_share=None, keep=None):
+    """
+    Per-cell arrays: mean and sd of the percentile rank (1 = most exposed),
+    probability of being in the top `top_share`, and the exposure band
+    (low/high percentiles) across `samples` weight draws. Also a summary dict.
+    `grid` must be the grid the exposure stage normalized over; `keep` selects
+    the cells to rank (arrays are over those). RuntimeError if the default
+    weights do not reproduce exposure_index.
+    """
+    samples = samples or SENSITIVITY_SAMPLES
+    concentration = concentration or SENSITIVITY_CONCENTRATION
+    band = band or SENSITIVITY_BAND
+    top_share = top_share or SENSITIVITY_TOP_SHARE
+    t0 = time.perf_counter()
+    model = _Model(grid, samples, concentration, seed, keep=keep)
+    n = model.components.shape[1]
+    default = model.default_scores()
+    index_error = 0.0
+    if "exposure_index" in grid.columns and n:
+        published = grid["exposure_index"].to_numpy(dtype=np.float64)
+        if keep is not None:
+            published = published[np.asarray(keep, dtype=bool)]
+        index_error = float(np.nanmax(np.abs(default - published)))
+        if index_error > DEFAULT_INDEX_TOLERANCE:
+            raise RuntimeError(
+                f"default weights give scores up to {index_error:.3g} off exposure_index: "
+                "the sensitivity model no longer matches pollution_exposure_index")
+
+    # Ranks: whole rows (all cells) for a chunk of samples. Mid-ranks come from a
+    # per-sample histogram CDF (RANK_BINS bins between the row min and max)
+    # instead of a sort; a cell is in the top share when its mid-rank is. A bin
+    # of c cells puts its mid-rank up to (c - 1) / 2 ranks off, so rows with a
+    # bin over max_bin (skewed scores piled into a few bins) are sorted instead.
+    rank_sum = np.zeros(n)
+    rank_sq = np.zeros(n)
+    top = np.zeros(n, dtype=np.int64)
+    cutoff = n - max(1, math.ceil(top_share * n))
+    max_bin = 1 + 2 * RANK_MAX_ERROR * max(n - 1, 1)
+    exact_rows = 0
+    step = max(1, _CHUNK_VALUES // max(n, RANK_BINS))  # rows x bins histogram arrays too
+    for start in range(0, samples, step):
+        s = model.scores(rows=slice(start, start + step))
+        rows = len(s)
+        lo_s = s.min(axis=1, keepdims=True)
+        span = s.max(axis=1, keepdims=True) - lo_s
+        bins = ((s - lo_s) * ((RANK_BINS - 1) / np.where(span > 0, span, 1))).astype(np.int64)
+        bins += (np.arange(rows) * RANK_BINS)[:, None]
+        counts = np.bincount(bins.ravel(), minlength=rows * RANK_BINS).reshape(rows, RANK_BINS)
+        below = np.cumsum(counts, axis=1) - counts
+        mid = (below + (counts - 1) / 2.0).ravel()
+        ranks = mid[bins]
+        crowded = counts.max(axis=1) > max_bin
+        if crowded.any():
+            ranks[crowded] = _mid_ranks(s[crowded])
+            exact_rows += int(crowded.sum())
+        rank_sum += ranks.sum(axis=0)
+        rank_sq += (ranks ** 2).sum(axis=0)
+        top += (ranks >= cutoff).sum(axis=0)
+
+    # Bands: all samples for a chunk of cells (nearest-rank percentiles)
+    k_lo, k_hi = (int(round(q / 100 * (samples - 1))) for q in band)
+    lo = np.empty(n)
+    hi = np.empty(n)
+    step = max(1, _CHUNK_VALUES // samples)
+    for start in range(0, n, step):
+        cells = slice(start, start + step)
+        part = np.partition(model.cell_scores(cells), (k_lo, k_hi), axis=1)
+        lo[cells], hi[cells] = part[:, k_lo], part[:, k_hi]
+
+    scale = max(n - 1, 1)
+    rank_mean = rank_sum / samples / scale
+    rank_sd = np.sqrt(np.maximum(rank_sq / samples / scale ** 2 - rank_mean ** 2, 0))
+    top_prob = top / samples
+    default_top = np.argsort(default)[cutoff:]
+    summary = {
+        "samples": samples,
+        "concentration": concentration,
+        "components": len(model.base),
+        "pm25_proxy_blend_sampled": model.proxy,
+        "median_rank_sd": round(float(np.median(rank_sd)), 4) if n else None,
+        # How often the default top cells stay on top, and how many are on top in 90% of draws
+        "default_top_retention": round(float(top_prob[default_top].mean()), 4) if n else None,
+        "robust_top_cells": int((top_prob >= 0.9).sum()),
+        # Draws ranked by sorting because the histogram was too coarse for them
+        "exact_rank_draws": exact_rows,
+        "default_index_max_error": index_error,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    return {"rank_mean": rank_mean, "rank_sd": rank_sd, "top_prob": top_prob, "lo": lo, "hi": hi}, summary
+
+
+def add_sensitivity_columns(grid_gdf, samples=None, seed=0, keep=None):
+    """
+    Add exposure_rank_mean, exposure_rank_sd, exposure_top_prob, exposure_index_lo/_hi;
+    return (grid, summary). Run on the grid exposure_index was computed on; with
+    `keep` only those cells are ranked (the others get NaN).
+    """
+    if grid_gdf is None or len(grid_gdf) == 0:
+        return grid_gdf, None
+    stats, summary = weight_sensitivity(grid_gdf, samples=samples, seed=seed, keep=keep)
+    rows = np.ones(len(grid_gdf), dtype=bool) if keep is None else np.asarray(keep, dtype=bool)
+    for col, name in (("exposure_rank_mean", "rank_mean"), ("exposure_rank_sd", "rank_sd"), ("exposure_top_prob", "top_prob"),
+                      ("exposure_index_lo", "lo"), ("exposure_index_hi", "hi")):
+        values = np.full(len(grid_gdf), np.nan)
+        values[rows] = stats[name]
+        grid_gdf[col] = values
+    return grid_gdf, summary
@@ -27,8 +27,16 @@ from config import (
     DATA_DIR,
     CACHE_GRID,
     CACHE_LAYERS,
+    CACHE_311_BY_HEX,
+    EXPOSURE_RECEPTOR_WEIGHT,
+    EXPOSURE_WEIGHTS,
+    PM25_PROXY_BLEND,
 )
 
+from backend.data.study_area import clip_to_mask, points_in_mask
+
+PM25_PROXY_LABEL = "proxy (spatially adjusted from roads & truck routes)"
+
 
 def get_bounds_box():
     b = HUNTS_POINT_BOUNDS
@@ -37,9 +45,16 @@ def get_bounds_box():
     return box(b["min_lon"], b["min_lat"], b["max_lon"], b["max_lat"])
 
 
-def build_grid_gdf():
-    """Build high-resolution grid (cells) over Hunts Point."""
+def build_grid_gdf(area=None):
+    """
+    Build high-resolution grid (cells) over Hunts Point, or over the bounding
+    box of `area` keeping the cells whose centre lies in it (the rule
+    build_h3_gdf uses, so both grids have the same footprint).
+    """
     b = HUNTS_POINT_BOUNDS
+    if area is not None:
+        xmin, ymin, xmax, ymax = area.bounds
+        b = {"min_lon": xmin, "min_lat": ymin, "max_lon": xmax, "max_lat": ymax}
     xmin, ymin = b["min_lon"], b["min_lat"]
     xmax, ymax = b["max_lon"], b["max_lat"]
     xs = np.linspace(xmin, xmax, GRID_COLS + 1)
@@ -53,6 +68,13 @@ def build_grid_gdf():
     if gpd is None:
         return None
     gdf = gpd.GeoDataFrame(cells, crs="EPSG:4326")
+    if area is not None:
+        from backend.data.study_area import points_in_mask
+        cx = (xs[:-1] + xs[1:]) / 2
+        cy = (ys[:-1] + ys[1:]) / 2
+        lat = np.repeat(cy, GRID_COLS)
+        lon = np.tile(cx, GRID_ROWS)
+        gdf = gdf[points_in_mask(lat, lon, area)].reset_index(drop=True)
     return gdf
 
 
@@ -61,10 +83,11 @@ def point_in_bounds(lat, lon):
     return b["min_lat"] <= lat <= b["max_lat"] and b["min_lon"] <= lon <= b["max_lon"]
 
 
-def aggregate_air_to_grid(air_df, grid_gdf):
+def aggregate_air_to_grid(air_df, grid_gdf, mask=None):
     """
     Aggregate air quality (PM2.5) to grid. If air_df has lat/lon, spatial join;
-    else assign borough average to all cells (with label).
+    else assign borough average to all cells (with label). mask (study_area.grid_mask)
+    drops points outside the grid before the join; the fill value still uses all points.
     """
     if grid_gdf is None or air_df is None or air_df.empty:
         return grid_gdf
@@ -75,9 +98,10 @@ def aggregate_air_to_grid(air_df, grid_gdf):
         )
         if pm_col is None:
             pm_col = air_df.columns[-1]
+        near = air_df[points_in_mask(air_df["lat"], air_df["lon"], mask)] if mask is not None else air_df
         pts = gpd.GeoDataFrame(
-            air_df,
-            geometry=[Point(x, y) for x, y in zip(air_df["lon"], air_df["lat"])],
+            near,
+            geometry=gpd.points_from_xy(near["lon"], near["lat"]),
             crs="EPSG:4326",
         )
         id_col = _grid_id_col(grid_gdf)
@@ -104,10 +128,11 @@ def _grid_id_col(grid_gdf):
     return "h3_cell" if "h3_cell" in grid_gdf.columns else "cell_id"
 
 
-def add_congestion_proxy(grid_gdf, edges_gdf=None):
+def add_congestion_proxy(grid_gdf, edges_gdf=None, mask=None):
     """
     Congestion proxy: road density / centrality per cell.
     If edges_gdf provided (OSMnx), use edge length per cell; else distance from center.
+    mask (study_area.grid_mask) drops edges outside the grid before the join.
     """
     if grid_gdf is None:
         return grid_gdf
@@ -120,7 +145,7 @@ def add_congestion_proxy(grid_gdf, edges_gdf=None):
     geom_cols = [id_col, "geometry"]
 
     if edges_gdf is not None and not edges_gdf.empty and "geometry" in edges_gdf.columns:
-        edges = edges_gdf.copy()
+        edges = clip_to_mask(edges_gdf, mask).copy()
         edges = edges.set_crs("EPSG:4326", allow_override=True)
         edges_proj = edges.to_crs("EPSG:32618")  # UTM 18N for NYC area
         edges["length_km"] = edges_proj.geometry.length / 1000.0
@@ -163,8 +188,9 @@ def add_pollution_proxy_when_flat(grid_gdf):
     else:
         n = 0.5
     # 10–18 µg/m³ range: higher near roads and noisier areas
-    grid_gdf["pm25_mean"] = base + 6.0 * (0.6 * rk_n + 0.4 * n).clip(0, 1)
-    grid_gdf["data_type"] = "proxy (spatially adjusted from roads & truck routes)"
+    a, b = PM25_PROXY_BLEND
+    grid_gdf["pm25_mean"] = base + 6.0 * (a * rk_n + b * n).clip(0, 1)
+    grid_gdf["data_type"] = PM25_PROXY_LABEL
     return grid_gdf
 
 
@@ -186,7 +212,9 @@ def add_noise_proxy(grid_gdf, edges_gdf=None):
 def pollution_exposure_index(grid_gdf):
     """
     Exposure = f(pollution, traffic density, proximity to roads).
-    Simple: weighted average of normalized pm25, congestion, noise.
+    Simple: weighted average of normalized pm25, congestion, noise. When
+    receptor_proximity is present (sensitive receptors near truck routes) it
+    takes EXPOSURE_RECEPTOR_WEIGHT of the index.
     """
     if grid_gdf is None:
         return grid_gdf
@@ -194,11 +222,34 @@ def pollution_exposure_index(grid_gdf):
     pm_n = (pm - pm.min()) / (pm.max() - pm.min() or 1)
     c = grid_gdf.get("congestion", 0.5).fillna(0.5)
     n = grid_gdf.get("noise_proxy", 0.5).fillna(0.5)
-    grid_gdf["exposure_index"] = 0.5 * pm_n + 0.3 * c + 0.2 * n
+    w_pm, w_c, w_n = EXPOSURE_WEIGHTS
+    grid_gdf["exposure_index"] = w_pm * pm_n + w_c * c + w_n * n
+    if "receptor_proximity" in grid_gdf.columns:
+        w = EXPOSURE_RECEPTOR_WEIGHT
+        grid_gdf["exposure_index"] = (1 - w) * grid_gdf["exposure_index"] + w * grid_gdf["receptor_proximity"].fillna(0)
     grid_gdf["exposure_index"] = grid_gdf["exposure_index"].clip(0, 1)
     return grid_gdf
 
 
+def add_311_counts(grid_gdf, path=None):
+    """
+    Join complaint_count from scripts/fetch_311_noise.py output by H3 cell
+    (0 for cells with no complaints). Unchanged if the file is missing.
+    """
+    p = Path(path or PROJECT_ROOT / CACHE_311_BY_HEX)
+    if grid_gdf is None or "h3_cell" not in grid_gdf.columns or not p.exists():
+        return grid_gdf
+    with open(p) as f:
+        features = json.load(f).get("features", [])
+    counts = {
+        f["properties"]["h3_cell"]: f["properties"].get("complaint_count") or 0
+        for f in features
+        if "h3_cell" in (f.get("properties") or {})
+    }
+    grid_gdf["complaint_count"] = grid_gdf["h3_cell"].map(counts).fillna(0).astype(int)
+    return grid_gdf
+
+
 def grid_to_geojson(gdf, props=None):
     """Convert grid GeoDataFrame to GeoJSON dict."""
     if gdf is None:
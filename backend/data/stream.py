@@ -0,0 +1,273 @@
+"""
+Live sensor stream: assign batches of readings to H3 cells and keep rolling
+per-hex aggregates (1 h, 24 h, per TIME_BINS) in a fixed-size ring buffer.
+Memory is bounded by STREAM_MAX_CELLS x (window / bucket) slots.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+try:
+    import h3
+except ImportError:
+    h3 = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import (
+    H3_RESOLUTION,
+    TIME_BINS,
+    STREAM_METRICS,
+    STREAM_BUCKET_SECONDS,
+    STREAM_WINDOW_HOURS,
+    STREAM_MAX_CELLS,
+    STREAM_TIMEZONE,
+    STREAM_MAX_FUTURE_SECONDS,
+)
+
+
+def hour_to_time_bin(hours):
+    """Map an array of hours (0-23) to TIME_BINS index; bins may wrap midnight (e.g. night 22-4)."""
+    hours = np.asarray(hours)
+    out = np.full(hours.shape, -1, dtype=np.int8)
+    for i, (start, end) in enumerate(TIME_BINS.values()):
+        if start < end:
+            mask = (hours >= start) & (hours < end)
+        else:
+            mask = (hours >= start) | (hours < end)
+        out[mask & (out < 0)] = i
+    return out
+
+
+def local_hours(epoch_seconds):
+    """Local (STREAM_TIMEZONE) hour of day for an array of epoch seconds; TIME_BINS are local."""
+    tz = ZoneInfo(STREAM_TIMEZONE)
+    return np.array(
+        [datetime.fromtimestamp(int(t), tz=timezone.utc).astimezone(tz).hour for t in np.asarray(epoch_seconds).tolist()],
+        dtype=np.int64,
+    )
+
+
+def latlng_to_cells(lat, lon, resolution=None):
+    """H3 cell per (lat, lon) pair. Returns numpy object array of cell ids."""
+    if h3 is None:
+        raise RuntimeError("h3 is required for stream ingestion (pip install h3)")
+    res = resolution if resolution is not None else H3_RESOLUTION
+    # Fixed sensors repeat their position in every batch: one H3 call per distinct
+    # location (lat + i*lon is a 1-d key, far cheaper to unique than (n, 2) rows)
+    points = np.asarray(lat, dtype=float) + 1j * np.asarray(lon, dtype=float)
+    uniq, inverse = np.unique(points, return_inverse=True)
+    to_cell = h3.latlng_to_cell
+    cells = np.array([to_cell(z.real, z.imag, res) for z in uniq.tolist()], dtype=object)
+    return cells[inverse.reshape(-1)]
+
+
+class RollingHexAggregator:
+    """
+    Ring buffer of time buckets per H3 cell and metric.
+
+    sums / counts have shape (metrics, cells, slots). A slot holds one bucket of
+    STREAM_BUCKET_SECONDS; when a newer bucket maps onto an occupied slot the
+    slot is cleared first, so the buffer always covers the last
+    STREAM_WINDOW_HOURS. Cells are registered on first sight up to max_cells;
+    readings for further cells are dropped and counted.
+    """
+
+    def __init__(self, metrics=None, bucket_seconds=None, window_hours=None, max_cells=None, resolution=None):
+        self.metrics = tuple(metrics or STREAM_METRICS)
+        self.bucket_seconds = int(bucket_seconds or STREAM_BUCKET_SECONDS)
+        self.window_hours = window_hours or STREAM_WINDOW_HOURS
+        self.max_cells = int(max_cells or STREAM_MAX_CELLS)
+        self.resolution = resolution if resolution is not None else H3_RESOLUTION
+        self.n_slots = int(self.window_hours * 3600 // self.bucket_seconds)
+        shape = (len(self.metrics), self.max_cells, self.n_slots)
+        self.sums = np.zeros(shape, dtype=np.float64)
+        self.counts = np.zeros(shape, dtype=np.uint32)
+        # Bucket number currently held by each slot (-1 = empty)
+        self.slot_bucket = np.full(self.n_slots, -1, dtype=np.int64)
+        self.cell_ids = []
+        self.cell_index = {}
+        self.latest_bucket = -1
+        self.accepted = 0
+        self.dropped = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def _rows_for_cells(self, cells):
+        """Map cell ids to buffer rows (registering new ones); -1 when full."""
+        uniq, inverse = np.unique(cells, return_inverse=True)
+        rows = np.empty(len(uniq), dtype=np.int64)
+        for i, c in enumerate(uniq):
+            r = self.cell_index.get(c)
+            if r is None:
+                if len(self.cell_ids) >= self.max_cells:
+                    r = -1
+                else:
+                    r = len(self.cell_ids)
+                    self.cell_index[c] = r
+                    self.cell_ids.append(c)
+            rows[i] = r
+        return rows[inverse]
+
+    def ingest(self, ts, lat, lon, values):
+        """
+        Add a batch of readings. ts: epoch seconds; values: {metric: array}
+        (NaN = metric not reported by that sensor). Returns counts accepted/dropped.
+        """
+        ts = np.asarray(ts, dtype=float)
+        n = len(ts)
+        if n == 0:
+            return {"accepted": 0, "dropped": 0}
+        cells = latlng_to_cells(lat, lon, self.resolution)
+        buckets = (ts // self.bucket_seconds).astype(np.int64)
+        with self._lock:
+            rows = self._rows_for_cells(cells)
+            newest = int(buckets.max())
+            oldest_allowed = max(newest, self.latest_bucket) - self.n_slots + 1
+            keep = (rows >= 0) & (buckets >= oldest_allowed)
+            dropped = int(n - keep.sum())
+            rows, buckets = rows[keep], buckets[keep]
+            slots = buckets % self.n_slots
+
+            # Recycle slots that now belong to a newer bucket
+            for b in np.unique(buckets):
+                s = int(b % self.n_slots)
+                if self.slot_bucket[s] < b:
+                    self.sums[:, :, s] = 0
+                    self.counts[:, :, s] = 0
+                    self.slot_bucket[s] = b
+            # Late readings for a slot already recycled by a newer bucket are stale
+            fresh = self.slot_bucket[slots] == buckets
+            dropped += int((~fresh).sum())
+            rows, slots = rows[fresh], slots[fresh]
+            sel = np.flatnonzero(keep)[fresh]
+
+            for m, name in enumerate(self.metrics):
+                if name not in values:
+                    continue
+                v = np.asarray(values[name], dtype=float)[sel]
+                ok = ~np.isnan(v)
+                np.add.at(self.sums[m], (rows[ok], slots[ok]), v[ok])
+                np.add.at(self.counts[m], (rows[ok], slots[ok]), 1)
+
+            self.latest_bucket = max(self.latest_bucket, newest)
+            self.accepted += len(rows)
+            self.dropped += dropped
+            self.version += 1
+        return {"accepted": int(len(rows)), "dropped": dropped}
+
+    def _window_mask(self, hours):
+        """Boolean mask over slots whose bucket lies within the last `hours`."""
+        n = int(hours * 3600 // self.bucket_seconds)
+        lo = self.latest_bucket - n + 1
+        return (self.slot_bucket >= lo) & (self.slot_bucket >= 0)
+
+    def _means(self, slot_mask):
+        s = self.sums[:, : len(self.cell_ids), slot_mask].sum(axis=2)
+        c = self.counts[:, : len(self.cell_ids), slot_mask].sum(axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(c > 0, s / np.maximum(c, 1), np.nan)
+        return mean, c
+
+    def aggregates(self):
+        """
+        Per-hex rolling means: {cell: {"1h": {metric: mean}, "24h": {...},
+        "time_bins": {bin: {...}}, "count": n}}. Cells with no readings in
+        the window are omitted. With window_hours <= 1 the whole window is the
+        single "1h" entry (one key per distinct window).
+        """
+        with self._lock:
+            if not self.cell_ids or self.latest_bucket < 0:
+                return {}
+            live = self._window_mask(self.window_hours)
+            full = self._means(live)
+            windows = {"1h": full if self.window_hours <= 1 else self._means(self._window_mask(1))}
+            if self.window_hours > 1:
+                windows[f"{self.window_hours:g}h"] = full
+            slot_bins = hour_to_time_bin(local_hours(np.maximum(self.slot_bucket, 0) * self.bucket_seconds))
+            bins = {name: self._means(live & (slot_bins == i)) for i, name in enumerate(TIME_BINS)}
+            cell_ids = list(self.cell_ids)
+
+        total = full[1].max(axis=0)
+        out = {}
+        for r, cell in enumerate(cell_ids):
+            if total[r] == 0:
+                continue
+            entry = {}
+            for key, (mean, _) in windows.items():
+                entry[key] = _metric_dict(self.metrics, mean[:, r])
+            entry["time_bins"] = {name: _metric_dict(self.metrics, mean[:, r]) for name, (mean, _) in bins.items()}
+            entry["count"] = int(total[r])
+            out[cell] = entry
+        return out
+
+    def stats(self):
+        """Buffer size and throughput counters."""
+        return {
+            "cells": len(self.cell_ids),
+            "max_cells": self.max_cells,
+            "slots": self.n_slots,
+            "bucket_seconds": self.bucket_seconds,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "version": self.version,
+            "buffer_bytes": int(self.sums.nbytes + self.counts.nbytes),
+            "latest_ts": int(self.latest_bucket * self.bucket_seconds) if self.latest_bucket >= 0 else None,
+        }
+
+
+def _metric_dict(metrics, values):
+    return {m: (None if np.isnan(v) else round(float(v), 3)) for m, v in zip(metrics, values)}
+
+
+def readings_to_columns(payload):
+    """
+    Accept either columnar {"ts": [...], "lat": [...], "lon": [...], "pm25": [...]}
+    or {"readings": [{"ts", "lat", "lon", "pm25", ...}, ...]}. Missing ts = now.
+    ValueError for malformed batches: non-finite or out-of-range lat/lon, ts
+    before 1970 or more than STREAM_MAX_FUTURE_SECONDS ahead, infinite values.
+    """
+    if "readings" in payload:
+        recs = payload["readings"] or []
+        if not isinstance(recs, list) or not all(isinstance(r, dict) for r in recs):
+            raise ValueError("readings must be a list of objects")
+        cols = {"lat": [r.get("lat") for r in recs], "lon": [r.get("lon") for r in recs], "ts": [r.get("ts") for r in recs]}
+        for m in STREAM_METRICS:
+            cols[m] = [r.get(m) for r in recs]
+    else:
+        cols = dict(payload)
+        for name in ("ts", "lat", "lon", *STREAM_METRICS):
+            if cols.get(name) is not None and not isinstance(cols[name], list):
+                raise ValueError(f"{name} must be a list")
+    n = len(cols.get("lat") or [])
+    now = time.time()
+    ts = cols.get("ts") or [None] * n
+    out = {
+        "ts": np.array([now if t is None else t for t in ts], dtype=float),
+        "lat": np.asarray(cols.get("lat") or [], dtype=float),
+        "lon": np.asarray(cols.get("lon") or [], dtype=float),
+    }
+    values = {}
+    for m in STREAM_METRICS:
+        if m in cols and cols[m] is not None:
+            values[m] = np.array([np.nan if v is None else v for v in cols[m]], dtype=float)
+    if any(a.ndim != 1 for a in (*out.values(), *values.values())):
+        raise ValueError("ts, lat, lon and metric columns must be flat lists of numbers")
+    lengths = {len(out["ts"]), len(out["lat"]), len(out["lon"])} | {len(v) for v in values.values()}
+    if len(lengths) > 1:
+        raise ValueError("ts, lat, lon and metric columns must have the same length")
+    lat, lon, ts = out["lat"], out["lon"], out["ts"]
+    if not (np.isfinite(lat).all() and np.isfinite(lon).all()) or (np.abs(lat) > 90).any() or (np.abs(lon) > 180).any():
+        raise ValueError("lat/lon missing or out of range")
+    if not np.isfinite(ts).all() or (ts < 0).any() or (ts > now + STREAM_MAX_FUTURE_SECONDS).any():
+        raise ValueError(f"ts must be epoch seconds, at most {STREAM_MAX_FUTURE_SECONDS} s in the future")
+    for m, v in values.items():
+        if np.isinf(v).any():
+            raise ValueError(f"{m} values must be finite")
+    return out, values
@@ -0,0 +1,98 @@
+"""
+Study area: the polygon(s) the pipeline computes on.
+
+A local outline or land mask (STUDY_AREA_FILE, any polygon layer GeoPandas
+reads, e.g. the peninsula or the borough minus water) decides which H3 cells
+exist. They come from polygon_to_cells (cell centres inside the area) instead
+of covering the whole HUNTS_POINT_BOUNDS rectangle and dropping water cells at
+the end. Inputs are then clipped to the grid's own footprint before any join:
+lines with a spatial-index query, points (air monitors, 311 complaints) with a
+vectorized point-in-polygon test on the prepared footprint. Joins therefore
+give the same per-cell results on fewer rows. The fetch/filter rectangle for
+the OSM network and 311 complaints is the area's own bounding box
+(area_bounds), so a polygon reaching past HUNTS_POINT_BOUNDS still gets its
+roads and complaints. Without the file the rectangle is used, as before.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import geopandas as gpd
+    import shapely
+except ImportError:
+    gpd = shapely = None
+
+try:
+    import h3
+except ImportError:
+    h3 = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import STUDY_AREA_FILE, H3_RESOLUTION, HUNTS_POINT_BOUNDS
+
+
+def load_study_area(path=None):
+    """Union of the study-area polygons (EPSG:4326), or None if the file is missing or has none."""
+    p = Path(path or PROJECT_ROOT / STUDY_AREA_FILE)
+    if gpd is None or not p.exists():
+        return None
+    gdf = gpd.read_file(p)
+    gdf = gdf[gdf.geometry.notna()].to_crs("EPSG:4326")
+    parts = shapely.get_parts(shapely.make_valid(gdf.geometry.values))
+    polys = parts[np.isin(shapely.get_type_id(parts), (3, 6))]  # Polygon, MultiPolygon
+    if len(polys) == 0:
+        return None
+    area = shapely.union_all(polys)
+    return None if area.is_empty else area
+
+
+def area_bounds(area, pad_deg=None):
+    """
+    {min_lat, max_lat, min_lon, max_lon} to fetch and pre-filter inputs for the
+    area: its bounding box padded by two H3 edge lengths (boundary cells reach
+    past the outline), or HUNTS_POINT_BOUNDS without a study area.
+    """
+    if area is None:
+        return dict(HUNTS_POINT_BOUNDS)
+    if pad_deg is None:
+        pad_deg = 2 * h3.average_hexagon_edge_length(H3_RESOLUTION, "km") / 111.32 if h3 is not None else 0.0
+    min_lon, min_lat, max_lon, max_lat = area.bounds
+    return {"min_lat": min_lat - pad_deg, "max_lat": max_lat + pad_deg, "min_lon": min_lon - pad_deg, "max_lon": max_lon + pad_deg}
+
+
+def study_area_cells(area, resolution=None):
+    """Sorted H3 cells whose centre lies in the area (holes and multiple parts respected)."""
+    res = resolution if resolution is not None else H3_RESOLUTION
+    return sorted(h3.geo_to_cells(area, res))
+
+
+def grid_mask(grid_gdf):
+    """Prepared union of the grid cells: anything outside it cannot join to a cell."""
+    geoms = grid_gdf.geometry.values
+    # Cells tile without overlap, so the cheaper coverage union applies (shapely >= 2.1)
+    union = getattr(shapely, "coverage_union_all", shapely.union_all)(geoms)
+    shapely.prepare(union)
+    return union
+
+
+def clip_to_mask(gdf, mask):
+    """Rows of a GeoDataFrame intersecting the mask (spatial-index query, geometry unchanged)."""
+    if gdf is None or mask is None or gdf.empty:
+        return gdf
+    gdf = gdf.set_crs("EPSG:4326", allow_override=True)
+    hits = gdf.sindex.query(mask, predicate="intersects")
+    return gdf.iloc[np.sort(hits)]
+
+
+def points_in_mask(lat, lon, mask):
+    """Boolean array: which (lat, lon) points fall inside the mask."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if mask is None:
+        return np.isfinite(lat) & np.isfinite(lon)
+    shapely.prepare(mask)
+    return shapely.intersects_xy(mask, lon, lat)
@@ -0,0 +1,197 @@
+"""
+TopoJSON encoding for the static export. Coordinates are quantized to an
+integer grid and every boundary shared by two features is stored once as an
+arc: adjacent hexagons share edges, and two-way streets appear in the OSM edge
+list in both directions. Arcs are delta-encoded, so most positions are small
+integers. Output follows the TopoJSON spec and decodes with topojson-client.
+"""
+
+import math
+
+
+def _quantizer(bbox, precision_deg):
+    x0, y0, x1, y1 = bbox
+    n = max(2, int(math.ceil(max(x1 - x0, y1 - y0) / precision_deg)) + 1)
+    kx = (x1 - x0) / (n - 1) or 1.0
+    ky = (y1 - y0) / (n - 1) or 1.0
+
+    def q(pt):
+        return (int(round((pt[0] - x0) / kx)), int(round((pt[1] - y0) / ky)))
+
+    return q, {"scale": [kx, ky], "translate": [x0, y0]}
+
+
+def _lines(geometry):
+    """(part, coordinates) per line of a GeoJSON geometry; part = polygon index in a MultiPolygon."""
+    t, c = geometry["type"], geometry["coordinates"]
+    if t == "LineString":
+        return [(0, c)]
+    if t in ("MultiLineString", "Polygon"):
+        return [(0, line) for line in c]
+    if t == "MultiPolygon":
+        return [(i, ring) for i, poly in enumerate(c) for ring in poly]
+    raise ValueError(f"Unsupported geometry type: {t}")
+
+
+def _bbox(layers):
+    xs, ys = [], []
+    for fc in layers.values():
+        for f in fc.get("features", []):
+            if not f.get("geometry"):
+                continue
+            for _, line in _lines(f["geometry"]):
+                for x, y in line:
+                    xs.append(x)
+                    ys.append(y)
+    if not xs:
+        return [0.0, 0.0, 0.0, 0.0]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def _dedupe(points):
+    out = [points[0]]
+    for p in points[1:]:
+        if p != out[-1]:
+            out.append(p)
+    return out
+
+
+class _ArcBuilder:
+    """Cuts quantized lines at junctions and stores each distinct arc once."""
+
+    def __init__(self):
+        self.arcs = []
+        self.index = {}
+
+    def add(self, pts):
+        key = tuple(pts)
+        i = self.index.get(key)
+        if i is not None:
+            return i
+        i = self.index.get(key[::-1])
+        if i is not None:
+            return ~i
+        self.index[key] = len(self.arcs)
+        self.arcs.append(pts)
+        return len(self.arcs) - 1
+
+    def encoded(self):
+        out = []
+        for arc in self.arcs:
+            x, y = arc[0]
+            enc = [[x, y]]
+            for px, py in arc[1:]:
+                enc.append([px - x, py - y])
+                x, y = px, py
+            out.append(enc)
+        return out
+
+
+def _junctions(lines):
+    """Vertices where lines meet or branch (3+ distinct neighbours), plus open line ends."""
+    neighbours = {}
+    ends = set()
+    for pts, closed, _ in lines:
+        n = len(pts)
+        last = n - 1 if closed else n
+        for i in range(last):
+            a = pts[i]
+            s = neighbours.setdefault(a, set())
+            if i > 0:
+                s.add(pts[i - 1])
+            elif closed:
+                s.add(pts[-2])
+            if i + 1 < n:
+                s.add(pts[i + 1])
+        if not closed:
+            ends.add(pts[0])
+            ends.add(pts[-1])
+    return {p for p, s in neighbours.items() if len(s) > 2} | ends
+
+
+def _cut(pts, closed, junctions):
+    """Split a line at junction vertices. Closed rings are rotated to start at one."""
+    if closed:
+        ring = pts[:-1]
+        starts = [i for i, p in enumerate(ring) if p in junctions]
+        # No junction: canonical start so identical rings map to the same arc
+        k = starts[0] if starts else min(range(len(ring)), key=ring.__getitem__)
+        pts = ring[k:] + ring[:k] + [ring[k]]
+    pieces, current = [], [pts[0]]
+    for p in pts[1:]:
+        current.append(p)
+        if p in junctions:
+            pieces.append(current)
+            current = [p]
+    if len(current) > 1:
+        pieces.append(current)
+    return pieces
+
+
+def to_topology(layers, precision_deg=1e-5, keep_properties=None):
+    """
+    TopoJSON Topology for {object_name: FeatureCollection}. Geometries keep
+    feature order; keep_properties: {object_name: [property, ...]} copied onto
+    each geometry (default none: the export ships properties as split files).
+    """
+    keep_properties = keep_properties or {}
+    bbox = _bbox(layers)
+    q, transform = _quantizer(bbox, precision_deg)
+
+    # Quantize once; remember which lines belong to which geometry
+    quantized = {}
+    all_lines = []
+    for name, fc in layers.items():
+        geoms = []
+        for f in fc.get("features", []):
+            g = f.get("geometry")
+            if not g:
+                geoms.append((None, f, []))
+                continue
+            lines = []
+            closed = g["type"] in ("Polygon", "MultiPolygon")
+            for part, line in _lines(g):
+                pts = _dedupe([q(p) for p in line])
+                # Rings collapsed by quantization (smaller than the precision) are dropped
+                if len(pts) < (4 if closed else 2):
+                    continue
+                lines.append((pts, closed, part))
+            all_lines.extend(lines)
+            geoms.append((g, f, lines))
+        quantized[name] = geoms
+
+    junctions = _junctions(all_lines)
+    builder = _ArcBuilder()
+    objects = {}
+    for name, geoms in quantized.items():
+        keep = keep_properties.get(name) or []
+        out = []
+        for g, f, lines in geoms:
+            if g is None:
+                out.append({"type": None})
+                continue
+            arcs = [[builder.add(piece) for piece in _cut(pts, closed, junctions)] for pts, closed, _ in lines]
+            t = g["type"]
+            if t == "LineString":
+                geom = {"type": t, "arcs": arcs[0] if arcs else []}
+            elif t in ("MultiLineString", "Polygon"):
+                geom = {"type": t, "arcs": arcs}
+            else:
+                # Regroup rings into their polygons
+                grouped = {}
+                for (_, _, part), ring in zip(lines, arcs):
+                    grouped.setdefault(part, []).append(ring)
+                geom = {"type": t, "arcs": [grouped[k] for k in sorted(grouped)]}
+            props = {k: f["properties"][k] for k in keep if (f.get("properties") or {}).get(k) is not None}
+            if props:
+                geom["properties"] = props
+            out.append(geom)
+        objects[name] = {"type": "GeometryCollection", "geometries": out}
+
+    return {
+        "type": "Topology",
+        "bbox": bbox,
+        "transform": transform,
+        "objects": objects,
+        "arcs": builder.encoded(),
+    }
@@ -0,0 +1,205 @@
+"""
+Zonal statistics for arbitrary polygons (school catchment, NYCHA campus,
+proposed truck-free zone) from the precomputed per-hex columns.
+
+The polygon is covered with H3 cells at the grid resolution. Cells whose
+neighbours are all inside get weight 1 with no geometry work; only the
+boundary ring (and only cells the grid actually has) is intersected with the
+polygon to get its area fraction. No GeoPandas overlay per request.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import h3
+except ImportError:
+    h3 = None
+
+try:
+    import shapely
+    from shapely.geometry import shape
+except ImportError:
+    shapely = shape = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+import sys
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import ZONAL_SUM_COLUMNS, ZONAL_MAX_CELLS
+
+
+def _geometry_from_geojson(obj):
+    """Accept a GeoJSON geometry, Feature or single-feature FeatureCollection."""
+    if not isinstance(obj, dict):
+        raise ValueError("Expected a GeoJSON object")
+    if obj.get("type") == "FeatureCollection":
+        feats = obj.get("features") or []
+        if not isinstance(feats, list) or len(feats) != 1:
+            raise ValueError("FeatureCollection must contain exactly one polygon feature")
+        obj = feats[0]
+        if not isinstance(obj, dict):
+            raise ValueError("Feature must be a GeoJSON object")
+    if obj.get("type") == "Feature":
+        obj = obj.get("geometry") or {}
+        if not isinstance(obj, dict):
+            raise ValueError("Feature geometry must be a GeoJSON object")
+    if obj.get("type") not in ("Polygon", "MultiPolygon"):
+        raise ValueError("Geometry must be a Polygon or MultiPolygon")
+    if not isinstance(obj.get("coordinates"), list):
+        raise ValueError("Geometry coordinates must be a list")
+    return obj
+
+
+def _cell_polygons(cells):
+    """Shapely polygons (lng, lat) for H3 cells, built in one vectorized call."""
+    rings = [[(lng, lat) for lat, lng in h3.cell_to_boundary(c)] for c in cells]
+    return shapely.polygons([r + [r[0]] for r in rings])
+
+
+def cover_polygon(geometry, resolution):
+    """
+    Split the cells covering a polygon into interior cells (centre inside and
+    all neighbours inside: weight 1) and edge candidates (centre on either side
+    of the boundary: need an area fraction). Returns (interior, edge, shape).
+    """
+    if h3 is None or shapely is None:
+        raise RuntimeError("h3 and shapely are required for zonal statistics")
+    try:
+        geom = shape(geometry)
+    except (IndexError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Malformed polygon coordinates: {e}") from None
+    if geom.is_empty or not geom.is_valid:
+        raise ValueError("Polygon is empty or invalid")
+    # Reject from the area before expanding: geo_to_cells on a huge polygon takes
+    # seconds to minutes. Cell areas vary around the average, hence the slack;
+    # the exact count below still applies.
+    est = _geodesic_area_km2(geom) / h3.average_hexagon_area(resolution, "km^2")
+    if est > 2 * ZONAL_MAX_CELLS:
+        raise ValueError(f"Polygon covers more than {ZONAL_MAX_CELLS} cells")
+    inside = set(h3.geo_to_cells(geometry, resolution))
+    if len(inside) > ZONAL_MAX_CELLS:
+        raise ValueError(f"Polygon covers more than {ZONAL_MAX_CELLS} cells")
+
+    interior, edge = [], set()
+    for c in inside:
+        ring = h3.grid_ring(c, 1)
+        outside = [n for n in ring if n not in inside]
+        if outside:
+            edge.add(c)
+            edge.update(outside)  # neighbours whose centre is outside may still overlap
+        else:
+            interior.append(c)
+    if not inside:
+        # Polygon smaller than a cell: the cell holding it and its neighbours
+        lng, lat = geom.representative_point().coords[0]
+        c = h3.latlng_to_cell(lat, lng, resolution)
+        edge = {c, *h3.grid_ring(c, 1)}
+    return interior, sorted(edge), geom
+
+
+def edge_fractions(cells, geom):
+    """Area fraction of each cell inside geom (0..1)."""
+    if not cells:
+        return np.zeros(0)
+    polys = _cell_polygons(cells)
+    shapely.prepare(geom)
+    inter = shapely.intersection(polys, geom)
+    return np.clip(shapely.area(inter) / shapely.area(polys), 0, 1)
+
+
+def zonal_stats(index, geojson, fields=None):
+    """
+    Area-weighted statistics of the grid's numeric columns inside a polygon.
+    Intensive columns (PM2.5, exposure, ...) give weighted mean / min / max;
+    ZONAL_SUM_COLUMNS (road_km, complaint counts) also give an area-weighted sum.
+    """
+    geometry = _geometry_from_geojson(geojson)
+    interior, edge, geom = cover_polygon(geometry, index.resolution)
+
+    # Geometry work only for boundary cells the grid has data for
+    edge_rows = index.rows_for_cells(edge)
+    edge = [c for c, r in zip(edge, edge_rows.tolist()) if r >= 0]
+    edge_w = edge_fractions(edge, geom)
+    int_rows = index.rows_for_cells(interior)
+    int_rows = int_rows[int_rows >= 0]
+    rows = np.concatenate([int_rows, edge_rows[edge_rows >= 0]])
+    weights = np.concatenate([np.ones(len(int_rows)), edge_w])
+    keep = weights > 0
+    rows, weights = rows[keep], weights[keep]
+
+    stats = {}
+    numeric = {k: v for k, v in index.columns.items() if isinstance(v, np.ndarray)}
+    for name in fields or numeric:
+        col = numeric.get(name)
+        if col is None:
+            continue
+        x = col[rows]
+        ok = ~np.isnan(x)
+        if not ok.any():
+            stats[name] = None
+            continue
+        w = weights[ok]
+        entry = {
+            "mean": float(np.dot(w, x[ok]) / w.sum()),
+            "min": float(x[ok].min()),
+            "max": float(x[ok].max()),
+        }
+        if name in ZONAL_SUM_COLUMNS:
+            entry["sum"] = float(np.dot(w, x[ok]))
+        stats[name] = entry
+
+    cells = [index.cells[r] for r in rows.tolist()]
+    area_km2 = float(sum(w * h3.cell_area(c, "km^2") for c, w in zip(cells, weights.tolist())))
+    return {
+        "cells": len(cells),
+        "interior_cells": int(len(int_rows)),
+        "edge_cells": int(len(rows) - len(int_rows)),
+        "area_km2_with_data": round(area_km2, 4),
+        "polygon_area_km2": round(_geodesic_area_km2(geom), 4),
+        "stats": stats,
+        # Reusable zone definition: pass back as {"cells": [...]} to skip polygon covering
+        "compact_cells": sorted(h3.compact_cells(cells)) if cells else [],
+    }
+
+
+def zonal_stats_for_cells(index, cells, fields=None):
+    """Statistics for a zone given as (possibly compacted) H3 cells; whole cells, weight 1."""
+    res = index.resolution
+    # Count the expansion before doing it: one coarse cell can stand for millions
+    total = 0
+    for c in cells:
+        if not h3.is_valid_cell(c):
+            raise ValueError(f"Invalid H3 cell id: {c}")
+        r = h3.get_resolution(c)
+        if r > res:
+            raise ValueError(f"Cell {c} is finer than the grid resolution {res}")
+        total += h3.cell_to_children_size(c, res)
+        if total > ZONAL_MAX_CELLS:
+            raise ValueError(f"Zone covers more than {ZONAL_MAX_CELLS} cells")
+    expanded = []
+    for c in cells:
+        expanded.extend(h3.uncompact_cells([c], res) if h3.get_resolution(c) < res else [c])
+    rows = index.rows_for_cells(expanded)
+    rows = rows[rows >= 0]
+    stats = {}
+    for name, col in index.columns.items():
+        if not isinstance(col, np.ndarray) or (fields and name not in fields):
+            continue
+        x = col[rows]
+        x = x[~np.isnan(x)]
+        if not len(x):
+            stats[name] = None
+            continue
+        entry = {"mean": float(x.mean()), "min": float(x.min()), "max": float(x.max())}
+        if name in ZONAL_SUM_COLUMNS:
+            entry["sum"] = float(x.sum())
+        stats[name] = entry
+    return {"cells": int(len(rows)), "interior_cells": int(len(rows)), "edge_cells": 0, "stats": stats}
+
+
+def _geodesic_area_km2(geom):
+    """Approximate polygon area from an equirectangular projection at its latitude."""
+    lat0 = np.radians(geom.centroid.y)
+    km_per_deg = 111.32
+    return geom.area * km_per_deg * km_per_deg * np.cos(lat0)
@@ -0,0 +1,199 @@
+"""
+Build instrumentation: stage timers, peak-RSS capture and row/feature counts
+written to a run manifest (data/runs/<run_id>.json), with an optional
+cProfile or pyinstrument dump of the whole run.
+"""
+
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import CACHE_RUNS
+
+
+def peak_rss_mb():
+    """Process peak resident set size so far (MB)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def current_rss_mb():
+    """Current resident set size (MB) where /proc is available, else the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def reset_peak_rss():
+    """
+    Reset the kernel's RSS high-water mark (Linux >= 4.0), so that
+    window_peak_rss_mb() covers only what runs next. False where unsupported.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def window_peak_rss_mb():
+    """RSS high-water mark (MB) since the last reset_peak_rss(), or None without /proc."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _count(obj):
+    """Rows / features in a stage output (GeoDataFrame, DataFrame, FeatureCollection, list)."""
+    if obj is None:
+        return None
+    if isinstance(obj, dict) and "features" in obj:
+        return len(obj["features"])
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+class RunManifest:
+    """
+    Collects per-stage metrics for one build run.
+
+        run = RunManifest("build_layers", profile="cprofile")
+        with run.stage("aggregate_air") as st:
+            grid = aggregate_air_to_grid(air_df, grid)
+            st["rows_out"] = len(grid)
+        run.write()
+    """
+
+    def __init__(self, name, profile=None, runs_dir=None):
+        self.name = name
+        self.run_id = f"{name}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}"
+        self.runs_dir = Path(runs_dir or PROJECT_ROOT / CACHE_RUNS)
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.stages = []
+        self.counts = {}
+        # First failure (innermost stage) and its error; None while the run is healthy
+        self.failed_stage = None
+        self.error = None
+        # Highest stage peak seen: per-stage resets also lower ru_maxrss
+        self._peak_mb = 0.0
+        self.profile = profile
+        self._profiler = None
+        if profile:
+            self._start_profiler(profile)
+
+    def _start_profiler(self, kind):
+        if kind == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("pyinstrument not installed; falling back to cProfile.")
+                kind = "cprofile"
+            else:
+                self._profiler = Profiler()
+        if kind == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+        self.profile = kind
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage; the yielded dict takes counts (rows_in, features_out, ...)."""
+        info = {}
+        rss_before = current_rss_mb()
+        # Peak of this stage alone where the high-water mark can be reset (Linux), else the lifetime peak
+        windowed = reset_peak_rss()
+        t0 = time.perf_counter()
+        error = None
+        try:
+            yield info
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            if self.error is None:
+                self.failed_stage, self.error = name, error
+            raise
+        finally:
+            peak = (window_peak_rss_mb() if windowed else None) or peak_rss_mb()
+            self._peak_mb = max(self._peak_mb, peak)
+            entry = {
+                "stage": name,
+                "seconds": round(time.perf_counter() - t0, 4),
+                "rss_before_mb": round(rss_before, 1),
+                "rss_after_mb": round(current_rss_mb(), 1),
+                "peak_rss_mb": round(peak, 1),
+                **{k: (_count(v) if not isinstance(v, (int, float, str, bool, type(None))) else v) for k, v in info.items()},
+            }
+            if error:
+                entry["error"] = error
+            self.stages.append(entry)
+
+    def count(self, key, value):
+        """Record a run-level count (e.g. features written per layer)."""
+        self.counts[key] = _count(value) if not isinstance(value, (int, float)) else value
+
+    def fail(self, exc):
+        """Record an error raised outside any stage (a stage failure is kept if already recorded)."""
+        if self.error is None:
+            self.error = f"{type(exc).__name__}: {exc}"
+
+    def write(self):
+        """Stop profiling and write the manifest (plus profile dump). Returns the manifest path."""
+        self.runs_dir.mkdir(parents=True, exist_ok=True)
+        profile_path = None
+        if self._profiler is not None:
+            if self.profile == "cprofile":
+                self._profiler.disable()
+                profile_path = self.runs_dir / f"{self.run_id}.pstats"
+                self._profiler.dump_stats(str(profile_path))
+            else:
+                self._profiler.stop()
+                profile_path = self.runs_dir / f"{self.run_id}.html"
+                profile_path.write_text(self._profiler.output_html(), encoding="utf-8")
+            self._profiler = None
+        manifest = {
+            "run_id": self.run_id,
+            "name": self.name,
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+            "total_seconds": round(time.perf_counter() - self._t0, 4),
+            "peak_rss_mb": round(max(self._peak_mb, peak_rss_mb()), 1),
+            "python": platform.python_version(),
+            "status": "failed" if self.error else "ok",
+            "failed_stage": self.failed_stage,
+            "error": self.error,
+            "stages": self.stages,
+            "counts": self.counts,
+            "profile": str(profile_path) if profile_path else None,
+        }
+        path = self.runs_dir / f"{self.run_id}.json"
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=1)
+        return path
+
+    def summary(self):
+        """Short text table of stage timings for the console."""
+        lines = [f"  {s['stage']:<26} {s['seconds']:>8.3f}s  peak RSS {s['peak_rss_mb']:.0f} MB" for s in self.stages]
+        if self.error:
+            lines.append(f"  FAILED in {self.failed_stage or '(outside a stage)'}: {self.error}")
+        return "\n".join(lines)
@@ -3,30 +3,278 @@ FastAPI backend for Hunts Point Geospatial Intelligence Platform.
 Serves map layers (GeoJSON), time-series data, and static frontend.
 """
 
+import asyncio
 import json
+import logging
+import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi import Body, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
-LAYERS_DIR = PROJECT_ROOT / "data" / "layers"
+sys.path.insert(0, str(PROJECT_ROOT))
 
+import numpy as np
 
-app = FastAPI(
-    title="Hunts Point Geospatial Intelligence",
-    description="High-resolution GIS: air pollution, noise proxy, congestion, truck network.",
-    version="0.1.0",
-)
+from config import CACHE_LAYERS, STREAM_MAX_BATCH, PUSH_POLL_SECONDS, PUSH_HEARTBEAT_SECONDS, PUSH_QUEUE_SIZE, HEX_LOOKUP_MAX_BATCH, QUERY_MAX_SQL_CHARS
+from backend.data.archive import LayerArchive
+from backend.data.compact import encode_compact
+from backend.data.deltas import diff_feature_collections, diff_properties, is_empty_delta
+from backend.data.hex_index import HexIndex
+from backend.data.layer_store import SharedLayerStore, iter_chunks
+from backend.data.query import QueryEngine, QueryError, QueryTimeout, feature_table, hex_table, live_table
+from backend.data.zonal import zonal_stats, zonal_stats_for_cells
+from backend.data.stream import RollingHexAggregator, readings_to_columns
+from backend.instrument import current_rss_mb
+from backend.metrics import Gauge, LAYER_CACHE, MetricsMiddleware, registry
+from backend.push import EventBroker, sse_stream
+
+LAYERS_DIR = PROJECT_ROOT / CACHE_LAYERS
+
+# Layer name -> (file in LAYERS_DIR, per-feature key used for deltas; None = send full reload)
+LAYERS = {
+    "grid": ("grid_layers.geojson", "h3_cell"),
+    "truck_routes": ("truck_routes.geojson", None),
+}
+
+logger = logging.getLogger("uvicorn.error")
+
+# Rolling per-hex aggregates of live sensor readings (bounded ring buffer)
+stream_aggregator = RollingHexAggregator()
+broker = EventBroker(queue_size=PUSH_QUEUE_SIZE)
+# Pre-encoded layers published by build_layers.py, mapped read-only (shared across workers)
+layer_store = SharedLayerStore()
+
+# Parsed layers keyed by file name; reloaded when the file's mtime changes
+_layer_cache = {}
+# Per-hex property index of the grid layer, rebuilt when the grid version changes
+_hex_index = None
+# Layer -> (version, compact encoding) when not served from the store
+_compact_cache = {}
+# Every published build, as per-hex deltas (?version=, ?asof=, /api/diff)
+layer_archive = LayerArchive()
+# DuckDB tables over the grid, truck routes and live aggregates (/api/query)
+query_engine = QueryEngine()
 
 
 def _load_geojson(name: str):
     p = LAYERS_DIR / name
     if not p.exists():
         return {"type": "FeatureCollection", "features": []}
-    with open(p) as f:
-        return json.load(f)
+    mtime = p.stat().st_mtime_ns
+    entry = _layer_cache.get(name)
+    if entry is None or entry["mtime"] != mtime:
+        LAYER_CACHE.inc(name, "file", "reload")
+        with open(p) as f:
+            data = json.load(f)
+        entry = {"mtime": mtime, "version": (entry["version"] + 1) if entry else 1, "data": data}
+        _layer_cache[name] = entry
+    else:
+        LAYER_CACHE.inc(name, "file", "hit")
+    return entry["data"]
+
+
+def _refresh_store():
+    """Re-attach to the shared layer store if the CURRENT pointer moved."""
+    if layer_store.refresh():
+        LAYER_CACHE.inc("*", "store", "reload")
+
+
+def _layer_version(name: str):
+    entry = _layer_cache.get(name)
+    return entry["version"] if entry else 0
+
+
+def _current_versions():
+    """Version per layer: the published store version, else the file-cache counter."""
+    if layer_store.available:
+        return {layer: layer_store.version for layer in LAYERS}
+    return {layer: _layer_version(name) for layer, (name, _) in LAYERS.items()}
+
+
+def _layer_data(layer: str):
+    """Parsed layer and its version (from the published store when present)."""
+    _refresh_store()
+    buf = layer_store.get(layer)
+    if buf is not None:
+        return json.loads(bytes(buf)), layer_store.version
+    name, _ = LAYERS[layer]
+    data = _load_geojson(name)
+    return data, _layer_version(name)
+
+
+def get_hex_index():
+    """Current grid index; rebuilt once per layer version (no geometry kept). Blocks: call from a thread."""
+    global _hex_index
+    _refresh_store()
+    version = _current_versions()["grid"]
+    # An empty index (no grid built yet, version 0) is cached like any other
+    if _hex_index is None or _hex_index.version != version:
+        data, version = _layer_data("grid")
+        _hex_index = HexIndex.from_geojson(data, key=LAYERS["grid"][1], version=version)
+        LAYER_CACHE.inc("grid", "hex_index", "rebuild")
+    return _hex_index
+
+
+async def current_hex_index():
+    """get_hex_index for request handlers: a stale index is rebuilt in the threadpool, never on the event loop."""
+    _refresh_store()
+    index = _hex_index
+    if index is None or index.version != _current_versions()["grid"]:
+        index = await run_in_threadpool(get_hex_index)
+    return index
+
+
+def _compact_layer(layer: str):
+    """Compact H3-id encoding of a layer, built once per version when the store has none."""
+    data, version = _layer_data(layer)
+    cached = _compact_cache.get(layer)
+    if cached is None or cached[0] != version or version == 0:
+        cached = _compact_cache[layer] = (version, encode_compact(data, key=LAYERS[layer][1]))
+        LAYER_CACHE.inc(layer, "compact", "rebuild")
+    return cached
+
+
+def _layer_response(layer: str, request: Request, fmt: str = "geojson"):
+    """
+    Serve a layer. With a published store, stream the pre-encoded (optionally
+    gzip) bytes straight from the shared mapping; otherwise parse the GeoJSON file.
+    fmt="compact" serves the H3-id format (cell ids + typed property columns).
+    """
+    _refresh_store()
+    if layer_store.get(layer, fmt=fmt) is not None:
+        LAYER_CACHE.inc(layer, "store", "hit")
+        use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+        buf = layer_store.get(layer, "gzip" if use_gzip else None, fmt=fmt)
+        headers = {
+            "X-Layer-Version": str(layer_store.version),
+            "Content-Length": str(len(buf)),
+            "Vary": "Accept-Encoding",
+        }
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(iter_chunks(buf), media_type="application/json", headers=headers)
+    if fmt == "compact":
+        version, data = _compact_layer(layer)
+        return JSONResponse(data, headers={"X-Layer-Version": str(version)})
+    name, _ = LAYERS[layer]
+    data = _load_geojson(name)
+    return JSONResponse(data, headers={"X-Layer-Version": str(_layer_version(name))})
+
+
+def _archived_response(layer: str, version, asof, fmt: str = "geojson"):
+    """A past build of a layer from the archive. Archived versions never change."""
+    try:
+        version = layer_archive.resolve(version, asof)
+        data = layer_archive.materialize(layer, version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    LAYER_CACHE.inc(layer, "archive", "hit")
+    if fmt == "compact":
+        data = encode_compact(data, key=LAYERS[layer][1])
+    return JSONResponse(data, headers={"X-Layer-Version": str(version), "Cache-Control": "public, max-age=86400, immutable"})
+
+
+def _live_snapshot():
+    """Last-hour live means per hex, as grid feature properties (live_<metric>_1h)."""
+    return {
+        cell: {f"live_{m}_1h": v for m, v in agg["1h"].items()}
+        for cell, agg in stream_aggregator.aggregates().items()
+    }
+
+
+async def _check_layer_files(seen):
+    """File mode: diff each changed layer file against the last parsed version."""
+    for layer, (name, key) in LAYERS.items():
+        data = await run_in_threadpool(_load_geojson, name)
+        version = _layer_version(name)
+        if layer not in seen:
+            seen[layer] = (version, data)
+            continue
+        prev_version, prev = seen[layer]
+        if version == prev_version:
+            continue
+        seen[layer] = (version, data)
+        if key is None:
+            broker.publish("layer_reload", {"layer": layer, "version": version})
+            continue
+        delta = await run_in_threadpool(diff_feature_collections, prev, data, key)
+        if not is_empty_delta(delta):
+            broker.publish("layer_delta", {"layer": layer, "key": key, "from": prev_version, "to": version, **delta})
+
+
+async def _check_layer_store(seen):
+    """Store mode: deltas were computed once at publish time; just forward them."""
+    _refresh_store()
+    version = layer_store.version
+    prev_version = seen.get("store", version)
+    seen["store"] = version
+    if version == prev_version:
+        return
+    for layer in LAYERS:
+        delta = await run_in_threadpool(layer_store.read_delta, layer)
+        if delta is not None and delta.get("from") == prev_version:
+            if not is_empty_delta(delta):
+                broker.publish("layer_delta", {"layer": layer, **delta})
+        else:
+            broker.publish("layer_reload", {"layer": layer, "version": version})
+
+
+async def _watch_updates():
+    """Poll layers and live aggregates; broadcast deltas against the last version seen."""
+    seen = {}
+    live_version, live = stream_aggregator.version, _live_snapshot()
+    while True:
+        # One bad poll (e.g. a layer file caught mid-write) must not end the watcher for good
+        try:
+            _refresh_store()
+            if layer_store.available:
+                await _check_layer_store(seen)
+            else:
+                await _check_layer_files(seen)
+            if stream_aggregator.version != live_version:
+                version = stream_aggregator.version
+                snap = await run_in_threadpool(_live_snapshot)
+                delta = diff_properties(live, snap)
+                live_version, live = version, snap
+                # New cells arrive as "added" keys; send their values as changes too
+                delta["changed"].update({k: snap[k] for k in delta.pop("added")})
+                if not is_empty_delta(delta):
+                    broker.publish("stream_delta", {"layer": "grid", "key": "h3_cell", "version": live_version, **delta})
+        except Exception:
+            logger.exception("Update watcher poll failed; retrying in %s s", PUSH_POLL_SECONDS)
+        await asyncio.sleep(PUSH_POLL_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await run_in_threadpool(get_hex_index)
+    watcher = asyncio.create_task(_watch_updates())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+
+
+app = FastAPI(
+    title="Hunts Point Geospatial Intelligence",
+    description="High-resolution GIS: air pollution, noise proxy, congestion, truck network.",
+    version="0.1.0",
+    lifespan=lifespan,
+)
+app.add_middleware(MetricsMiddleware)
+
+registry.add(Gauge("layer_store_version", "Published layer version this worker serves", lambda: layer_store.version))
+registry.add(Gauge("hex_index_cells", "Cells in the point-lookup index", lambda: len(_hex_index) if _hex_index else 0))
+registry.add(Gauge("stream_buffer_cells", "Cells registered in the live sensor ring buffer", lambda: len(stream_aggregator.cell_ids)))
+registry.add(Gauge("sse_subscribers", "Connected /api/events clients", lambda: broker.subscriber_count))
+registry.add(Gauge("process_resident_memory_bytes", "Resident memory of this worker", lambda: int(current_rss_mb() * 1024 * 1024)))
 
 
 @app.get("/")
@@ -35,16 +283,219 @@ async def root():
 
 
 @app.get("/api/layers/grid")
-async def get_grid_layers():
-    """GeoJSON for pollution, congestion, noise, exposure (combined grid)."""
-    return _load_geojson("grid_layers.geojson")
+async def get_grid_layers(request: Request, format: str = "geojson", version: int = None, asof: str = None):
+    """
+    Pollution, congestion, noise, exposure (combined grid). format=geojson
+    (default) or compact: H3 ids plus typed columns, no geometry (see backend/data/compact.py).
+    version= or asof= (ISO date/datetime) serve a past build from the archive.
+    """
+    if format not in ("geojson", "compact"):
+        raise HTTPException(status_code=422, detail="format must be geojson or compact")
+    if version is not None or asof is not None:
+        return await run_in_threadpool(_archived_response, "grid", version, asof, format)
+    if format == "compact":
+        return await run_in_threadpool(_layer_response, "grid", request, format)
+    return _layer_response("grid", request)
 
 
 @app.get("/api/layers/truck_routes")
-async def get_truck_routes():
-    """GeoJSON for truck/freight routes."""
-    data = _load_geojson("truck_routes.geojson")
-    return data
+async def get_truck_routes(request: Request, version: int = None, asof: str = None):
+    """GeoJSON for truck/freight routes (version= / asof= for a past build)."""
+    if version is not None or asof is not None:
+        return await run_in_threadpool(_archived_response, "truck_routes", version, asof)
+    return _layer_response("truck_routes", request)
+
+
+@app.get("/api/layers/versions")
+async def get_layer_versions():
+    """Archived builds, oldest first: version id, build time (UTC) and per-layer change counts."""
+    return {"versions": layer_archive.versions()}
+
+
+@app.get("/api/diff")
+async def get_diff(from_version: int = Query(..., alias="from"), to_version: int = Query(None, alias="to"), layer: str = "grid"):
+    """
+    Net per-hex change between two archived builds (to defaults to the latest),
+    composed from the stored deltas: {"changed", "before", "added", "removed"}.
+    """
+    if layer not in LAYERS:
+        raise HTTPException(status_code=404, detail=f"unknown layer {layer}")
+    try:
+        from_version = layer_archive.resolve(from_version) if from_version else 0
+        versions = layer_archive.versions()
+        to_version = layer_archive.resolve(to_version) if to_version is not None else (versions[-1]["version"] if versions else 0)
+        delta = await run_in_threadpool(layer_archive.diff, layer, from_version, to_version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"layer": layer, **delta}
+
+
+def _parse_fields(fields):
+    """Comma-separated string or list of property names -> list (None = all). 422 otherwise."""
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+        raise HTTPException(status_code=422, detail="fields must be a string or a list of strings")
+    return [f.strip() for f in fields if f and f.strip()]
+
+
+def _coords_from_payload(payload: dict):
+    """Columnar {"lat": [...], "lon": [...]} or {"points": [[lat, lon], ...]} -> float arrays."""
+    if "points" in payload:
+        pts = np.asarray(payload["points"] or [], dtype=float)
+        if pts.size == 0:
+            pts = pts.reshape(0, 2)
+        if pts.ndim != 2 or pts.shape[1] != 2:
+            raise ValueError("points must be a list of [lat, lon] pairs")
+        lat, lon = pts[:, 0], pts[:, 1]
+    else:
+        lat = np.asarray(payload.get("lat", []), dtype=float)
+        lon = np.asarray(payload.get("lon", []), dtype=float)
+        if lat.ndim != 1 or lon.ndim != 1:
+            raise ValueError("lat and lon must be lists of numbers")
+    if lat.shape != lon.shape:
+        raise ValueError("lat and lon must have the same length")
+    if not (np.isfinite(lat).all() and np.isfinite(lon).all()) or (np.abs(lat) > 90).any() or (np.abs(lon) > 180).any():
+        raise ValueError("lat/lon out of range")
+    return lat, lon
+
+
+@app.get("/api/point")
+async def get_point(lat: float, lon: float, fields: str = None):
+    """Grid properties (exposure, PM2.5, ...) of the H3 cell containing a point."""
+    try:
+        lat_a, lon_a = _coords_from_payload({"lat": [lat], "lon": [lon]})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    index = await current_hex_index()
+    cell = index.cells_for_points(lat_a.tolist(), lon_a.tolist())[0]
+    props = index.record(index.row.get(cell, -1))
+    if props is not None and fields:
+        wanted = _parse_fields(fields)
+        props = {k: v for k, v in props.items() if k in wanted}
+    return {"lat": lat, "lon": lon, "h3_cell": cell, "found": props is not None, "properties": props}
+
+
+@app.post("/api/point")
+async def post_points(payload: dict = Body(...)):
+    """
+    Batch point lookup (e.g. geocoded mailing lists). Body: {"lat": [...], "lon": [...]}
+    or {"points": [[lat, lon], ...]}, optional "fields". Result is columnar, in input order.
+    """
+    try:
+        lat, lon = _coords_from_payload(payload)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if len(lat) > HEX_LOOKUP_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch larger than {HEX_LOOKUP_MAX_BATCH} points")
+    index = await current_hex_index()
+    result = await run_in_threadpool(index.lookup_points, lat.tolist(), lon.tolist(), _parse_fields(payload.get("fields")))
+    return {"count": len(lat), "version": index.version, **result}
+
+
+@app.get("/api/cells")
+async def get_cells(ids: str, fields: str = None):
+    """Grid properties for comma-separated H3 cell ids (columnar, in input order)."""
+    cells = [c.strip() for c in ids.split(",") if c.strip()]
+    if len(cells) > HEX_LOOKUP_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"More than {HEX_LOOKUP_MAX_BATCH} cell ids")
+    index = await current_hex_index()
+    return {"count": len(cells), "version": index.version, **index.lookup_cells(cells, _parse_fields(fields))}
+
+
+@app.post("/api/cells")
+async def post_cells(payload: dict = Body(...)):
+    """Batch cell lookup. Body: {"ids": [...], "fields": [...] (optional)}."""
+    cells = payload.get("ids") or []
+    if not isinstance(cells, list):
+        raise HTTPException(status_code=422, detail="ids must be a list of H3 cell ids")
+    if len(cells) > HEX_LOOKUP_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"More than {HEX_LOOKUP_MAX_BATCH} cell ids")
+    index = await current_hex_index()
+    result = await run_in_threadpool(index.lookup_cells, [str(c) for c in cells], _parse_fields(payload.get("fields")))
+    return {"count": len(cells), "version": index.version, **result}
+
+
+@app.post("/api/zonal")
+async def post_zonal(payload: dict = Body(...)):
+    """
+    Area-weighted statistics of the per-hex columns inside a polygon. Body: a
+    GeoJSON Polygon/MultiPolygon (geometry, Feature or {"geometry": ..., "fields": [...]}),
+    or {"cells": [...]} with (compacted) H3 ids returned by an earlier call.
+    """
+    index = await current_hex_index()
+    try:
+        fields = _parse_fields(payload.get("fields"))
+        if "cells" in payload:
+            result = await run_in_threadpool(zonal_stats_for_cells, index, [str(c) for c in payload["cells"] or []], fields)
+        else:
+            geojson = payload if payload.get("type") else payload.get("geometry") or {}
+            result = await run_in_threadpool(zonal_stats, index, geojson, fields)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"version": index.version, **result}
+
+
+def _run_query(sql, params):
+    index = get_hex_index()  # already in the threadpool
+    # The truck layer is only parsed when the tables are (re)loaded, not per query
+    truck_version = _current_versions()["truck_routes"]
+    result = query_engine.run(
+        sql, params,
+        (index.version, truck_version),
+        lambda: {"hexes": hex_table(index), "truck_routes": feature_table(_layer_data("truck_routes")[0])},
+        stream_aggregator.version, lambda: live_table(stream_aggregator.aggregates()),
+    )
+    LAYER_CACHE.inc("query", "result", "hit" if result["cached"] else "miss")
+    return {"version": index.version, **result}
+
+
+@app.post("/api/query")
+async def post_query(payload: dict = Body(...)):
+    """
+    Read-only SQL over the tables hexes, truck_routes and live. Body:
+    {"sql": "SELECT ... WHERE exposure_index > $min", "params": {"min": 0.7}}.
+    """
+    if not query_engine.available:
+        raise HTTPException(status_code=503, detail="duckdb is not installed")
+    sql = payload.get("sql")
+    if isinstance(sql, str) and len(sql) > QUERY_MAX_SQL_CHARS:
+        raise HTTPException(status_code=413, detail=f"SQL longer than {QUERY_MAX_SQL_CHARS} characters")
+    try:
+        return await run_in_threadpool(_run_query, sql, payload.get("params"))
+    except QueryTimeout as e:
+        raise HTTPException(status_code=408, detail=str(e))
+    except QueryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition (per worker process)."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/events")
+async def get_events():
+    """
+    Server-sent events: `layer_delta` (per-hex property changes after a rebuild),
+    `layer_reload` (layer without a per-feature key changed), `stream_delta`
+    (live last-hour means changed) and `resync` (client fell behind; reload).
+    """
+    hello = {
+        "versions": _current_versions(),
+        # Current live values, so a new client does not wait for the next change
+        "live": await run_in_threadpool(_live_snapshot),
+    }
+    return StreamingResponse(
+        sse_stream(broker, hello, PUSH_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/api/timeseries/hourly")
@@ -84,6 +535,29 @@ async def get_bounds():
     }
 
 
+@app.post("/api/stream/readings")
+async def post_stream_readings(payload: dict = Body(...)):
+    """
+    Ingest a batch of sensor readings (PM2.5, traffic counts). Columnar
+    {"ts": [...], "lat": [...], "lon": [...], "pm25": [...]} or {"readings": [...]}.
+    """
+    try:
+        cols, values = readings_to_columns(payload)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if len(cols["ts"]) > STREAM_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch larger than {STREAM_MAX_BATCH} readings")
+    # H3 assignment and buffer update are CPU-bound; keep the event loop free
+    result = await run_in_threadpool(stream_aggregator.ingest, cols["ts"], cols["lat"], cols["lon"], values)
+    return result
+
+
+@app.get("/api/stream/aggregates")
+async def get_stream_aggregates():
+    """Rolling per-hex means of live readings: last 1 h, 24 h and per TIME_BINS."""
+    return {"cells": stream_aggregator.aggregates(), "stats": stream_aggregator.stats()}
+
+
 # Serve frontend assets if present
 frontend_path = PROJECT_ROOT / "frontend"
 if frontend_path.exists():
@@ -0,0 +1,154 @@
+"""
+Lightweight Prometheus-style metrics for the API (no client library needed):
+per-route latency histograms, response bytes, layer-cache hits/reloads.
+Exposed as text at /metrics. Values are per worker process.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets (seconds), Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for lv, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_str(self.labels, lv)} {v}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callable at scrape time."""
+
+    def __init__(self, name, help_text, fn):
+        self.name, self.help, self.fn = name, help_text, fn
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for lv, s in sorted(self._series.items()):
+            cumulative = 0
+            for b, n in zip(self.buckets, s):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_label_str(names, lv + (b,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_str(names, lv + ('+Inf',))} {s[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, lv)} {s[-2]:.6f}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, lv)} {s[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+REQUEST_LATENCY = registry.add(Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status")))
+RESPONSE_BYTES = registry.add(Counter(
+    "http_response_bytes_total", "Response body bytes sent by route", ("method", "route")))
+REQUESTS = registry.add(Counter(
+    "http_requests_total", "Requests by route and status", ("method", "route", "status")))
+LAYER_CACHE = registry.add(Counter(
+    "layer_cache_events_total", "Layer cache hits and reloads (file = parsed GeoJSON, store = shared mmap)",
+    ("layer", "source", "event")))
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: wraps `send` so streamed bodies are counted too.
+    Routes are labelled by their path template (e.g. /api/layers/grid) to keep
+    label cardinality bounded; long-lived event streams are excluded from latency.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        state = {"status": 500, "bytes": 0, "stream": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                for k, v in message.get("headers", []):
+                    if k == b"content-type" and v.startswith(b"text/event-stream"):
+                        state["stream"] = True
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            status = str(state["status"])
+            REQUESTS.inc(method, path, status)
+            RESPONSE_BYTES.inc(method, path, amount=state["bytes"])
+            if not state["stream"]:
+                REQUEST_LATENCY.observe(time.perf_counter() - t0, method, path, status)
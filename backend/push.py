@@ -0,0 +1,59 @@
+"""
+Server-sent events broker: fan out layer and live-aggregate deltas to every
+connected map client. Each client has a bounded queue; a client that falls
+behind is told to resync (reload layers) instead of buffering without limit.
+"""
+
+import asyncio
+import json
+
+
+class EventBroker:
+    def __init__(self, queue_size=64):
+        self.queue_size = queue_size
+        self._subscribers = set()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        q = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        self._subscribers.discard(q)
+
+    def publish(self, event, data):
+        """Queue an event for all subscribers (call from the event loop)."""
+        message = format_sse(event, data)
+        for q in list(self._subscribers):
+            try:
+                q.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and ask it to reload everything
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(format_sse("resync", {}))
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def sse_stream(broker, hello, heartbeat_seconds=15):
+    """Async generator for a StreamingResponse: hello event, then deltas + keep-alives."""
+    q = broker.subscribe()
+    try:
+        yield format_sse("hello", hello)
+        while True:
+            try:
+                message = await asyncio.wait_for(q.get(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                # SSE comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield message
+    finally:
+        broker.unsubscribe(q)
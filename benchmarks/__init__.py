@@ -0,0 +1,2 @@
+# Hunts Point Geospatial Intelligence Platform - Benchmarks
+# Synthetic fixtures and timing harnesses (offline)
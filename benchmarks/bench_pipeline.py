@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Benchmark the layer-build pipeline stage by stage on synthetic inputs.
+Fully offline; inputs are generated deterministically from --seed.
+
+Run from project root:
+  python benchmarks/bench_pipeline.py                       # peninsula + borough
+  python benchmarks/bench_pipeline.py --scales city --repeat 1
+  python benchmarks/bench_pipeline.py --compare benchmarks/results/<old>.json
+
+Each stage records wall time (all repeats + median), peak traced memory
+(tracemalloc), its own peak RSS and how far that rose above the RSS it
+started from (Linux: the kernel high-water mark is reset before each run;
+null elsewhere), plus input/output sizes. Results are
+written to benchmarks/results/pipeline-<timestamp>-<commit>.json.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+from benchmarks.fixtures import SCALES, synthetic_edges, synthetic_air, synthetic_311
+from backend.instrument import current_rss_mb, reset_peak_rss, window_peak_rss_mb
+from backend.data.h3_utils import build_h3_gdf
+from backend.data.hotspots import add_hotspot_columns
+from backend.data.sensitivity import add_sensitivity_columns
+from backend.data.spatial import (
+    aggregate_air_to_grid,
+    add_congestion_proxy,
+    add_noise_proxy,
+    add_pollution_proxy_when_flat,
+    pollution_exposure_index,
+    grid_to_geojson,
+    edges_to_geojson,
+)
+from fetch_311_noise import normalize_latlon, aggregate_to_h3
+
+RESULTS_DIR = PROJECT_ROOT / "benchmarks" / "results"
+
+
+def _size(obj):
+    if obj is None:
+        return 0
+    if isinstance(obj, dict):
+        return len(obj.get("features", obj))
+    return len(obj)
+
+
+def run_stage(name, fn, make_args, repeat, trace_memory):
+    """Time fn(*make_args()) `repeat` times; argument construction is not timed."""
+    times, peak = [], 0
+    stage_peak = growth = None
+    out = None
+    for _ in range(repeat):
+        args = make_args()
+        out = None  # the previous repeat's output must not count towards this one's RSS
+        # ru_maxrss never goes down: reset the high-water mark so it covers this call only
+        baseline = current_rss_mb() if reset_peak_rss() else None
+        if trace_memory:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        out = fn(*args)
+        times.append(time.perf_counter() - t0)
+        if trace_memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        hwm = window_peak_rss_mb() if baseline is not None else None
+        if hwm is not None:
+            stage_peak = max(stage_peak or 0, hwm)
+            growth = max(growth or 0, hwm - baseline)
+        del args
+    result = {
+        "seconds": [round(t, 4) for t in times],
+        "median_s": round(statistics.median(times), 4),
+        "peak_traced_mb": round(peak / 1e6, 1) if trace_memory else None,
+        # Peak RSS during this stage, and its rise over the RSS the stage started from
+        "stage_peak_rss_mb": round(stage_peak, 1) if stage_peak is not None else None,
+        "stage_rss_growth_mb": round(growth, 1) if growth is not None else None,
+        "n_out": _size(out),
+    }
+    print(f"    {name:<22} {result['median_s']:>9.3f}s  out={result['n_out']}")
+    return result, out
+
+
+def _records_from_311(rows):
+    """The per-row normalization fetch_311_noise.main() does before aggregating."""
+    lat_col, lon_col = normalize_latlon(rows)
+    records = []
+    for r in rows:
+        try:
+            records.append({"lat": float(r.get(lat_col)), "lon": float(r.get(lon_col))})
+        except (TypeError, ValueError):
+            continue
+    return records
+
+
+def bench_scale(scale, cfg, repeat, seed, trace_memory):
+    b = cfg["bounds"]
+    t0 = time.perf_counter()
+    edges = synthetic_edges(b, cfg["road_spacing_m"], seed)
+    air = synthetic_air(b, cfg["air_points"], seed)
+    rows_311 = synthetic_311(b, cfg["complaints"], seed)
+    print(f"  {scale}: {len(edges)} edges, {len(air)} air points, {len(rows_311)} 311 rows "
+          f"(generated in {time.perf_counter() - t0:.1f}s)")
+
+    stages = {}
+    stages["build_h3_gdf"], grid = run_stage("build_h3_gdf", build_h3_gdf, lambda: (None, b), repeat, trace_memory)
+    grid["cell_id"] = grid["h3_cell"]
+    stages["build_h3_gdf"]["n_in"] = 0
+    stages["aggregate_air_to_grid"], grid_air = run_stage(
+        "aggregate_air_to_grid", aggregate_air_to_grid, lambda: (air, grid.copy()), repeat, trace_memory)
+    stages["add_congestion_proxy"], grid_c = run_stage(
+        "add_congestion_proxy", add_congestion_proxy, lambda: (grid_air.copy(), edges), repeat, trace_memory)
+
+    def indices(g):
+        g = add_noise_proxy(g)
+        g = add_pollution_proxy_when_flat(g)
+        return pollution_exposure_index(g)
+
+    stages["exposure_indices"], grid_full = run_stage(
+        "exposure_indices", indices, lambda: (grid_c.copy(),), repeat, trace_memory)
+    stages["hotspots"], _ = run_stage(
+        "hotspots", add_hotspot_columns, lambda: (grid_full.copy(),), repeat, trace_memory)
+    stages["sensitivity"], _ = run_stage(
+        "sensitivity", add_sensitivity_columns, lambda: (grid_full.copy(),), repeat, trace_memory)
+    stages["grid_to_geojson"], _ = run_stage(
+        "grid_to_geojson", grid_to_geojson, lambda: (grid_full,), repeat, trace_memory)
+    stages["edges_to_geojson"], _ = run_stage(
+        "edges_to_geojson", edges_to_geojson, lambda: (edges,), repeat, trace_memory)
+    stages["aggregate_311"], _ = run_stage(
+        "aggregate_311", lambda rows: aggregate_to_h3(_records_from_311(rows)), lambda: (rows_311,), repeat, trace_memory)
+
+    inputs = {"edges": len(edges), "air_points": len(air), "complaints": len(rows_311), "cells": len(grid)}
+    for name, n_in in (("aggregate_air_to_grid", len(air)), ("add_congestion_proxy", len(edges)),
+                       ("edges_to_geojson", len(edges)), ("aggregate_311", len(rows_311)),
+                       ("exposure_indices", len(grid)), ("hotspots", len(grid)), ("sensitivity", len(grid)), ("grid_to_geojson", len(grid))):
+        stages[name]["n_in"] = n_in
+    return {"inputs": inputs, "stages": stages}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _versions():
+    out = {}
+    for mod in ("numpy", "pandas", "geopandas", "shapely", "h3"):
+        try:
+            out[mod] = __import__(mod).__version__
+        except Exception:
+            out[mod] = None
+    return out
+
+
+def compare(old_path, new):
+    with open(old_path) as f:
+        old = json.load(f)
+    print(f"\nCompared with {old_path} ({old['meta'].get('commit')}):")
+    print(f"  {'scale/stage':<34} {'old s':>9} {'new s':>9} {'ratio':>7}")
+    for scale, res in new["results"].items():
+        old_scale = old["results"].get(scale)
+        if not old_scale:
+            continue
+        for stage, r in res["stages"].items():
+            o = old_scale["stages"].get(stage)
+            if not o:
+                continue
+            ratio = r["median_s"] / o["median_s"] if o["median_s"] else float("inf")
+            flag = "  <-- slower" if ratio > 1.2 else ""
+            print(f"  {scale + '/' + stage:<34} {o['median_s']:>9.3f} {r['median_s']:>9.3f} {ratio:>6.2f}x{flag}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default="peninsula,borough", help=f"comma-separated: {', '.join(SCALES)}")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows stages down)")
+    ap.add_argument("--out", help="results JSON path (default: benchmarks/results/...)")
+    ap.add_argument("--compare", help="earlier results JSON to compare against")
+    args = ap.parse_args()
+
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        ap.error(f"unknown scale(s): {', '.join(unknown)}")
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "benchmark": "pipeline",
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "versions": _versions(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+    print("Benchmarking layer-build pipeline (synthetic, offline)...")
+    for scale in scales:
+        report["results"][scale] = bench_scale(scale, SCALES[scale], args.repeat, args.seed, not args.no_memory)
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"pipeline-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {out}")
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
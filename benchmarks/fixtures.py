@@ -0,0 +1,139 @@
+"""
+Deterministic synthetic inputs for benchmarking the layer build at several
+scales. Everything is generated offline from a seed: a jittered street lattice
+shaped like OSMnx edges, air-monitor points, and 311 complaint rows.
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    import geopandas as gpd
+    import shapely
+except ImportError:
+    gpd = shapely = None
+
+# name -> bounds, street spacing (m), air monitors, 311 rows
+SCALES = {
+    "peninsula": {
+        "bounds": {"min_lat": 40.798, "max_lat": 40.818, "min_lon": -73.895, "max_lon": -73.865},
+        "road_spacing_m": 80,
+        "air_points": 25,
+        "complaints": 50_000,
+    },
+    "borough": {
+        "bounds": {"min_lat": 40.785, "max_lat": 40.915, "min_lon": -73.935, "max_lon": -73.765},
+        "road_spacing_m": 120,
+        "air_points": 400,
+        "complaints": 1_000_000,
+    },
+    "city": {
+        "bounds": {"min_lat": 40.496, "max_lat": 40.915, "min_lon": -74.255, "max_lon": -73.700},
+        "road_spacing_m": 150,
+        "air_points": 3_000,
+        "complaints": 5_000_000,
+    },
+}
+
+HIGHWAY_TYPES = np.array(["residential", "tertiary", "secondary", "primary", "trunk", "motorway_link"])
+HIGHWAY_P = np.array([0.55, 0.2, 0.12, 0.08, 0.03, 0.02])
+
+M_PER_DEG_LAT = 111_320.0
+
+
+def _deg_steps(bounds, spacing_m):
+    lat0 = np.radians((bounds["min_lat"] + bounds["max_lat"]) / 2)
+    return spacing_m / M_PER_DEG_LAT, spacing_m / (M_PER_DEG_LAT * np.cos(lat0))
+
+
+def synthetic_edges(bounds, spacing_m, seed=0, drop=0.15):
+    """
+    Street lattice with jittered nodes; ~`drop` of segments removed so blocks
+    vary. Returns a GeoDataFrame shaped like OSMnx edges (highway, length, geometry).
+    """
+    rng = np.random.default_rng(seed)
+    dlat, dlon = _deg_steps(bounds, spacing_m)
+    lats = np.arange(bounds["min_lat"], bounds["max_lat"], dlat)
+    lons = np.arange(bounds["min_lon"], bounds["max_lon"], dlon)
+    ny, nx = len(lats), len(lons)
+    node_lat = lats[:, None] + rng.normal(0, dlat * 0.15, (ny, nx))
+    node_lon = lons[None, :] + rng.normal(0, dlon * 0.15, (ny, nx))
+    nodes = np.stack([node_lon, node_lat], axis=-1)  # (ny, nx, 2) as lng, lat
+
+    horiz = np.stack([nodes[:, :-1], nodes[:, 1:]], axis=2).reshape(-1, 2, 2)
+    vert = np.stack([nodes[:-1, :], nodes[1:, :]], axis=2).reshape(-1, 2, 2)
+    segs = np.concatenate([horiz, vert])
+    segs = segs[rng.random(len(segs)) > drop]
+
+    lat_mid = np.radians(segs[:, :, 1].mean(axis=1))
+    dx = (segs[:, 1, 0] - segs[:, 0, 0]) * M_PER_DEG_LAT * np.cos(lat_mid)
+    dy = (segs[:, 1, 1] - segs[:, 0, 1]) * M_PER_DEG_LAT
+    df = pd.DataFrame({
+        "highway": rng.choice(HIGHWAY_TYPES, size=len(segs), p=HIGHWAY_P),
+        "length": np.hypot(dx, dy),
+        "oneway": rng.random(len(segs)) < 0.4,
+    })
+    return gpd.GeoDataFrame(df, geometry=shapely.linestrings(segs), crs="EPSG:4326")
+
+
+def synthetic_air(bounds, n, seed=0):
+    """Air-monitor points with PM2.5 rising toward the centre of the bounds."""
+    rng = np.random.default_rng(seed + 1)
+    lat = rng.uniform(bounds["min_lat"], bounds["max_lat"], n)
+    lon = rng.uniform(bounds["min_lon"], bounds["max_lon"], n)
+    clat = (bounds["min_lat"] + bounds["max_lat"]) / 2
+    clon = (bounds["min_lon"] + bounds["max_lon"]) / 2
+    span = max(bounds["max_lat"] - bounds["min_lat"], bounds["max_lon"] - bounds["min_lon"]) / 2
+    core = 1 - np.clip(np.hypot(lat - clat, lon - clon) / span, 0, 1)
+    pm25 = 9 + 8 * core + rng.normal(0, 0.8, n)
+    return pd.DataFrame({"lat": lat, "lon": lon, "pm25": pm25.round(2), "data_type": "synthetic"})
+
+
+def synthetic_311(bounds, n, seed=0):
+    """
+    311 noise rows as the SODA API returns them (list of dicts, string
+    coordinates), clustered around a few hotspots plus uniform background.
+    """
+    rng = np.random.default_rng(seed + 2)
+    n_hot = int(n * 0.6)
+    centres_lat = rng.uniform(bounds["min_lat"], bounds["max_lat"], 12)
+    centres_lon = rng.uniform(bounds["min_lon"], bounds["max_lon"], 12)
+    which = rng.integers(0, 12, n_hot)
+    sd = (bounds["max_lat"] - bounds["min_lat"]) * 0.03
+    lat = np.concatenate([centres_lat[which] + rng.normal(0, sd, n_hot), rng.uniform(bounds["min_lat"], bounds["max_lat"], n - n_hot)])
+    lon = np.concatenate([centres_lon[which] + rng.normal(0, sd, n_hot), rng.uniform(bounds["min_lon"], bounds["max_lon"], n - n_hot)])
+    kinds = np.array(["Noise - Street/Sidewalk", "Noise - Vehicle", "Noise - Commercial", "Noise - Residential"])
+    ktype = rng.integers(0, len(kinds), n)
+    return [
+        {"latitude": f"{a:.6f}", "longitude": f"{b:.6f}", "complaint_type": kinds[k]}
+        for a, b, k in zip(lat.tolist(), lon.tolist(), ktype.tolist())
+    ]
+
+
+def synthetic_layers(bounds, spacing_m, seed=0):
+    """
+    Grid and truck-route FeatureCollections shaped like build_layers.py output,
+    for serving/load tests at scales the real (peninsula) layers do not reach.
+    """
+    from backend.data.h3_utils import build_h3_gdf
+    from backend.data.spatial import grid_to_geojson, edges_to_geojson
+
+    rng = np.random.default_rng(seed + 3)
+    grid = build_h3_gdf(bounds=bounds)
+    n = len(grid)
+    road_km = rng.gamma(2.0, 0.5, n)
+    congestion = np.clip(road_km / road_km.max(), 0, 1)
+    noise = congestion * 0.5 + 0.3
+    pm25 = 10 + 6 * np.clip(0.6 * congestion + 0.4 * noise, 0, 1)
+    pm_n = (pm25 - pm25.min()) / (np.ptp(pm25) or 1)
+    grid["cell_id"] = grid["h3_cell"]
+    grid["pm25_mean"] = pm25
+    grid["data_type"] = "synthetic"
+    grid["road_km"] = road_km
+    grid["congestion"] = congestion
+    grid["congestion_note"] = "synthetic"
+    grid["noise_proxy"] = noise
+    grid["noise_note"] = "synthetic"
+    grid["exposure_index"] = np.clip(0.5 * pm_n + 0.3 * congestion + 0.2 * noise, 0, 1)
+    edges = synthetic_edges(bounds, spacing_m, seed)
+    return grid_to_geojson(grid), edges_to_geojson(edges)
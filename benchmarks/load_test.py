@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Load-test the API by replaying the map's access pattern: each virtual user
+fetches the grid and truck-route layers in parallel (as frontend/index.html
+does on load), then /api/timeseries/hourly and /api/bounds.
+
+Layers are synthetic at the chosen scale, written to a temporary data
+directory (HUNTS_POINT_DATA_DIR) and published to its layer store, so the
+server under test serves realistic sizes rather than the placeholder layers.
+
+Run from project root:
+  python benchmarks/load_test.py --in-process --scale borough
+  python benchmarks/load_test.py --serve --workers 1 --concurrency 50 --duration 30
+  python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 20
+
+Reports per endpoint: requests, errors, req/s, p50/p95/p99 latency (ms) and
+bytes on the wire. Needs httpx (requirements.txt, dev section).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from benchmarks.fixtures import SCALES, synthetic_layers
+
+# One map session: the first group is fetched concurrently
+SESSION = (
+    ("/api/layers/grid", "/api/layers/truck_routes"),
+    ("/api/timeseries/hourly",),
+    ("/api/bounds",),
+)
+
+
+def prepare_data_dir(scale, seed):
+    """
+    Write synthetic layers for `scale` into a temp data dir and publish them.
+    Sets HUNTS_POINT_DATA_DIR first: config paths are fixed when config is imported.
+    The caller removes the dir when done; it is removed here if writing fails.
+    """
+    data_dir = Path(tempfile.mkdtemp(prefix=f"hp-load-{scale}-"))
+    try:
+        _write_layers(data_dir, scale, seed)
+    except BaseException:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        raise
+    return data_dir
+
+
+def _write_layers(data_dir, scale, seed):
+    os.environ["HUNTS_POINT_DATA_DIR"] = str(data_dir)
+    from backend.data.layer_store import publish_layers
+
+    cfg = SCALES[scale]
+    t0 = time.perf_counter()
+    grid, trucks = synthetic_layers(cfg["bounds"], cfg["road_spacing_m"], seed)
+    layers_dir = data_dir / "layers"
+    layers_dir.mkdir()
+    for filename, fc in (("grid_layers.geojson", grid), ("truck_routes.geojson", trucks)):
+        with open(layers_dir / filename, "w") as f:
+            json.dump(fc, f)
+    publish_layers({"grid": grid, "truck_routes": trucks}, keys={"grid": "h3_cell"},
+                   store_dir=data_dir / "layer_store")
+    print(f"Synthetic {scale} layers: {len(grid['features'])} cells, {len(trucks['features'])} truck edges "
+          f"in {data_dir} ({time.perf_counter() - t0:.1f}s)")
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # path -> list of (seconds, bytes, ok)
+
+    def add(self, path, seconds, nbytes, ok):
+        self.samples.setdefault(path, []).append((seconds, nbytes, ok))
+
+    def report(self, elapsed):
+        out = {}
+        for path, rows in self.samples.items():
+            lat = sorted(s for s, _, ok in rows if ok)
+            q = statistics.quantiles(lat, n=100, method="inclusive") if len(lat) > 1 else lat * 99
+            out[path] = {
+                "requests": len(rows),
+                "errors": sum(1 for *_, ok in rows if not ok),
+                "req_per_s": round(len(rows) / elapsed, 1),
+                "p50_ms": round(q[49] * 1000, 1) if q else None,
+                "p95_ms": round(q[94] * 1000, 1) if q else None,
+                "p99_ms": round(q[98] * 1000, 1) if q else None,
+                "bytes": sum(b for _, b, _ in rows),
+            }
+        return out
+
+
+async def _get(client, path, rec):
+    t0 = time.perf_counter()
+    try:
+        r = await client.get(path)
+        await r.aread()
+        rec.add(path, time.perf_counter() - t0, r.num_bytes_downloaded, r.status_code == 200)
+    except httpx.HTTPError:
+        rec.add(path, time.perf_counter() - t0, 0, False)
+
+
+async def virtual_user(client, rec, deadline, sessions, think):
+    done = 0
+    while time.perf_counter() < deadline and (sessions is None or done < sessions):
+        for group in SESSION:
+            await asyncio.gather(*(_get(client, p, rec) for p in group))
+        done += 1
+        if think:
+            await asyncio.sleep(think)
+    return done
+
+
+async def run_load(client, concurrency, duration, sessions, think):
+    rec = Recorder()
+    # Warm-up session so lazy loads (first parse / mmap) are not counted
+    for group in SESSION:
+        await asyncio.gather(*(_get(client, p, Recorder()) for p in group))
+    t0 = time.perf_counter()
+    deadline = t0 + duration if duration else float("inf")
+    counts = await asyncio.gather(*(virtual_user(client, rec, deadline, sessions, think) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return rec, sum(counts), elapsed
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(data_dir, workers):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env={**os.environ, "HUNTS_POINT_DATA_DIR": str(data_dir)},
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            if httpx.get(url + "/api/bounds", timeout=1).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def print_report(per_endpoint, sessions, elapsed):
+    print(f"\n{sessions} sessions in {elapsed:.1f}s ({sessions / elapsed:.1f} sessions/s)")
+    print(f"  {'endpoint':<26} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'MB':>9}")
+    for path, r in per_endpoint.items():
+        print(f"  {path:<26} {r['requests']:>7} {r['errors']:>5} {r['req_per_s']:>8} {r['p50_ms']:>8} "
+              f"{r['p95_ms']:>8} {r['p99_ms']:>8} {r['bytes'] / 1e6:>9.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = ap.add_mutually_exclusive_group()
+    target.add_argument("--in-process", action="store_true", help="drive the ASGI app directly (default)")
+    target.add_argument("--serve", action="store_true", help="start a local uvicorn on a free port")
+    target.add_argument("--url", help="existing server (its own data is used; --scale is ignored)")
+    ap.add_argument("--scale", default="borough", help=f"synthetic layer size: {', '.join(SCALES)}")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers with --serve")
+    ap.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    ap.add_argument("--duration", type=float, default=20, help="seconds to run (0 = until --sessions)")
+    ap.add_argument("--sessions", type=int, help="sessions per virtual user")
+    ap.add_argument("--think", type=float, default=0, help="pause between a user's sessions (s)")
+    ap.add_argument("--no-gzip", action="store_true", help="do not send Accept-Encoding: gzip")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write results JSON here (e.g. benchmarks/results/load-borough.json)")
+    ap.add_argument("--keep-data", action="store_true", help="keep the temporary data dir (removed on exit by default)")
+    args = ap.parse_args()
+
+    if httpx is None:
+        sys.exit("httpx is required: pip install httpx")
+    if args.scale not in SCALES:
+        ap.error(f"unknown scale: {args.scale}")
+    if not args.duration and not args.sessions:
+        ap.error("--duration 0 needs --sessions")
+
+    headers = {"Accept-Encoding": "identity" if args.no_gzip else "gzip"}
+    proc = None
+    data_dir = None if args.url else prepare_data_dir(args.scale, args.seed)
+    mode = "url" if args.url else "serve" if args.serve else "in-process"
+
+    async def go():
+        if mode == "in-process":
+            from backend.main import app, lifespan
+            async with lifespan(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://load", headers=headers,
+                                             timeout=60) as client:
+                    return await run_load(client, args.concurrency, args.duration, args.sessions, args.think)
+        limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+            return await run_load(client, args.concurrency, args.duration, args.sessions, args.think)
+
+    base_url = args.url
+    try:
+        if mode == "serve":
+            proc, base_url = start_server(data_dir, args.workers)
+        print(f"Load test ({mode}): {args.concurrency} users, "
+              f"{f'{args.duration:g}s' if args.duration else f'{args.sessions} sessions each'}")
+        rec, sessions, elapsed = asyncio.run(go())
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if data_dir is not None:
+            if args.keep_data:
+                print(f"Kept data dir {data_dir}")
+            else:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+    per_endpoint = rec.report(elapsed)
+    print_report(per_endpoint, sessions, elapsed)
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "meta": {
+                "benchmark": "load",
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "mode": mode, "scale": None if args.url else args.scale, "workers": args.workers,
+                "concurrency": args.concurrency, "think_s": args.think, "gzip": not args.no_gzip,
+            },
+            "sessions": sessions,
+            "elapsed_s": round(elapsed, 2),
+            "endpoints": per_endpoint,
+        }
+        with open(out, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
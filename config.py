@@ -3,6 +3,8 @@ Configuration for Hunts Point Geospatial Intelligence Platform.
 Hunts Point Peninsula, Bronx, NYC.
 """
 
+import os
+
 # Hunts Point peninsula bounding box (South Bronx, East River)
 # Finer than borough; covers the industrial peninsula
 HUNTS_POINT_BOUNDS = {
@@ -43,10 +45,103 @@ NETWORK_TYPE = "drive"
 NYC_311_URL = "https://data.cityofnewyork.us/resource/erm2-nwe9.json"
 NYC_311_NOISE_LIMIT = 50000
 
-# Cache paths (relative to project root)
-DATA_DIR = "data"
-CACHE_AIR = "data/air_quality.json"
-CACHE_311_NOISE = "data/311_noise_complaints.json"
-CACHE_GRAPH = "data/osmnx_graph.gpkg"
-CACHE_GRID = "data/grid.geojson"
-CACHE_LAYERS = "data/layers"
+# Cache paths (relative to project root; HUNTS_POINT_DATA_DIR may point elsewhere, e.g. a load-test fixture)
+DATA_DIR = os.environ.get("HUNTS_POINT_DATA_DIR", "data")
+CACHE_AIR = f"{DATA_DIR}/air_quality.json"
+CACHE_311_NOISE = f"{DATA_DIR}/311_noise_complaints.json"
+CACHE_311_BY_HEX = f"{DATA_DIR}/311_noise_by_hex.geojson"  # complaint_count per H3 cell
+CACHE_GRAPH = f"{DATA_DIR}/osmnx_graph.gpkg"
+CACHE_GRID = f"{DATA_DIR}/grid.geojson"
+CACHE_LAYERS = f"{DATA_DIR}/layers"
+CACHE_LAYER_STORE = f"{DATA_DIR}/layer_store"  # published, pre-encoded layers shared by API workers
+LAYER_STORE_KEEP = 3                            # published versions kept on disk
+CACHE_LAYER_ARCHIVE = f"{DATA_DIR}/layer_archive"  # every build, as per-hex deltas (?version=, ?asof=, /api/diff)
+ARCHIVE_CACHE_VERSIONS = 4                      # rebuilt past layer states kept per worker
+CACHE_RUNS = f"{DATA_DIR}/runs"                 # build run manifests (stage timings, RSS, counts)
+
+# Study area (backend/data/study_area.py): polygon(s) the grid is generated from, e.g. the
+# peninsula outline or a land mask; the HUNTS_POINT_BOUNDS rectangle when the file is absent
+STUDY_AREA_FILE = f"{DATA_DIR}/study_area/study_area.geojson"
+
+# Truck-route designation (backend/data/freight.py)
+TRUCK_ROUTES_FILE = f"{DATA_DIR}/truck_routes/nyc_truck_routes.geojson"  # NYC DOT (optional)
+TRUCK_ROUTE_TYPE_COLUMN = "routetype"  # NYC DOT: Through / Local / Limited Local
+TRUCK_MATCH_M = 15               # OSM edge midpoint to designated route distance for a match
+# Without the DOT file: OSM highway class -> truck class (hgv=* tags override)
+TRUCK_HIGHWAY_CLASSES = {
+    "motorway": "through", "motorway_link": "through",
+    "trunk": "through", "trunk_link": "through",
+    "primary": "through", "primary_link": "through",
+    "secondary": "local", "secondary_link": "local",
+}
+TRUCK_SIMPLIFY_M = 2.0           # Douglas-Peucker tolerance for the merged truck layer
+
+# Population-weighted exposure (backend/data/population.py); local files, skipped when absent
+POPULATION_BLOCKS = f"{DATA_DIR}/population/blocks.geojson"    # census blocks or tracts with a population column
+POPULATION_COLUMN = "population"
+POPULATION_LANDUSE = f"{DATA_DIR}/population/landuse.geojson"  # optional dasymetric mask (e.g. MapPLUTO lots)
+LANDUSE_COLUMN = "landuse"
+RESIDENTIAL_LANDUSE = ("01", "02", "03", "04")  # MapPLUTO: 1-2 family, walk-up, elevator, mixed residential
+CACHE_POP_WEIGHTS = f"{DATA_DIR}/population/weights"           # cached block->hex weight matrices (.npz)
+POPULATION_HIGH_EXPOSURE = 0.6   # exposure_index at or above which people count as highly exposed
+
+# Exposure index weights (backend/data/spatial.py); illustrative, see docs/MODELS.md
+EXPOSURE_WEIGHTS = (0.5, 0.3, 0.2)  # normalized PM2.5, congestion, noise_proxy
+PM25_PROXY_BLEND = (0.6, 0.4)       # road density, noise_proxy in the flat-PM2.5 proxy
+
+# Weight sensitivity (scripts/build_layers.py --sensitivity, backend/data/sensitivity.py)
+SENSITIVITY_SAMPLES = 2000
+SENSITIVITY_CONCENTRATION = 20.0  # Dirichlet alpha = concentration x default weights (higher = closer to defaults)
+SENSITIVITY_BAND = (5, 95)        # percentiles of exposure_index reported as the band
+SENSITIVITY_TOP_SHARE = 0.10      # "top decile" membership
+
+# Sensitive receptors (backend/data/receptors.py): schools, daycares, clinics, NYCHA; local file, skipped when absent
+RECEPTORS_FILE = f"{DATA_DIR}/receptors/receptors.geojson"  # points (polygons use a representative point)
+RECEPTOR_KIND_COLUMN = "kind"    # e.g. school, daycare, clinic, nycha
+RECEPTOR_MAX_SNAP_M = 500        # receptors farther than this from any street node are not scored
+RECEPTOR_DECAY_M = 200           # proximity weight exp(-network distance / decay) per receptor
+RECEPTOR_NEAR_M = 150            # network distance counted as "near a truck route"
+EXPOSURE_RECEPTOR_WEIGHT = 0.15  # share of exposure_index from receptor_proximity when present
+
+# Live sensor stream (rolling per-hex aggregates, see backend/data/stream.py)
+STREAM_METRICS = ("pm25", "traffic")
+STREAM_BUCKET_SECONDS = 300      # 5-minute ring-buffer slots
+STREAM_WINDOW_HOURS = 24         # longest rolling window kept in memory
+STREAM_MAX_CELLS = 4096          # bounds memory: metrics x cells x slots
+STREAM_MAX_BATCH = 100000        # readings per POST
+STREAM_TIMEZONE = "America/New_York"  # TIME_BINS hours are local time
+STREAM_MAX_FUTURE_SECONDS = 300  # sensor clock skew allowed; later ts would evict the whole window
+
+# Push channel (SSE /api/events): how often layer files and live aggregates are checked for changes
+PUSH_POLL_SECONDS = 2
+PUSH_HEARTBEAT_SECONDS = 15
+PUSH_QUEUE_SIZE = 64             # per-client backlog before it is told to resync
+
+# Point / hex lookup API (/api/point, /api/cells)
+HEX_LOOKUP_MAX_BATCH = 50000     # points or cell ids per POST
+
+# Zonal statistics (/api/zonal)
+ZONAL_MAX_CELLS = 200000         # H3 cells a request polygon may cover
+ZONAL_SUM_COLUMNS = ("road_km", "complaint_count")  # extensive columns: area-weighted sum
+
+# Read-only SQL over the per-hex tables (/api/query, backend/data/query.py; needs duckdb)
+QUERY_TIMEOUT_SECONDS = 5.0      # queries are interrupted after this
+QUERY_MAX_ROWS = 10000           # result rows returned (the rest is reported as truncated)
+QUERY_MAX_SQL_CHARS = 10000
+QUERY_CACHE_SIZE = 256           # results kept per worker, keyed by query, params and table versions
+QUERY_THREADS = 2                # DuckDB threads per worker
+QUERY_MEMORY_LIMIT = "512MB"
+
+# Compact grid wire format (/api/layers/grid?format=compact)
+COMPACT_QUANTIZED_COLUMNS = ("congestion", "noise_proxy", "exposure_index")  # 0..1 indices sent as uint8
+
+# Static export for the Vercel deploy (scripts/export_static.py)
+STATIC_DIR = "public"
+STATIC_PRECISION_DEG = 1e-5      # coordinate quantization (~1 m)
+STATIC_DECIMALS = 4              # rounding of exported property values
+
+# Hotspot statistics (backend/data/hotspots.py): Gi* and local Moran's I per field
+HOTSPOT_FIELDS = ("exposure_index", "pm25_mean", "congestion", "complaint_count")
+HOTSPOT_K = 1                    # grid_disk ring radius defining neighbours
+HOTSPOT_PERMUTATIONS = 999
+HOTSPOT_ALPHA = 0.05             # LISA class significance
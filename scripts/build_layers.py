@@ -2,9 +2,11 @@
 """
 Build spatial layers: H3 hexagons (or fallback grid), pollution, congestion, noise, exposure.
 Writes GeoJSON to data/layers/ for the map and API.
-Run from project root: python scripts/build_layers.py
+Run from project root: python scripts/build_layers.py [--profile cprofile|pyinstrument]
+Each run writes a manifest with per-stage timings, RSS and counts to data/runs/.
 """
 
+import argparse
 import json
 import sys
 from pathlib import Path
@@ -20,61 +22,172 @@ from backend.data.spatial import (
     add_noise_proxy,
     add_pollution_proxy_when_flat,
     pollution_exposure_index,
+    add_311_counts,
     grid_to_geojson,
     edges_to_geojson,
 )
+from backend.data.layer_store import publish_layers, write_json_atomic
+from backend.data.archive import archive_layers
+from backend.data.population import add_population_exposure
+from backend.data.hotspots import add_hotspot_columns
+from backend.data.receptors import add_receptor_proximity
+from backend.data.freight import merge_truck_network
+from backend.data.sensitivity import add_sensitivity_columns
+from backend.data.study_area import load_study_area, area_bounds, grid_mask
+from config import CACHE_LAYERS, HOTSPOT_FIELDS, RECEPTOR_NEAR_M
+from backend.instrument import RunManifest
 
 
 def main():
-    layers_dir = PROJECT_ROOT / "data" / "layers"
-    layers_dir.mkdir(parents=True, exist_ok=True)
-
-    air_df = fetch_nyc_air_quality(use_cache=True)
-    G, nodes_gdf, edges_gdf = fetch_osmnx_network(use_cache=True)
-    truck_edges = get_truck_edges(edges_gdf) if edges_gdf is not None else None
-
+    ap = argparse.ArgumentParser(description="Build spatial layers into data/layers/.")
+    ap.add_argument("--sensitivity", action="store_true", help="Monte Carlo exposure-weight sensitivity columns (rank stability, top-decile probability, bands)")
+    ap.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="dump a profile of the whole run to data/runs/")
+    args = ap.parse_args()
+    run = RunManifest("build_layers", profile=args.profile)
+    # The manifest is written even when a stage fails, naming the stage and the error
     try:
-        from backend.data.h3_utils import build_h3_gdf
-        grid_gdf = build_h3_gdf()
-        if grid_gdf is not None:
-            grid_gdf["cell_id"] = grid_gdf["h3_cell"]
-            print("Using H3 hexagonal grid.")
-    except Exception as e:
-        print(f"H3 not used: {e}. Using rectangular grid.")
-        grid_gdf = None
+        _build(run, args)
+    except BaseException as e:
+        run.fail(e)
+        raise
+    finally:
+        manifest_path = run.write()
+        print(run.summary())
+        print(f"Run manifest: {manifest_path.relative_to(PROJECT_ROOT)}")
+
+
+def _build(run, args):
+    layers_dir = PROJECT_ROOT / CACHE_LAYERS
+    layers_dir.mkdir(parents=True, exist_ok=True)
 
-    if grid_gdf is None:
-        grid_gdf = build_grid_gdf()
+    # Outline / land mask from data/study_area/; the bounds rectangle when absent.
+    # Inputs are fetched for the area's own bounding box, not the fixed rectangle
+    area = load_study_area()
+    if area is not None:
+        print("Using study-area polygon(s) from data/study_area/.")
+
+    with run.stage("fetch_air") as st:
+        air_df = fetch_nyc_air_quality(use_cache=True)
+        st["rows_out"] = air_df
+    with run.stage("fetch_network") as st:
+        G, nodes_gdf, edges_gdf = fetch_osmnx_network(use_cache=True, bounds=area_bounds(area))
+        truck_edges = get_truck_edges(edges_gdf) if edges_gdf is not None else None
+        st["edges_out"] = edges_gdf
+    with run.stage("build_grid") as st:
+        try:
+            from backend.data.h3_utils import build_h3_gdf
+            grid_gdf = build_h3_gdf(area=area)
+            if grid_gdf is not None:
+                grid_gdf["cell_id"] = grid_gdf["h3_cell"]
+                print("Using H3 hexagonal grid.")
+        except Exception as e:
+            print(f"H3 not used: {e}. Using rectangular grid.")
+            grid_gdf = None
+
+        if grid_gdf is None:
+            grid_gdf = build_grid_gdf(area=area)
+        st["cells_out"] = grid_gdf
 
     if grid_gdf is None:
         print("GeoPandas required for grid. Install geopandas.")
         return
 
-    grid_gdf = aggregate_air_to_grid(air_df, grid_gdf)
-    grid_gdf = add_congestion_proxy(grid_gdf, edges_gdf)
-    grid_gdf = add_noise_proxy(grid_gdf, edges_gdf)
-    grid_gdf = add_pollution_proxy_when_flat(grid_gdf)
-    grid_gdf = pollution_exposure_index(grid_gdf)
-
-    # Remove corner/water hexagons where there are no roads (index would be 0 or meaningless)
-    if "road_km" in grid_gdf.columns:
-        grid_gdf = grid_gdf[grid_gdf["road_km"].fillna(0) > 0].copy()
+    # Footprint of the cells: edges and air points outside it are dropped before the joins
+    mask = grid_mask(grid_gdf)
+    with run.stage("aggregate_air_to_grid") as st:
+        st["rows_in"] = air_df
+        grid_gdf = aggregate_air_to_grid(air_df, grid_gdf, mask=mask)
+    with run.stage("add_congestion_proxy") as st:
+        st["edges_in"] = edges_gdf
+        grid_gdf = add_congestion_proxy(grid_gdf, edges_gdf, mask=mask)
+    # Network distance from sensitive receptors to truck routes (skipped without data/receptors/);
+    # uses the full street graph, so a truck route just outside the study area still counts
+    with run.stage("receptor_proximity") as st:
+        grid_gdf, receptors = add_receptor_proximity(grid_gdf, edges_gdf, truck_edges)
+        if receptors is not None:
+            st["receptors_in"] = receptors
+            receptors.to_file(layers_dir / "receptors.geojson", driver="GeoJSON")
+            print(f"  {int(receptors['near_truck'].sum())} of {len(receptors)} sensitive receptors "
+                  f"within {RECEPTOR_NEAR_M} m of a truck route (network distance).")
+    with run.stage("exposure_indices") as st:
+        grid_gdf = add_noise_proxy(grid_gdf, edges_gdf)
+        grid_gdf = add_pollution_proxy_when_flat(grid_gdf)
+        grid_gdf = pollution_exposure_index(grid_gdf)
+        grid_gdf = add_311_counts(grid_gdf)
+        st["cells_out"] = grid_gdf
+    # People per hex from local census blocks (skipped when data/population/ has none)
+    with run.stage("population_exposure") as st:
+        grid_gdf, pop_totals = add_population_exposure(grid_gdf)
+        if pop_totals is not None:
+            st["blocks_in"] = pop_totals["blocks"]
+            st["weights_cached"] = pop_totals["weights_cached"]
+            with open(layers_dir / "population_summary.json", "w") as f:
+                json.dump(pop_totals, f, indent=1)
+            print(f"  Population {pop_totals['population']:,.0f}; "
+                  f"{pop_totals.get('people_high_exposure', 0):,.0f} in high-exposure hexagons.")
+
+    # Without a study area the grid is the whole rectangle: remove corner/water hexagons with no roads
+    keep = None
+    if area is None and "road_km" in grid_gdf.columns:
+        keep = (grid_gdf["road_km"].fillna(0) > 0).to_numpy()
+
+    # Before the drop: exposure_index was normalized over this grid, and the
+    # draws must score the same index; only the kept cells are ranked
+    if args.sensitivity:
+        with run.stage("sensitivity") as st:
+            grid_gdf, sens_summary = add_sensitivity_columns(grid_gdf, keep=keep)
+            if sens_summary is not None:
+                st["samples"] = sens_summary["samples"]
+                with open(layers_dir / "sensitivity_summary.json", "w") as f:
+                    json.dump(sens_summary, f, indent=1)
+                print(f"  Sensitivity: {sens_summary['samples']} weight draws, median rank sd {sens_summary['median_rank_sd']}, "
+                      f"{sens_summary['robust_top_cells']} hexagons in the top decile in 90% of draws.")
+
+    if keep is not None:
+        grid_gdf = grid_gdf[keep].copy()
         print(f"  Kept {len(grid_gdf)} hexagons with road data (dropped water/corners).")
 
-    props = ["h3_cell", "cell_id", "pm25_mean", "congestion", "noise_proxy", "exposure_index", "data_type", "congestion_note", "noise_note", "road_km"]
-    props = [c for c in props if c in grid_gdf.columns]
-    geoj = grid_to_geojson(grid_gdf, props=props)
-    with open(layers_dir / "grid_layers.geojson", "w") as f:
-        json.dump(geoj, f)
+    # Gi* / local Moran's I per field on the kept hexagons (needs H3 cell ids)
+    with run.stage("hotspots") as st:
+        grid_gdf = add_hotspot_columns(grid_gdf)
+        st["cells_in"] = grid_gdf
 
-    truck_geoj = edges_to_geojson(truck_edges)
-    with open(layers_dir / "truck_routes.geojson", "w") as f:
-        json.dump(truck_geoj, f)
+    props = ["h3_cell", "cell_id", "pm25_mean", "congestion", "noise_proxy", "exposure_index", "data_type", "congestion_note", "noise_note", "road_km", "population", "complaint_count", "truck_dist_m", "receptor_count", "receptors_near_truck", "receptor_proximity"]
+    props += [f"{field}_{stat}" for field in HOTSPOT_FIELDS for stat in ("gi_z", "gi_bin", "lisa", "lisa_p")]
+    props += ["exposure_rank_mean", "exposure_rank_sd", "exposure_top_prob", "exposure_index_lo", "exposure_index_hi"]
+    props = [c for c in props if c in grid_gdf.columns]
+    with run.stage("write_grid") as st:
+        geoj = grid_to_geojson(grid_gdf, props=props)
+        write_json_atomic(layers_dir / "grid_layers.geojson", geoj)
+        st["features_out"] = geoj
+        st["bytes_out"] = (layers_dir / "grid_layers.geojson").stat().st_size
+
+    with run.stage("write_truck_routes") as st:
+        # Merged, simplified corridors for the map; analysis stages keep the per-edge classes
+        truck_layer = merge_truck_network(truck_edges)
+        truck_geoj = edges_to_geojson(truck_layer)
+        st["edges_in"] = truck_edges
+        write_json_atomic(layers_dir / "truck_routes.geojson", truck_geoj)
+        st["features_out"] = truck_geoj
+        st["bytes_out"] = (layers_dir / "truck_routes.geojson").stat().st_size
 
     print("Layers written to data/layers/")
     print("  grid_layers.geojson (H3 hexagons: pollution, noise, congestion, exposure)")
     print("  truck_routes.geojson")
 
+    # Pre-encoded copy for multi-worker serving; workers pick it up via the CURRENT pointer
+    with run.stage("publish_layers") as st:
+        version = publish_layers({"grid": geoj, "truck_routes": truck_geoj}, keys={"grid": "h3_cell"})
+        st["version"] = version
+    print(f"Published layer store version {version} (data/layer_store/)")
+    # Permanent history: only what changed since the previous build is stored
+    with run.stage("archive_layers") as st:
+        archived = archive_layers({"grid": geoj, "truck_routes": truck_geoj}, keys={"grid": "h3_cell"}, version=version)
+        st["version"] = archived
+
+    run.count("grid_features", geoj)
+    run.count("truck_features", truck_geoj)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Export the built layers as a static site bundle for the Vercel deploy.
+Run from project root after build_layers.py: python scripts/export_static.py
+
+Writes to public/:
+  layers/h/<layer>.topo.<hash>.json     geometry as quantized, delta-encoded TopoJSON
+                                        (shared hexagon edges / street segments stored once)
+  layers/h/<layer>.<field>.<hash>.json  one file per property column, in geometry order,
+                                        so the map only downloads the metric on screen
+  *.gz / *.br siblings                  pre-compressed copies (.br needs the brotli package)
+  layers/manifest.json                  file names, sizes and bounds; read by public/index.html
+  layers/*.geojson, api/bounds.json     plain copies for the /api/* rewrites in vercel.json
+
+Hashed names never change content, so they are served as immutable; only the
+manifest is revalidated. Files from earlier exports are removed.
+
+public/ is generated but committed, because the Vercel deploy has no build
+step. Re-export after every build_layers.py run and after changes to a layer's
+format or to this script. `--check` writes nothing and exits non-zero when the
+committed bundle no longer matches data/layers/.
+"""
+
+import argparse
+
+import gzip
+import hashlib
+import json
+import shutil
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from backend.data.topology import to_topology
+from config import (
+    CACHE_LAYERS,
+    CENTER_LAT,
+    CENTER_LON,
+    HUNTS_POINT_BOUNDS,
+    STATIC_DECIMALS,
+    STATIC_DIR,
+    STATIC_PRECISION_DEG,
+)
+
+LAYER_FILES = {"grid": "grid_layers.geojson", "truck_routes": "truck_routes.geojson"}
+# Properties that repeat the feature id or only matter to the API
+SKIP_FIELDS = {"grid": {"h3_cell", "cell_id"}, "truck_routes": None}  # None = export no properties
+# Small properties kept on the geometries themselves (styling needs them with the first paint)
+INLINE_FIELDS = {"truck_routes": ["truck_class"]}
+
+
+def _encode(obj):
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _field_payload(values):
+    """Numeric column as a rounded array (null = missing); text columns dictionary-coded."""
+    if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+        return {"values": [None if v is None else round(v, STATIC_DECIMALS) for v in values]}
+    uniques = list(dict.fromkeys(values))
+    lookup = {v: i for i, v in enumerate(uniques)}
+    return {"dictionary": uniques, "codes": [lookup[v] for v in values]}
+
+
+def _columns(fc, skip):
+    props = [f.get("properties") or {} for f in fc.get("features", [])]
+    names = []
+    for p in props:
+        for k in p:
+            if k not in skip and k not in names:
+                names.append(k)
+    return {name: _field_payload([p.get(name) for p in props]) for name in names}
+
+
+class _Writer:
+    """Writes content-hashed files plus compressed siblings and records their sizes."""
+
+    def __init__(self, out_dir, dry_run=False):
+        self.out_dir = out_dir
+        self.dry_run = dry_run
+        self.files = {}
+
+    def write(self, stem, raw):
+        digest = hashlib.sha256(raw).hexdigest()[:10]
+        rel = f"h/{stem}.{digest}.json"
+        if self.dry_run:
+            self.files[rel] = {"bytes": len(raw)}
+            return rel
+        path = self.out_dir / rel
+        path.write_bytes(raw)
+        sizes = {"bytes": len(raw)}
+        gz = gzip.compress(raw, compresslevel=9, mtime=0)
+        (self.out_dir / (rel + ".gz")).write_bytes(gz)
+        sizes["gzip_bytes"] = len(gz)
+        if brotli is not None:
+            br = brotli.compress(raw, quality=11)
+            (self.out_dir / (rel + ".br")).write_bytes(br)
+            sizes["br_bytes"] = len(br)
+        self.files[rel] = sizes
+        return rel
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export data/layers/ as the static bundle in public/.")
+    ap.add_argument("--check", action="store_true", help="write nothing; exit 1 if public/ is stale")
+    args = ap.parse_args()
+    layers_dir = PROJECT_ROOT / CACHE_LAYERS
+    public = PROJECT_ROOT / STATIC_DIR
+    out_dir = public / "layers"
+    (out_dir / "h").mkdir(parents=True, exist_ok=True)
+    (public / "api").mkdir(parents=True, exist_ok=True)
+
+    layers = {}
+    for layer, filename in LAYER_FILES.items():
+        p = layers_dir / filename
+        if not p.exists():
+            print(f"Missing {p}; run scripts/build_layers.py first.")
+            return
+        with open(p) as f:
+            layers[layer] = json.load(f)
+        if not args.check:
+            shutil.copyfile(p, out_dir / filename)
+
+    writer = _Writer(out_dir, dry_run=args.check)
+    manifest_layers = {}
+    for layer, fc in layers.items():
+        topo = to_topology({layer: fc}, precision_deg=STATIC_PRECISION_DEG, keep_properties={layer: INLINE_FIELDS.get(layer)})
+        entry = {
+            "topology": writer.write(f"{layer}.topo", _encode(topo)),
+            "object": layer,
+            "features": len(fc.get("features", [])),
+            "fields": {},
+        }
+        skip = SKIP_FIELDS.get(layer)
+        if skip is not None:
+            for name, payload in _columns(fc, skip).items():
+                entry["fields"][name] = writer.write(f"{layer}.{name}", _encode(payload))
+        manifest_layers[layer] = entry
+
+    bounds = {**HUNTS_POINT_BOUNDS, "center": [CENTER_LAT, CENTER_LON]}
+    if args.check:
+        sys.exit(_check(out_dir, manifest_layers, bounds))
+    (public / "api" / "bounds.json").write_bytes(_encode(bounds) + b"\n")
+    manifest = {
+        "generated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "bounds": bounds,
+        "layers": manifest_layers,
+        "files": writer.files,
+    }
+    tmp = out_dir / "manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, indent=1))
+    tmp.replace(out_dir / "manifest.json")
+
+    # Drop hashed files no longer referenced (previous exports)
+    keep = set(writer.files) | {f"{rel}.gz" for rel in writer.files} | {f"{rel}.br" for rel in writer.files}
+    for p in (out_dir / "h").iterdir():
+        if f"h/{p.name}" not in keep:
+            p.unlink()
+
+    raw_total = sum((out_dir / name).stat().st_size for name in LAYER_FILES.values())
+    key = "br_bytes" if brotli is not None else "gzip_bytes"
+    initial = [manifest_layers["grid"]["topology"], manifest_layers["truck_routes"]["topology"]]
+    initial += [manifest_layers["grid"]["fields"][f] for f in ("pm25_mean", "data_type") if f in manifest_layers["grid"]["fields"]]
+    initial_bytes = sum(writer.files[rel][key] for rel in initial)
+    print(f"Exported {len(writer.files)} files to {out_dir}/h (manifest: {out_dir / 'manifest.json'})")
+    print(f"  first map load: {initial_bytes / 1024:.1f} KB ({key.split('_')[0]}) vs {raw_total / 1024:.1f} KB raw GeoJSON")
+    if brotli is None:
+        print("  brotli not installed; wrote .gz siblings only (pip install brotli)")
+
+
+def _check(out_dir, manifest_layers, bounds):
+    """0 if the committed manifest names exactly the files this export would write, else 1."""
+    try:
+        with open(out_dir / "manifest.json") as f:
+            current = json.load(f)
+    except FileNotFoundError:
+        print("public/layers/manifest.json is missing; run scripts/export_static.py")
+        return 1
+    stale = [layer for layer, entry in manifest_layers.items() if current.get("layers", {}).get(layer) != entry]
+    if current.get("bounds") != bounds:
+        stale.append("bounds")
+    if stale:
+        print(f"Static bundle is stale ({', '.join(stale)}); run scripts/export_static.py and commit public/")
+        return 1
+    print("Static bundle is up to date.")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
-Fetch NYC 311 noise complaints, aggregate to H3 hexagons over Hunts Point,
-and save a local map so you can see the result.
+Fetch NYC 311 noise complaints, aggregate to H3 hexagons over Hunts Point
+(the study-area cells when data/study_area/ has an outline), and save a local
+map so you can see the result.
 
 Run from project root:
   python scripts/fetch_311_noise.py
@@ -20,7 +21,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(PROJECT_ROOT))
 
 import requests
-from config import HUNTS_POINT_BOUNDS, NYC_311_URL, NYC_311_NOISE_LIMIT, CACHE_311_NOISE, DATA_DIR, H3_RESOLUTION
+from config import HUNTS_POINT_BOUNDS, NYC_311_URL, NYC_311_NOISE_LIMIT, CACHE_311_NOISE, CACHE_311_BY_HEX, DATA_DIR, H3_RESOLUTION
 
 
 def normalize_latlon(rows):
@@ -90,8 +91,12 @@ def fetch_311_noise(use_cache=True):
     return rows
 
 
-def filter_to_hunts_point(rows, lat_col, lon_col):
-    b = HUNTS_POINT_BOUNDS
+def filter_to_hunts_point(rows, lat_col, lon_col, mask=None, bounds=None):
+    """
+    Records inside the bounds (HUNTS_POINT_BOUNDS, or study_area.area_bounds for
+    a study area) and, if given, inside the grid footprint (study_area.grid_mask).
+    """
+    b = bounds or HUNTS_POINT_BOUNDS
     out = []
     for r in rows:
         try:
@@ -101,6 +106,10 @@ def filter_to_hunts_point(rows, lat_col, lon_col):
             continue
         if b["min_lat"] <= lat <= b["max_lat"] and b["min_lon"] <= lon <= b["max_lon"]:
             out.append({"lat": lat, "lon": lon, **r})
+    if mask is not None and out:
+        from backend.data.study_area import points_in_mask
+        keep = points_in_mask([r["lat"] for r in out], [r["lon"] for r in out], mask)
+        out = [r for r, k in zip(out, keep) if k]
     return out
 
 
@@ -124,29 +133,25 @@ def aggregate_to_h3(records):
     return counts
 
 
-def build_hex_geojson(counts):
-    """Build GeoJSON of H3 hexagons with complaint_count."""
+def build_hex_grid(area=None):
+    """H3 hexagons of the study area (or the bounds), or None without geopandas/h3."""
     try:
-        from backend.data.h3_utils import build_h3_gdf, get_h3_cells_in_bounds, h3_cell_to_polygon
-        import geopandas as gpd
+        from backend.data.h3_utils import build_h3_gdf
     except ImportError as e:
         print(f"Need geopandas/h3: {e}")
         return None
+    return build_h3_gdf(area=area)
 
-    cells = get_h3_cells_in_bounds()
-    rows = []
-    for c in cells:
-        geom = h3_cell_to_polygon(c)
-        if geom is not None:
-            rows.append({
-                "h3_cell": c,
-                "complaint_count": counts.get(c, 0),
-                "geometry": geom,
-            })
-    if not rows:
+
+def build_hex_geojson(counts, grid=None):
+    """Build GeoJSON of H3 hexagons with complaint_count."""
+    grid = grid if grid is not None else build_hex_grid()
+    if grid is None:
+        return None
+    if grid.empty:
         return {"type": "FeatureCollection", "features": []}
-    gdf = gpd.GeoDataFrame(rows, crs="EPSG:4326")
-    return json.loads(gdf.to_json(na="drop", drop_id=True))
+    gdf = grid.assign(complaint_count=grid["h3_cell"].map(counts).fillna(0).astype(int))
+    return json.loads(gdf[["h3_cell", "complaint_count", "geometry"]].to_json(na="drop", drop_id=True))
 
 
 def write_local_map(geojson_path, html_path):
@@ -210,8 +215,20 @@ def main():
             continue
         records.append({"lat": lat, "lon": lon, **r})
 
-    in_bounds = filter_to_hunts_point(records, "lat", "lon")
-    print(f"  In Hunts Point bounds: {len(in_bounds)}")
+    # Clip to the hexagons before assigning cells: only complaints that can land in one are kept
+    try:
+        from backend.data.study_area import load_study_area, area_bounds, grid_mask
+    except ImportError:
+        area, bounds = None, None
+    else:
+        area = load_study_area()
+        bounds = area_bounds(area)
+    grid = build_hex_grid(area)
+    mask = None
+    if grid is not None and not grid.empty:
+        mask = grid_mask(grid)
+    in_bounds = filter_to_hunts_point(records, "lat", "lon", mask, bounds)
+    print(f"  In Hunts Point study area: {len(in_bounds)}")
 
     if not in_bounds:
         print("  No 311 noise complaints in Hunts Point bounds. Try increasing area or check API filters.")
@@ -226,9 +243,9 @@ def main():
     out_dir = PROJECT_ROOT / DATA_DIR
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    geojson = build_hex_geojson(counts)
+    geojson = build_hex_geojson(counts, grid)
     if geojson:
-        geojson_path = out_dir / "311_noise_by_hex.geojson"
+        geojson_path = PROJECT_ROOT / CACHE_311_BY_HEX
         with open(geojson_path, "w") as f:
             json.dump(geojson, f)
         print(f"  Wrote {geojson_path}")
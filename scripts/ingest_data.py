@@ -11,6 +11,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(PROJECT_ROOT))
 
 from backend.data.ingest import fetch_nyc_air_quality, fetch_osmnx_network, ensure_data_dir
+from backend.data.study_area import load_study_area, area_bounds
 
 
 def main():
@@ -21,7 +22,7 @@ def main():
     if not df.empty and "data_type" in df.columns:
         print(f"  Data type: {df['data_type'].iloc[0]}")
     print("Fetching OSMnx network (Hunts Point)...")
-    G, nodes, edges = fetch_osmnx_network(use_cache=False)
+    G, nodes, edges = fetch_osmnx_network(use_cache=False, bounds=area_bounds(load_study_area()))
     if G is not None:
         print(f"  Nodes: {len(nodes)}, Edges: {len(edges)}")
     else:
@@ -1,10 +1,8 @@
 #!/usr/bin/env bash
-# Copy layer GeoJSON and API payloads into public/ for Vercel static deploy.
+# Export layers and API payloads into public/ for Vercel static deploy.
 # Run from project root after: python scripts/build_layers.py
 set -e
 ROOT="$(cd "$(dirname "$0")/.." && pwd)"
-mkdir -p "$ROOT/public/layers" "$ROOT/public/api"
-cp "$ROOT/data/layers/grid_layers.geojson" "$ROOT/public/layers/" 2>/dev/null || true
-cp "$ROOT/data/layers/truck_routes.geojson" "$ROOT/public/layers/" 2>/dev/null || true
-echo '{"min_lat":40.798,"max_lat":40.818,"min_lon":-73.895,"max_lon":-73.865,"center":[40.808,-73.88]}' > "$ROOT/public/api/bounds.json"
-echo "Prepared public/ for Vercel. Commit public/layers/* and public/api/* if changed."
+python "$ROOT/scripts/export_static.py"
+echo "Prepared public/ for Vercel. Commit public/layers/ (manifest.json, h/) and public/api/* if changed."
+echo "The bundle is generated: re-run this after every build or export change (check with: python scripts/export_static.py --check)."
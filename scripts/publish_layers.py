@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Publish the GeoJSON already in data/layers/ to the shared layer store without
+rebuilding (build_layers.py does this automatically at the end of a build).
+Run from project root: python scripts/publish_layers.py
+
+Roll back a bad build: python scripts/publish_layers.py --restore <version>
+re-publishes an archived version (and writes it back to data/layers/). The
+rollback is itself a new version, so the bad build stays in the archive.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.data.archive import LayerArchive, archive_layers
+from backend.data.layer_store import publish_layers, write_json_atomic
+from config import CACHE_LAYERS
+
+LAYER_FILES = (("grid", "grid_layers.geojson"), ("truck_routes", "truck_routes.geojson"))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Publish data/layers/ (or an archived version) to the layer store.")
+    ap.add_argument("--restore", type=int, metavar="VERSION", help="publish this archived version instead of data/layers/")
+    args = ap.parse_args()
+    layers_dir = PROJECT_ROOT / CACHE_LAYERS
+    layers = {}
+    if args.restore is not None:
+        archive = LayerArchive()
+        try:
+            version = archive.resolve(args.restore)
+            for layer, filename in LAYER_FILES:
+                layers[layer] = archive.materialize(layer, version)
+        except KeyError as e:
+            print(f"Cannot restore: {e.args[0]}.")
+            return
+        layers_dir.mkdir(parents=True, exist_ok=True)
+        for layer, filename in LAYER_FILES:
+            write_json_atomic(layers_dir / filename, layers[layer])
+        print(f"Restored archived version {version} to data/layers/")
+    else:
+        for layer, filename in LAYER_FILES:
+            p = layers_dir / filename
+            if not p.exists():
+                print(f"Missing {p}; run scripts/build_layers.py first.")
+                return
+            with open(p) as f:
+                layers[layer] = json.load(f)
+    version = publish_layers(layers, keys={"grid": "h3_cell"})
+    archive_layers(layers, keys={"grid": "h3_cell"}, version=version)
+    print(f"Published layer store version {version} (data/layer_store/)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Local sensor simulator: replay PM2.5 / traffic readings at high rates into the
+stream ingestion endpoint (or straight into the aggregator, in-process).
+
+Run from project root:
+  python scripts/simulate_sensors.py --in-process --hours 24 --sensors 200
+  python scripts/simulate_sensors.py --url http://127.0.0.1:8000 --rate 20000
+
+Readings are synthetic (fixed sensor sites over Hunts Point, diurnal pattern
+with the 4-9 AM logistics peak) unless --replay points at a JSON file of
+{"ts", "lat", "lon", "pm25", "traffic"} records.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import HUNTS_POINT_BOUNDS, STREAM_BUCKET_SECONDS
+from backend.data.stream import local_hours
+
+
+def synthetic_readings(n_sensors, hours, interval_s, start_ts, seed=0):
+    """Columnar readings for n_sensors reporting every interval_s over `hours`."""
+    rng = np.random.default_rng(seed)
+    b = HUNTS_POINT_BOUNDS
+    s_lat = rng.uniform(b["min_lat"], b["max_lat"], n_sensors)
+    s_lon = rng.uniform(b["min_lon"], b["max_lon"], n_sensors)
+    # Sites nearer the industrial core read higher
+    core = 1 - np.clip(np.hypot(s_lat - 40.808, s_lon + 73.88) / 0.02, 0, 1)
+
+    steps = int(hours * 3600 // interval_s)
+    ts = start_ts + np.arange(steps) * interval_s
+    hour = local_hours(ts)  # America/New_York, DST-aware, same clock as the TIME_BINS
+    truck = 0.3 + 0.7 * (1 - np.minimum(np.abs(hour - 6.5) / 6, 1))
+
+    ts_col = np.repeat(ts, n_sensors)
+    lat_col = np.tile(s_lat, steps)
+    lon_col = np.tile(s_lon, steps)
+    pm25 = 9 + 6 * np.outer(truck, 0.5 + core).ravel() + rng.normal(0, 1.0, steps * n_sensors)
+    traffic = np.outer(truck, 40 + 80 * core).ravel() * rng.uniform(0.8, 1.2, steps * n_sensors)
+    return {
+        "ts": ts_col.astype(float),
+        "lat": lat_col,
+        "lon": lon_col,
+        "pm25": np.clip(pm25, 0, None).round(2),
+        "traffic": traffic.round(0),
+    }
+
+
+def load_replay(path):
+    with open(path) as f:
+        rows = json.load(f)
+    rows.sort(key=lambda r: r.get("ts", 0))
+    return {k: np.array([r.get(k, np.nan) for r in rows], dtype=float) for k in ("ts", "lat", "lon", "pm25", "traffic")}
+
+
+def batches(cols, batch_size):
+    n = len(cols["ts"])
+    for i in range(0, n, batch_size):
+        yield {k: v[i : i + batch_size] for k, v in cols.items()}
+
+
+def run_in_process(cols, batch_size):
+    from backend.data.stream import RollingHexAggregator
+
+    agg = RollingHexAggregator()
+    t0 = time.perf_counter()
+    for batch in batches(cols, batch_size):
+        agg.ingest(batch["ts"], batch["lat"], batch["lon"], {"pm25": batch["pm25"], "traffic": batch["traffic"]})
+    elapsed = time.perf_counter() - t0
+    t1 = time.perf_counter()
+    result = agg.aggregates()
+    agg_elapsed = time.perf_counter() - t1
+    return elapsed, agg.stats(), len(result), agg_elapsed
+
+
+def run_http(cols, batch_size, url, rate):
+    import requests
+
+    session = requests.Session()
+    endpoint = url.rstrip("/") + "/api/stream/readings"
+    sent = 0
+    t0 = time.perf_counter()
+    for batch in batches(cols, batch_size):
+        payload = {k: v.tolist() for k, v in batch.items()}
+        r = session.post(endpoint, json=payload, timeout=60)
+        r.raise_for_status()
+        sent += len(batch["ts"])
+        if rate:
+            # Throttle to the target readings/second
+            ahead = sent / rate - (time.perf_counter() - t0)
+            if ahead > 0:
+                time.sleep(ahead)
+    elapsed = time.perf_counter() - t0
+    stats = session.get(url.rstrip("/") + "/api/stream/aggregates", timeout=60).json()["stats"]
+    return elapsed, stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sensors", type=int, default=100)
+    ap.add_argument("--hours", type=float, default=24)
+    ap.add_argument("--interval", type=int, default=60, help="seconds between readings per sensor")
+    ap.add_argument("--batch", type=int, default=5000)
+    ap.add_argument("--replay", help="JSON file of readings to replay instead of synthetic data")
+    ap.add_argument("--in-process", action="store_true", help="feed the aggregator directly (no HTTP)")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--rate", type=float, default=0, help="target readings/s over HTTP (0 = as fast as possible)")
+    args = ap.parse_args()
+
+    if args.replay:
+        cols = load_replay(args.replay)
+    else:
+        start = (time.time() - args.hours * 3600) // STREAM_BUCKET_SECONDS * STREAM_BUCKET_SECONDS
+        cols = synthetic_readings(args.sensors, args.hours, args.interval, start)
+    n = len(cols["ts"])
+    print(f"Replaying {n} readings in batches of {args.batch}...")
+
+    if args.in_process:
+        elapsed, stats, n_cells, agg_elapsed = run_in_process(cols, args.batch)
+        print(f"  Ingested in {elapsed:.2f}s ({n / elapsed:,.0f} readings/s)")
+        print(f"  Aggregates for {n_cells} hexes in {agg_elapsed * 1000:.1f} ms")
+    else:
+        elapsed, stats = run_http(cols, args.batch, args.url, args.rate)
+        print(f"  Posted in {elapsed:.2f}s ({n / elapsed:,.0f} readings/s)")
+    print(f"  Buffer: {stats['cells']} cells x {stats['slots']} slots, {stats['buffer_bytes'] / 1e6:.1f} MB")
+    print(f"  Accepted {stats['accepted']}, dropped {stats['dropped']}")
+
+
+if __name__ == "__main__":
+    main()
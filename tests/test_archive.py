@@ -0,0 +1,87 @@
+"""Layer archive round trips: replayed versions and composed diffs against the builds themselves."""
+
+import random
+
+import pytest
+
+from backend.data.archive import LayerArchive, archive_layers
+from backend.data.deltas import diff_feature_collections
+
+VERSIONS = 8
+
+
+def _feature(props):
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [0, 0]}, "properties": props}
+
+
+def _fc(props_by_cell):
+    return {"type": "FeatureCollection", "features": [_feature(p) for p in props_by_cell.values()]}
+
+
+def _next_build(rnd, prev):
+    """Random successor: removals, adds and re-adds, dropped/added columns, None values."""
+    cells = set(prev)
+    cells -= set(rnd.sample(sorted(cells), k=min(len(cells), rnd.randint(0, 4))))
+    cells |= {f"c{rnd.randint(0, 40)}" for _ in range(rnd.randint(0, 4))}
+    columns = rnd.sample(["a", "b", "c", "d", "e"], k=rnd.randint(1, 5))
+    out = {}
+    for cell in sorted(cells):
+        props = {"h3_cell": cell}
+        for col in columns:
+            r = rnd.random()
+            if r < 0.15:
+                props[col] = None
+            elif r >= 0.25:
+                props[col] = rnd.choice([1, 2, 3, "x", 2.5])
+        out[cell] = props
+    return out
+
+
+def _by_cell(fc):
+    return {f["properties"]["h3_cell"]: f["properties"] for f in fc["features"]}
+
+
+@pytest.fixture(params=range(10))
+def archived(request, tmp_path):
+    """(archive, builds) for one random sequence of VERSIONS builds."""
+    rnd = random.Random(request.param)
+    state = {f"c{i}": {"h3_cell": f"c{i}"} for i in range(15)}
+    builds = {}
+    for v in range(1, VERSIONS + 1):
+        state = _next_build(rnd, state)
+        builds[v] = state
+        trucks = {"type": "FeatureCollection", "features": [_feature({"n": v % 3})]}
+        archive_layers({"grid": _fc(state), "truck_routes": trucks}, keys={"grid": "h3_cell"},
+                       version=v, archive_dir=tmp_path)
+    return LayerArchive(tmp_path, cache_size=2), builds
+
+
+def test_materialize_matches_build(archived):
+    archive, builds = archived
+    for v in (5, 1, 8, 3, 2, 7, 4, 6):  # out of order, past the cache size
+        assert _by_cell(archive.materialize("grid", v)) == builds[v]
+        assert archive.materialize("truck_routes", v)["features"][0]["properties"] == {"n": v % 3}
+
+
+def test_diff_matches_direct_diff(archived):
+    archive, builds = archived
+    for a in range(1, VERSIONS + 1):
+        for b in range(a, VERSIONS + 1):
+            got = archive.diff("grid", a, b)
+            want = diff_feature_collections(_fc(builds[a]), _fc(builds[b]))
+            # A property that was None and is now absent reads the same; the archive leaves it out
+            want_changed = {}
+            for k, props in want["changed"].items():
+                props = {p: v for p, v in props.items() if p in builds[b][k] or builds[a][k][p] is not None}
+                if props:
+                    want_changed[k] = props
+            assert got["changed"] == want_changed
+            assert got["before"] == {k: {p: builds[a][k].get(p) for p in props} for k, props in want_changed.items()}
+            assert sorted(got["removed"]) == sorted(want["removed"])
+            assert _by_cell({"features": got["added"]}) == _by_cell({"features": want["added"]})
+
+
+def test_diff_rejects_reversed_range(archived):
+    archive, _ = archived
+    with pytest.raises(ValueError):
+        archive.diff("grid", 3, 2)
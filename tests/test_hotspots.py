@@ -0,0 +1,57 @@
+"""The shared-draw permutation shortcut against brute-force permutation on a small H3 grid."""
+
+import numpy as np
+import pytest
+
+h3 = pytest.importorskip("h3")
+
+from backend.data.hotspots import _count_larger, _fold, _lag_sums, build_adjacency, hotspot_stats
+
+
+@pytest.fixture
+def grid():
+    """(X, indptr, indices): 60 res-9 cells (61 less one) and two fields, one clustered."""
+    centre = h3.latlng_to_cell(40.808, -73.88, 9)
+    cells = sorted(h3.grid_disk(centre, 4))
+    del cells[20]  # a missing cell: its neighbours have lower degree
+    indptr, indices = build_adjacency(cells, 1)
+    rng = np.random.default_rng(7)
+    lat = np.array([h3.cell_to_latlng(c)[0] for c in cells])
+    X = np.column_stack([rng.normal(size=len(cells)), (lat > np.median(lat)) * 2.0 + rng.normal(size=len(cells))])
+    return X, indptr, indices
+
+
+def test_count_larger_matches_per_cell_gather(grid):
+    """Same draws, neighbour sums gathered cell by cell: counts must be identical."""
+    X, indptr, indices = grid
+    degree = np.diff(indptr)
+    lag = _lag_sums(indptr, indices, X)
+    rng = np.random.default_rng(0)
+    draws = np.stack([rng.choice(len(X), size=degree.max() + 1, replace=False) for _ in range(199)])
+
+    expected = np.zeros(X.shape, dtype=np.int64)
+    for i, d in enumerate(degree):
+        for row in draws:
+            picked = [j for j in row if j != i][:d]
+            expected[i] += X[picked].sum(axis=0) >= lag[i]
+    np.testing.assert_array_equal(_count_larger(X, lag, degree, draws), expected)
+
+
+def test_p_values_match_brute_force_permutation(grid):
+    """Independent conditional permutations per cell give the same p-values up to Monte Carlo error."""
+    X, indptr, indices = grid
+    n = len(X)
+    degree = np.diff(indptr)
+    lag = _lag_sums(indptr, indices, X)
+    permutations = 1999
+    p = hotspot_stats(X, indptr, indices, permutations=permutations, seed=1)["p"]
+
+    rng = np.random.default_rng(2)
+    larger = np.zeros(X.shape, dtype=np.int64)
+    for i, d in enumerate(degree):
+        others = np.delete(np.arange(n), i)
+        for _ in range(permutations):
+            larger[i] += X[rng.choice(others, size=d, replace=False)].sum(axis=0) >= lag[i]
+    brute = _fold(larger, permutations)
+    # Two independent estimates: sd of the difference is at most ~0.016 at p = 0.5
+    assert np.abs(p - brute).max() < 0.06